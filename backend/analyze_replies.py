@@ -7,8 +7,12 @@ import sys
 
 # Add root path for imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from sqlalchemy import update
 from database.db import SessionLocal
 from database.models import Campaign, EmailContent, Lead, User, SenderConfig
+from database.campaign_stats import bump as bump_stats, sentiment_field
+from backend.progress import StageProgress
+from collections import Counter
 
 # --------- Load Environment Variables (only GROQ_API_KEY remains global) ---------
 # IMAP credentials are now fetched per-user from SenderConfig
@@ -59,20 +63,23 @@ def analyze_replies(username, campaign_name):
     # Fetch user object
     user_obj = session.query(User).filter_by(username=username).first()
     if not user_obj:
-        print(f"❌ User '{username}' not found.")
-        return
+        session.close()
+        raise Exception(f"User '{username}' not found.")
 
     # Fetch campaign
     campaign_obj = session.query(Campaign).filter_by(user_id=user_obj.id, name=campaign_name).first()
     if not campaign_obj:
-        print(f"❌ Campaign '{campaign_name}' not found for user '{username}'")
-        return
+        session.close()
+        raise Exception(f"Campaign '{campaign_name}' not found for user '{username}'")
 
     campaign_obj.status = "Analyzing Replies"
     session.commit()
 
-    # Use a join to fetch both EmailContent and Lead in one query, avoiding N+1 problem.
-    email_lead_pairs = session.query(EmailContent, Lead).join(Lead, EmailContent.lead_id == Lead.id).filter(EmailContent.campaign_id == campaign_obj.id).all()
+    # Use a join to fetch email ids and lead addresses in one query, avoiding N+1 problem.
+    # No email text is selected (a stored reply is only tested for NULL), so none is decrypted.
+    email_lead_pairs = session.query(
+        EmailContent.id, Lead.email, EmailContent.reply_text.isnot(None).label("has_reply"), EmailContent.reply_sentiment
+    ).join(Lead, EmailContent.lead_id == Lead.id).filter(EmailContent.campaign_id == campaign_obj.id).all()
     if not email_lead_pairs:
         campaign_obj.status = "Idle"
         session.commit()
@@ -80,11 +87,13 @@ def analyze_replies(username, campaign_name):
         print(f"⚠️ No emails found for campaign '{campaign_name}'")
         return
 
-    # Map recipient emails to their records
+    # Map recipient emails to their email ids
     lead_map = {}
-    for email_record, lead_record in email_lead_pairs:
-        if lead_record and lead_record.email:
-            lead_map[lead_record.email.lower()] = (email_record, lead_record)
+    previous_reply = {}
+    for email_id, lead_email, has_reply, reply_sentiment in email_lead_pairs:
+        previous_reply[email_id] = (has_reply, reply_sentiment)
+        if lead_email:
+            lead_map[lead_email.lower()] = email_id
 
     if not lead_map:
         campaign_obj.status = "Idle"
@@ -96,10 +105,10 @@ def analyze_replies(username, campaign_name):
     # Fetch user's sender config for IMAP credentials
     sender_config = session.query(SenderConfig).filter_by(user_id=user_obj.id).first()
     if not sender_config or not sender_config.imap_email or not sender_config.imap_password or not sender_config.imap_server:
-        print(f"❌ IMAP credentials not configured for user '{username}'. Please update Sender Settings.")
         campaign_obj.status = "Idle"
         session.commit()
-        return
+        session.close()
+        raise Exception(f"IMAP credentials not configured for user '{username}'. Please update Sender Settings.")
 
     IMAP_EMAIL = sender_config.imap_email
     IMAP_PASSWORD = sender_config.imap_password
@@ -110,10 +119,10 @@ def analyze_replies(username, campaign_name):
         try:
             client.login(IMAP_EMAIL, IMAP_PASSWORD)
         except Exception as e:
-            print(f"❌ Failed to log in to IMAP server for user '{username}': {e}")
             campaign_obj.status = "Failed"
             session.commit()
-            return
+            session.close()
+            raise Exception(f"Failed to log in to IMAP server for user '{username}': {e}") from e
         client.select_folder('INBOX', readonly=False)
 
         all_uids = set()
@@ -131,30 +140,45 @@ def analyze_replies(username, campaign_name):
             session.close()
             return
 
-        for uid in all_uids:
-            raw = client.fetch([uid], ['BODY[]', 'ENVELOPE'])
-            msg = pyzmail.PyzMessage.factory(raw[uid][b'BODY[]'])
-            envelope = raw[uid][b'ENVELOPE']
-            sender_email = envelope.from_[0].mailbox.decode() + '@' + envelope.from_[0].host.decode()
-
-            email_entry = lead_map.get(sender_email.lower())
-            if not email_entry:
-                print(f"⚠️ Reply from unknown sender: {sender_email}")
-                continue
-
-            email_record, _ = email_entry
-
-            if msg.text_part:
-                try:
-                    reply_text = msg.text_part.get_payload().decode(msg.text_part.charset)
-                    sentiment = classify_reply_text(reply_text)
-                    email_record.reply_text = reply_text
-                    email_record.reply_sentiment = sentiment
-                    print(f"✅ Reply from {sender_email} → {sentiment}")
-                except Exception as e:
-                    print(f"⚠️ Error decoding reply from {sender_email}: {e}")
-
-    session.commit()
+        # Keyed by email id: of several replies from one lead, the last one read is kept
+        replies = {}
+        with StageProgress(campaign_obj.id, "analyze_replies", total=len(all_uids)) as progress:
+            for uid in all_uids:
+                raw = client.fetch([uid], ['BODY[]', 'ENVELOPE'])
+                msg = pyzmail.PyzMessage.factory(raw[uid][b'BODY[]'])
+                envelope = raw[uid][b'ENVELOPE']
+                sender_email = envelope.from_[0].mailbox.decode() + '@' + envelope.from_[0].host.decode()
+
+                error = None
+                email_id = lead_map.get(sender_email.lower())
+                if not email_id:
+                    print(f"⚠️ Reply from unknown sender: {sender_email}")
+                elif msg.text_part:
+                    try:
+                        reply_text = msg.text_part.get_payload().decode(msg.text_part.charset)
+                        sentiment = classify_reply_text(reply_text)
+                        replies[email_id] = {"id": email_id, "reply_text": reply_text, "reply_sentiment": sentiment}
+                        print(f"✅ Reply from {sender_email} → {sentiment}")
+                    except Exception as e:
+                        print(f"⚠️ Error decoding reply from {sender_email}: {e}")
+                        error = f"{sender_email}: {e}"
+                progress.advance(errors=int(error is not None), error=error, message=f"{len(replies)} replies")
+
+            # Replies are written by primary key, without loading the email rows
+            if replies:
+                session.execute(update(EmailContent), list(replies.values()))
+                # Re-analysis finds the same replies again: only new replies and changed sentiments count
+                deltas = Counter()
+                for email_id, reply in replies.items():
+                    had_reply, old_sentiment = previous_reply[email_id]
+                    if not had_reply:
+                        deltas["replies"] += 1
+                    deltas[sentiment_field(old_sentiment)] -= 1
+                    deltas[sentiment_field(reply["reply_sentiment"])] += 1
+                deltas.pop(None, None)
+                bump_stats(session, campaign_obj.id, **deltas)
+            session.commit()
+            progress.finish(message=f"{len(replies)} replies")
     campaign_obj.status = "Idle"
     session.commit()
     session.close()
@@ -3,82 +3,157 @@ FastAPI backend for campaign automation tasks.
 Refactored from individual scripts into callable functions and API endpoints.
 """
 
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional
-import traceback
+from typing import Optional
+from contextlib import asynccontextmanager
 
-# Import database and models
-from database.db import SessionLocal
-from database.models import User, Campaign, SenderConfig, Lead, EmailContent
+# Stages run in the worker pool (backend/worker.py); the API only queues them
+import backend.job_queue as job_queue
+import backend.delete_data as delete_data_mod
+import backend.tracking as tracking
+from backend.link_tokens import read_link
+import backend.progress as progress
 
-import backend.scraper as scraper_mod
-import backend.generate_emails as generate_emails_mod
-import backend.send_emails as send_emails_mod
-import backend.run_campaign as run_campaign_mod
-import backend.analyze_replies as analyze_replies_mod
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # Write the opens and clicks still buffered before the process exits
+    tracking.open_events.close()
+    tracking.click_events.close()
+
+app = FastAPI(lifespan=lifespan)
 
 
 # --- Request Models ---
 class CampaignRequest(BaseModel):
     username: str
     campaign_name: str
+    priority: Optional[int] = None # Defaults to the task's priority (backend/job_queue.py)
+
+class UserRequest(BaseModel):
+    username: str
+    priority: Optional[int] = None
+
+
+def queue_campaign_task(kind, req, message):
+    try:
+        job_id = job_queue.enqueue(
+            kind, {"username": req.username, "campaign_name": req.campaign_name}, username=req.username, priority=req.priority
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job_id is None:
+        raise HTTPException(status_code=404, detail=f"Campaign '{req.campaign_name}' not found for user '{req.username}'.")
+    return {"status": "success", "message": message, "job_id": job_id}
 
 
 # --- API Endpoints ---
+# Plain `def`: FastAPI runs them in its threadpool, so their database calls never block the event loop
 @app.post("/scrape_leads")
-async def api_scrape_leads(req: CampaignRequest, background_tasks: BackgroundTasks):
-    background_tasks.add_task(scraper_mod.run_scraper_for_campaign, req.username, req.campaign_name)
-    return {"status": "success", "message": "Scraping task has been started in the background."}
+def api_scrape_leads(req: CampaignRequest):
+    return queue_campaign_task("scrape_leads", req, "Scraping has been queued.")
 
 @app.post("/generate_emails")
-async def api_generate_emails(req: CampaignRequest, background_tasks: BackgroundTasks):
+def api_generate_emails(req: CampaignRequest):
     """Endpoint to generate email content for a campaign."""
-    background_tasks.add_task(generate_emails_mod.generate_emails_for_campaign, req.username, req.campaign_name)
-    return {"status": "success", "message": "Email generation has been started in the background."}
+    return queue_campaign_task("generate_emails", req, "Email generation has been queued.")
 
 @app.post("/send_emails")
-async def api_send_emails(req: CampaignRequest, background_tasks: BackgroundTasks):
+def api_send_emails(req: CampaignRequest):
     """Endpoint to send the generated emails for a campaign."""
-    background_tasks.add_task(send_emails_mod.send_emails_for_campaign, req.username, req.campaign_name)
-    return {"status": "success", "message": "Email sending has been started in the background."}
+    return queue_campaign_task("send_emails", req, "Email sending has been queued.")
 
 @app.post("/run_campaign")
-async def api_run_campaign(req: CampaignRequest, background_tasks: BackgroundTasks):
-    background_tasks.add_task(run_campaign_mod.run_campaign, req.username, req.campaign_name)
-    return {"status": "success", "message": "Full campaign run has been started in the background."}
+def api_run_campaign(req: CampaignRequest):
+    return queue_campaign_task("run_campaign", req, "Full campaign run has been queued.")
 
 @app.post("/analyze_replies")
-async def api_analyze_replies(req: CampaignRequest, background_tasks: BackgroundTasks):
-    background_tasks.add_task(analyze_replies_mod.analyze_replies, req.username, req.campaign_name)
-    return {"status": "success", "message": "Reply analysis has been started in the background."}
-
+def api_analyze_replies(req: CampaignRequest):
+    return queue_campaign_task("analyze_replies", req, "Reply analysis has been queued.")
+
+@app.post("/delete_campaign")
+def api_delete_campaign(req: CampaignRequest):
+    """Deletes a campaign and its leads, emails and progress in chunks, in the background."""
+    try:
+        deletion_id = delete_data_mod.request_campaign_deletion(req.username, req.campaign_name)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if deletion_id is None:
+        raise HTTPException(status_code=404, detail=f"Campaign '{req.campaign_name}' not found for user '{req.username}'.")
+    job_id = job_queue.enqueue("delete_data", {"job_id": deletion_id}, username=req.username, priority=req.priority)
+    return {"status": "success", "message": "Campaign deletion has been queued.", "job_id": job_id, "deletion_id": deletion_id}
+
+@app.post("/delete_user")
+def api_delete_user(req: UserRequest):
+    """Deletes a user with all their campaigns and settings, in chunks, in the background."""
+    try:
+        deletion_id = delete_data_mod.request_user_deletion(req.username)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if deletion_id is None:
+        raise HTTPException(status_code=404, detail=f"User '{req.username}' not found.")
+    job_id = job_queue.enqueue("delete_data", {"job_id": deletion_id}, priority=req.priority)
+    return {"status": "success", "message": "User deletion has been queued.", "job_id": job_id, "deletion_id": deletion_id}
+
+@app.get("/deletions/{deletion_id}")
+def api_deletion_progress(deletion_id: int):
+    """Status and progress (rows deleted of the total) of a deletion."""
+    progress = delete_data_mod.deletion_progress(deletion_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Deletion {deletion_id} not found.")
+    return progress
+
+@app.get("/jobs/{job_id}")
+def api_job_status(job_id: int):
+    """Status, attempts, place in the queue and last error of a queued job."""
+    status = job_queue.job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return status
+
+
+
+# --- Live Progress ---
+@app.get("/campaigns/{campaign_id}/progress")
+def api_campaign_progress(campaign_id: int):
+    """Campaign status and the latest counts of each stage it ran; cheap enough to poll every second."""
+    snapshot = progress.campaign_snapshot(campaign_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Campaign {campaign_id} not found.")
+    return snapshot
+
+@app.get("/campaigns/{campaign_id}/events")
+async def api_campaign_events(campaign_id: int, request: Request):
+    """Server-sent events with stage transitions, counts, throughput and errors as they happen."""
+    if await run_in_threadpool(progress.campaign_snapshot, campaign_id) is None:
+        raise HTTPException(status_code=404, detail=f"Campaign {campaign_id} not found.")
+    return StreamingResponse(
+        progress.stream_events(campaign_id, request.is_disconnected),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # --- Pixel Tracking Endpoint ---
-from fastapi.responses import FileResponse, Response
-import os
-
-PIXEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../static/pixel.png'))
-
 @app.get("/track_open")
-async def track_open(email_id: int = None):
+async def track_open(request: Request, email_id: int = None):
+    # Buffered and written in batches (backend/tracking.py); the pixel is served from memory
     if email_id:
-        session = SessionLocal()
-        try:
-            email_content = session.query(EmailContent).filter_by(id=email_id).first()
-            if email_content and not email_content.opened:
-                email_content.opened = True
-                session.commit()
-                print(f"[TRACK] Logged open for email_id: {email_id}")
-        except Exception as e:
-            print(f"[TRACK] Error logging open for email_id {email_id}: {e}")
-        finally:
-            session.close()
-
-    # Always serve the pixel image
-    if os.path.exists(PIXEL_PATH):
-        return FileResponse(PIXEL_PATH, media_type="image/png")
-    else:
-        return Response(content=b"", media_type="image/png")
+        tracking.record_open(email_id, request)
+    return Response(content=tracking.PIXEL_BYTES, media_type="image/png", headers=tracking.NO_CACHE_HEADERS)
+
+
+# --- Click Tracking Endpoint ---
+@app.get("/track_click")
+async def track_click(request: Request, t: str = ""):
+    # The signed token carries the email and the target (backend/link_tokens.py): no lookup, no commit here
+    link = read_link(t)
+    if link is None:
+        raise HTTPException(status_code=404, detail="Unknown link.")
+    email_id, url = link
+    tracking.record_click(email_id, url, request)
+    return RedirectResponse(url, status_code=302, headers=tracking.NO_CACHE_HEADERS)
@@ -0,0 +1,75 @@
+"""
+Asynchronous reCAPTCHA solving through Capsolver.
+
+Browser workers submit a challenge (page URL + sitekey) and get a Future for
+the token back immediately, so they can park the blocked query and hand over
+the result pages fetched meanwhile; the challenged browser sends no new query
+until the token is back, while the other browsers keep scraping. A small
+thread pool caps how many solves are paid for at the same time, and every
+solve is timed so latency and success rate show up in the scrape summary.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import capsolver
+
+MAX_CONCURRENT_SOLVES = int(os.getenv("CAPTCHA_MAX_CONCURRENT_SOLVES", "2"))
+
+
+class CaptchaSolveQueue:
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_SOLVES):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent), thread_name_prefix="captcha")
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.solved = 0
+        self.failed = 0
+        self.latencies = []
+
+    def submit(self, page_url, sitekey):
+        """Queues a solve and returns a Future resolving to the token (None on failure)."""
+        with self._lock:
+            self.submitted += 1
+        return self._executor.submit(self._solve, page_url, sitekey)
+
+    def _solve(self, page_url, sitekey):
+        started = time.monotonic()
+        token = None
+        try:
+            solution = capsolver.solve({
+                "type": "ReCaptchaV2TaskProxyless",
+                "websiteURL": page_url,
+                "websiteKey": sitekey
+            })
+            token = solution.get("gRecaptchaResponse")
+            if not token:
+                print(f"[CAPTCHA] FAILED: Capsolver did not return a solution token. Full response: {solution}")
+        except Exception as e:
+            print(f"[CAPTCHA] Capsolver error: {e}")
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.latencies.append(elapsed)
+            if token:
+                self.solved += 1
+            else:
+                self.failed += 1
+        if token:
+            print(f"[CAPTCHA] Solution token received from Capsolver in {elapsed:.1f}s.")
+        return token
+
+    def summary(self):
+        with self._lock:
+            if not self.submitted:
+                return
+            finished = sorted(self.latencies)
+            done = self.solved + self.failed
+        line = f"[CAPTCHA] {self.submitted} solve(s) submitted, {self.solved} solved"
+        if done:
+            p95 = finished[min(len(finished) - 1, int(len(finished) * 0.95))]
+            line += (f" ({self.solved / done:.0%} success), latency avg {sum(finished) / len(finished):.1f}s"
+                     f" / p95 {p95:.1f}s")
+        print(line)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
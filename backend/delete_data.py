@@ -0,0 +1,222 @@
+"""
+Deletes a campaign or a user, with all their data, in the background.
+
+Deleting through the ORM cascade loaded every lead and email of a campaign
+(decrypting them) to delete them one row at a time, which timed out the
+dashboard on large campaigns. Now a DeletionJob row records the request and
+`run_deletion_job` removes the rows table by table, children first, in
+chunks of DELETE_CHUNK_SIZE rows. Each chunk is a short transaction of its
+own that also adds to the job's progress, so the tracking pixel and other
+tasks keep writing meanwhile, and a job interrupted halfway simply resumes
+when it is run again.
+
+The foreign keys also cascade in the database (ON DELETE CASCADE), but the
+chunks don't rely on it: databases created by older releases don't have it.
+
+Usage: python backend/delete_data.py campaign <username> <campaign_name>
+       python backend/delete_data.py user <username>
+"""
+import os
+import sys
+import time
+from dotenv import load_dotenv
+from sqlalchemy import select, update, delete, func, or_
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from database.db import engine, SessionLocal
+from database.models import User, Campaign, Lead, EmailContent, EmailOpenEvent, EmailClickEvent, ScrapeProgress, CampaignStats, CampaignProgress, SenderConfig, DeletionJob, Job
+from backend.job_queue import campaign_args, encode_args, fail_deletion, STAGE_STATUSES
+
+load_dotenv()
+# Rows per delete transaction: small enough that other writers barely wait for the lock
+DELETE_CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", "1000"))
+PROGRESS_EVERY_SECONDS = 5
+UNFINISHED = ("Queued", "Running")
+
+
+def deletion_steps(kind, target_id):
+    """(table, criterion) pairs, children before parents, that together delete the target."""
+    campaigns, leads, emails = Campaign.__table__, Lead.__table__, EmailContent.__table__
+    opens, clicks = EmailOpenEvent.__table__, EmailClickEvent.__table__
+    if kind == "campaign":
+        campaign_ids = [target_id]
+    else:
+        campaign_ids = select(campaigns.c.id).where(campaigns.c.user_id == target_id)
+    steps = [
+        # Events of emails without the campaign id go with their email (ON DELETE CASCADE)
+        (opens, opens.c.campaign_id.in_(campaign_ids)),
+        (clicks, clicks.c.campaign_id.in_(campaign_ids)),
+        (emails, emails.c.campaign_id.in_(campaign_ids)),
+        # Emails saved without (or with another) campaign id still hang off the campaign's leads
+        (emails, emails.c.lead_id.in_(select(leads.c.id).where(leads.c.campaign_id.in_(campaign_ids)))
+         & or_(emails.c.campaign_id.is_(None), emails.c.campaign_id.not_in(campaign_ids))),
+        (leads, leads.c.campaign_id.in_(campaign_ids)),
+        (ScrapeProgress.__table__, ScrapeProgress.__table__.c.campaign_id.in_(campaign_ids)),
+        (CampaignStats.__table__, CampaignStats.__table__.c.campaign_id.in_(campaign_ids)),
+        (CampaignProgress.__table__, CampaignProgress.__table__.c.campaign_id.in_(campaign_ids)),
+        (campaigns, campaigns.c.id.in_(campaign_ids)),
+    ]
+    if kind == "user":
+        steps.append((SenderConfig.__table__, SenderConfig.__table__.c.user_id == target_id))
+        steps.append((User.__table__, User.__table__.c.id == target_id))
+    return steps
+
+
+def primary_key(table):
+    return list(table.primary_key.columns)[0]
+
+
+def check_no_stage_running(session, kind, target_id, target_name):
+    """
+    Raises ValueError if a stage is running on one of the target's campaigns,
+    or queued for one: it would write into rows being deleted, then overwrite
+    the "Deleting" status.
+    """
+    campaigns = session.query(Campaign.name, Campaign.status, User.username).join(User, Campaign.user_id == User.id).filter(
+        Campaign.id == target_id if kind == "campaign" else Campaign.user_id == target_id
+    ).all()
+    stage_jobs = [campaign_args(campaign.username, campaign.name) for campaign in campaigns]
+    pending = stage_jobs and session.query(Job.id).filter(Job.args.in_(stage_jobs), Job.status.in_(UNFINISHED)).first()
+    if pending or any(campaign.status in STAGE_STATUSES for campaign in campaigns):
+        raise ValueError(f"A task is queued or running for {kind} '{target_name}'; delete it once that has finished.")
+
+
+def create_deletion_job(session, kind, target_id, target_name, user_id):
+    """
+    Marks the target's campaigns as being deleted and returns the id of the
+    deletion job, reusing an unfinished one for the same target. Commits.
+    Raises ValueError while a stage is queued or running on the target.
+    """
+    check_no_stage_running(session, kind, target_id, target_name)
+    job = session.query(DeletionJob).filter(
+        DeletionJob.kind == kind, DeletionJob.target_id == target_id, DeletionJob.status.in_(UNFINISHED)
+    ).first()
+    if job is None:
+        job = DeletionJob(kind=kind, target_id=target_id, target_name=target_name, user_id=user_id, status="Queued")
+        session.add(job)
+    campaigns = session.query(Campaign).filter(
+        Campaign.id == target_id if kind == "campaign" else Campaign.user_id == target_id
+    )
+    # job_queue.enqueue refuses stages for them while the rows go away
+    campaigns.update({"status": "Deleting"}, synchronize_session=False)
+    session.flush()
+    # Again now they are marked: a stage queued since the first check is seen here, or sees "Deleting"
+    check_no_stage_running(session, kind, target_id, target_name)
+    session.commit()
+    return job.id
+
+
+def request_campaign_deletion(username, campaign_name):
+    """Queues the deletion of a user's campaign. Returns the job id, or None if there is no such campaign."""
+    with SessionLocal() as session:
+        campaign = session.query(Campaign.id, Campaign.user_id).join(User, Campaign.user_id == User.id).filter(
+            User.username == username, Campaign.name == campaign_name
+        ).first()
+        if not campaign:
+            return None
+        return create_deletion_job(session, "campaign", campaign.id, campaign_name, campaign.user_id)
+
+
+def request_user_deletion(username):
+    """Queues the deletion of a user and everything they own. Returns the job id, or None if there is no such user."""
+    with SessionLocal() as session:
+        user_id = session.query(User.id).filter_by(username=username).scalar()
+        if user_id is None:
+            return None
+        return create_deletion_job(session, "user", user_id, username, user_id)
+
+
+def set_job(job_id, **values):
+    jobs = DeletionJob.__table__
+    with engine.begin() as conn:
+        conn.execute(update(jobs).where(jobs.c.id == job_id).values(**values))
+
+
+def last_attempt(conn, job_id):
+    """Whether the job queue will not run the deletion again if this run fails (always true outside the queue)."""
+    queued = conn.execute(select(Job.attempts, Job.max_attempts).where(
+        Job.kind == "delete_data", Job.args == encode_args({"job_id": job_id}), Job.status == "Running"
+    )).first()
+    return queued is None or queued.attempts >= queued.max_attempts
+
+
+def run_deletion_job(job_id, chunk_size=None):
+    """Deletes the job's rows in chunks, saving progress with each chunk."""
+    chunk_size = chunk_size or DELETE_CHUNK_SIZE
+    jobs = DeletionJob.__table__
+    with engine.connect() as conn:
+        job = conn.execute(select(jobs).where(jobs.c.id == job_id)).first()
+    if job is None or job.status == "Completed":
+        return
+    label = f"{job.kind} '{job.target_name}'"
+    try:
+        steps = deletion_steps(job.kind, job.target_id)
+        with engine.connect() as conn:
+            remaining = sum(
+                conn.execute(select(func.count()).select_from(table).where(criterion)).scalar() for table, criterion in steps
+            )
+        total = job.rows_deleted + remaining
+        set_job(job_id, status="Running", rows_total=total)
+        print(f"[DELETE] Deleting {label}: {remaining} rows in chunks of {chunk_size}.")
+
+        deleted_total, reported = job.rows_deleted, time.monotonic()
+        for table, criterion in steps:
+            key = primary_key(table)
+            while True:
+                with engine.begin() as conn:
+                    deleted = conn.execute(
+                        delete(table).where(key.in_(select(key).where(criterion).limit(chunk_size)))
+                    ).rowcount
+                    if deleted:
+                        conn.execute(update(jobs).where(jobs.c.id == job_id).values(rows_deleted=jobs.c.rows_deleted + deleted))
+                deleted_total += deleted
+                if time.monotonic() - reported >= PROGRESS_EVERY_SECONDS:
+                    print(f"[DELETE] {label}: {deleted_total}/{total} rows deleted ({deleted_total / max(total, 1):.0%}).")
+                    reported = time.monotonic()
+                if deleted < chunk_size:
+                    break
+        set_job(job_id, status="Completed")
+        print(f"[DELETE] ✅ Deleted {label} ({deleted_total} rows).")
+    except Exception as e:
+        with engine.begin() as conn:
+            if last_attempt(conn, job_id):
+                fail_deletion(conn, job_id, e)
+            else:
+                conn.execute(update(jobs).where(jobs.c.id == job_id).values(status=f"Failed: {e}"))
+        print(f"[DELETE] ❌ Deleting {label} failed: {e}")
+        raise  # The job queue retries it; deleting resumes where it stopped
+
+
+def deletion_progress(job_id):
+    """The job's status and progress as a dict, or None if there is no such job."""
+    with engine.connect() as conn:
+        job = conn.execute(select(DeletionJob.__table__).where(DeletionJob.id == job_id)).first()
+    if job is None:
+        return None
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "target": job.target_name,
+        "status": job.status,
+        "rows_deleted": job.rows_deleted,
+        "rows_total": job.rows_total,
+        "percent": round(100 * job.rows_deleted / job.rows_total) if job.rows_total else (100 if job.status == "Completed" else None),
+    }
+
+
+if __name__ == "__main__":
+    try:
+        if len(sys.argv) == 4 and sys.argv[1] == "campaign":
+            job_id = request_campaign_deletion(sys.argv[2], sys.argv[3])
+        elif len(sys.argv) == 3 and sys.argv[1] == "user":
+            job_id = request_user_deletion(sys.argv[2])
+        else:
+            print("Usage: python delete_data.py campaign <username> <campaign_name> | user <username>")
+            sys.exit(1)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    if job_id is None:
+        print("❌ Nothing to delete: not found in database.")
+        sys.exit(1)
+    run_deletion_job(job_id)
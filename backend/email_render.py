@@ -0,0 +1,58 @@
+"""
+Renders the HTML part of an outgoing email at send time.
+
+Only the plain-text body is stored; the HTML (one paragraph per non-empty
+line, plus the open-tracking pixel for that email) is built from it when the
+message is sent, so it never takes space in the database and generation no
+longer needs an email's id before it is saved.
+
+URLs in the body become links through /track_click, each with a signed
+token for that email (backend/link_tokens.py); the plain-text part keeps
+the original URLs.
+"""
+import os
+import re
+import html
+from urllib.parse import quote
+from dotenv import load_dotenv
+from backend.link_tokens import sign_link
+
+load_dotenv()
+
+# The tracking endpoints are part of the FastAPI app on port 8000
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+
+PIXEL_TEMPLATE = '<img src="{base}/track_open?email_id={email_id}" width="1" height="1" alt="" style="display:none;">'
+LINK_TEMPLATE = '<a href="{href}">{text}</a>'
+URL_PATTERN = re.compile(r"https?://[^\s<>\"']+")
+# Sentence punctuation right after a URL is not part of it
+URL_TRAILING_CHARACTERS = ".,;:!?)]}"
+
+
+def tracked_link(email_id, url):
+    return f"{API_BASE_URL}/track_click?t={quote(sign_link(email_id, url), safe='.')}"
+
+
+def render_line(line, email_id):
+    parts, position = [], 0
+    for match in URL_PATTERN.finditer(line):
+        url = match.group().rstrip(URL_TRAILING_CHARACTERS)
+        parts.append(html.escape(line[position:match.start()], quote=False))
+        parts.append(LINK_TEMPLATE.format(href=html.escape(tracked_link(email_id, url)), text=html.escape(url, quote=False)))
+        position = match.start() + len(url)
+    parts.append(html.escape(line[position:], quote=False))
+    return "".join(parts)
+
+
+def render_paragraphs(body, email_id):
+    lines = [render_line(line.strip(), email_id) for line in (body or "").strip().splitlines() if line.strip()]
+    return "<p>" + "</p><p>".join(lines) + "</p>"
+
+
+def tracking_pixel(email_id):
+    return PIXEL_TEMPLATE.format(base=API_BASE_URL, email_id=email_id)
+
+
+def render_html(body, email_id):
+    """HTML alternative for the plain-text `body` of the email with id `email_id`."""
+    return render_paragraphs(body, email_id) + tracking_pixel(email_id)
@@ -0,0 +1,272 @@
+"""
+Website-presence enrichment for scraped leads.
+
+For every lead whose `website` has not been checked yet, two probes run
+concurrently on a pooled, per-host limited fetcher:
+
+  1. the lead's own email domain (skipped for gmail.com, yahoo.com, ...),
+  2. the lead's profile page (Yelp, Instagram, ...), looking for outbound
+     links to a website of its own, which are then probed in turn.
+
+A website that answers is stored in `Lead.website` as its root URL; an empty
+string records "checked, no website" so generation can tell it apart from a
+lead that was never checked or could not be reached (NULL). Results are cached per probe URL in the
+scraper's cache database, so leads sharing a domain or profile cost one probe.
+
+ENRICH_DOMAIN_URL is the template used to probe an email domain; pointing it
+at a local server (e.g. "http://127.0.0.1:8765/domain/{domain}") lets the
+whole stage run against a stand-in, see benchmarks/bench_enrichment.py.
+"""
+import os
+import re
+import sys
+import time
+from urllib.parse import urlsplit, parse_qs
+from sqlalchemy.orm import undefer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from database.db import SessionLocal
+from database.models import User, Campaign, Lead
+from backend.page_fetcher import PooledFetcher
+from backend.scrape_cache import WebsiteCache, normalize_url
+
+ENRICH_WORKERS = int(os.getenv("ENRICH_WORKERS", "16"))
+ENRICH_PER_HOST = int(os.getenv("ENRICH_PER_HOST", "2"))
+ENRICH_TIMEOUT = float(os.getenv("ENRICH_TIMEOUT", "5"))
+DOMAIN_URL = os.getenv("ENRICH_DOMAIN_URL", "https://{domain}")
+MAX_PROFILE_CANDIDATES = 3
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36',
+]
+
+FREEMAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "ymail.com", "outlook.com", "hotmail.com", "live.com",
+    "msn.com", "icloud.com", "me.com", "mac.com", "aol.com", "proton.me", "protonmail.com", "gmx.com",
+    "gmx.net", "mail.com", "yandex.com", "zoho.com", "zohomail.com", "fastmail.com", "hey.com",
+}
+# Links to these are never "the lead's own website": platforms, social networks, link-in-bio and CDNs
+NOT_A_WEBSITE = (
+    "yelp.com", "instagram.com", "facebook.com", "fb.com", "linkedin.com", "twitter.com", "x.com",
+    "tiktok.com", "youtube.com", "youtu.be", "pinterest.com", "threads.net", "whatsapp.com", "wa.me",
+    "google.com", "goo.gl", "gstatic.com", "googleapis.com", "apple.com", "microsoft.com",
+    "linktr.ee", "bit.ly", "cloudfront.net", "akamaihd.net", "fbcdn.net", "cdninstagram.com",
+    "yelpcdn.com", "w3.org", "schema.org",
+)
+WEBSITE_PATTERN = re.compile(r"https?://[\w.-]+|www\.[\w.-]+")
+HREF_PATTERN = re.compile(r"""href=["'](https?://[^"'\s>]+)""", re.IGNORECASE)
+# Outbound links on review sites are often wrapped, e.g. /biz_redir?url=https%3A%2F%2F...
+REDIRECT_PARAMS = ("url", "u", "q", "target", "redirect", "website")
+
+
+def has_website(text):
+    return bool(WEBSITE_PATTERN.search(text or ""))
+
+
+def host_of(url):
+    return (urlsplit(url if "://" in url else "http://" + url).hostname or "").lower().removeprefix("www.")
+
+
+def is_own_website(host, platform_host=""):
+    if not host or "." not in host or host in FREEMAIL_DOMAINS:
+        return False
+    if platform_host and (host == platform_host or host.endswith("." + platform_host)):
+        return False
+    return not any(host == blocked or host.endswith("." + blocked) for blocked in NOT_A_WEBSITE)
+
+
+def email_domain(email):
+    domain = (email or "").rpartition("@")[2].strip().lower()
+    return domain if domain and domain not in FREEMAIL_DOMAINS else None
+
+
+def unwrap_redirect(url):
+    """Returns the target of a wrapped outbound link, or `url` itself."""
+    params = parse_qs(urlsplit(url).query)
+    for name in REDIRECT_PARAMS:
+        for value in params.get(name, []):
+            if value.startswith(("http://", "https://")):
+                return value
+    return url
+
+
+def website_candidates(html, platform_host):
+    """Distinct outbound website URLs linked from a profile page, in page order."""
+    seen, candidates = set(), []
+    for link in HREF_PATTERN.findall(html or ""):
+        url = unwrap_redirect(link.replace("&amp;", "&"))
+        host = host_of(url)
+        if host in seen or not is_own_website(host, platform_host):
+            continue
+        seen.add(host)
+        candidates.append(url)
+        if len(candidates) >= MAX_PROFILE_CANDIDATES:
+            break
+    return candidates
+
+
+class WebsiteProber(PooledFetcher):
+    """
+    Concurrent, cached website probes. Both submit methods return Futures and
+    share in-flight work, so two leads on one domain cost a single request.
+    """
+
+    def __init__(self, cache=None, domain_url=DOMAIN_URL, max_workers=ENRICH_WORKERS,
+                 per_host=ENRICH_PER_HOST, timeout=ENRICH_TIMEOUT):
+        super().__init__(USER_AGENTS, max_workers=max_workers, per_host=per_host, timeout=timeout,
+                         thread_name_prefix="enrich")
+        self.cache = cache
+        self.domain_url = domain_url
+        self.stats = {"hits": 0, "probes": 0, "errors": 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _cached(self, key, compute):
+        if self.cache:
+            found, result = self.cache.get(key)
+            if found:
+                self._count("hits")
+                return result
+        self._count("probes")
+        result = compute()
+        # Network errors (None) are not cached, so the next run tries again
+        if self.cache and result is not None:
+            self.cache.put(key, result)
+        return result
+
+    def _get(self, url):
+        # Streamed, so a probe never downloads more of the page than it reads
+        return self._session().get(url, headers=self._headers(), timeout=self.timeout,
+                                   allow_redirects=True, stream=True)
+
+    def _probe(self, url):
+        """Root URL of the website answering at `url`, "" if none, None on a network error."""
+        try:
+            with self._get(url) as resp:
+                final_host = host_of(resp.url)
+                if resp.status_code >= 400 or not is_own_website(final_host):
+                    return ""
+                parts = urlsplit(resp.url)
+                return f"{parts.scheme}://{parts.netloc}"
+        except Exception:
+            self._count("errors")
+            return None
+
+    def _profile_links(self, url):
+        try:
+            with self._get(url) as resp:
+                if resp.status_code >= 400:
+                    return []
+                return website_candidates(resp.text, host_of(url))
+        except Exception:
+            self._count("errors")
+            return None
+
+    def probe(self, url):
+        """Future resolving to the website root answering at `url`, "" if none, None on error."""
+        key = "site:" + normalize_url(url)
+        return self._submit(key, url, self._cached, key, lambda: self._probe(url))
+
+    def probe_domain(self, domain):
+        return self.probe(self.domain_url.format(domain=domain))
+
+    def profile_links(self, url):
+        """Future resolving to the outbound website links found on a profile page (None on error)."""
+        key = "profile:" + normalize_url(url)
+        return self._submit(key, url, self._cached, key, lambda: self._profile_links(url))
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["probes"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+def find_websites(leads, prober):
+    """
+    Returns {lead.id: website root, "" or None} for `leads`, where None means
+    a probe failed on a network error and no website was found otherwise.
+    Domain and profile probes for every lead are queued up front; links found
+    on profile pages are only probed for leads whose domain did not answer.
+    """
+    domain_futures, profile_futures = {}, {}
+    for lead in leads:
+        domain = email_domain(lead.email)
+        if domain:
+            domain_futures[lead.id] = prober.probe_domain(domain)
+        if lead.profile_link:
+            profile_futures[lead.id] = prober.profile_links(lead.profile_link)
+
+    websites, link_futures = {}, {}
+    for lead in leads:
+        website = domain_futures[lead.id].result() if lead.id in domain_futures else ""
+        if website:
+            websites[lead.id] = website
+            continue
+        links = profile_futures[lead.id].result() if lead.id in profile_futures else []
+        failed = website is None or links is None
+        links = list(links or [])
+        links += [url if "://" in url else "http://" + url for url in WEBSITE_PATTERN.findall(lead.profile_description or "")]
+        link_futures[lead.id] = (failed, [prober.probe(url) for url in links])
+
+    for lead_id, (failed, futures) in link_futures.items():
+        results = [future.result() for future in futures]
+        site = next((result for result in results if result), "")
+        websites[lead_id] = site or (None if failed or None in results else "")
+    return websites
+
+
+def enrich_campaign_leads(session, campaign_id):
+    """
+    Checks every lead of the campaign whose website is still unknown and
+    commits the results. Leads whose probes failed stay unknown for the next run.
+    """
+    # The description is scanned for links, so it is loaded with the leads rather than one by one
+    leads = (
+        session.query(Lead)
+        .options(undefer(Lead.profile_description))
+        .filter(Lead.campaign_id == campaign_id, Lead.website.is_(None))
+        .all()
+    )
+    if not leads:
+        return 0
+    print(f"[ENRICH] Checking {len(leads)} leads for an existing website...")
+    started = time.monotonic()
+    cache = WebsiteCache()
+    with WebsiteProber(cache=cache) as prober:
+        websites = find_websites(leads, prober)
+    cache.close()
+    for lead in leads:
+        lead.website = websites.get(lead.id)
+    session.commit()
+    found = sum(1 for site in websites.values() if site)
+    unknown = sum(1 for site in websites.values() if site is None)
+    elapsed = time.monotonic() - started
+    print(f"[ENRICH] {found}/{len(leads)} leads already have a website "
+          f"({len(leads) / max(elapsed, 1e-9):.1f} leads/s, cache hit rate {prober.hit_rate():.0%}, "
+          f"{unknown} left unknown after network errors).")
+    return len(leads)
+
+
+def enrich_leads_for_campaign(username: str, campaign_name: str):
+    session = SessionLocal()
+    try:
+        user_obj = session.query(User).filter_by(username=username).first()
+        if not user_obj:
+            print(f"❌ User '{username}' not found.")
+            return
+        campaign_obj = session.query(Campaign).filter_by(user_id=user_obj.id, name=campaign_name).first()
+        if not campaign_obj:
+            print(f"❌ Campaign '{campaign_name}' not found for user '{username}'")
+            return
+        enrich_campaign_leads(session, campaign_obj.id)
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python enrich_leads.py <username> <campaign_name>")
+        sys.exit(1)
+    enrich_leads_for_campaign(sys.argv[1], sys.argv[2])
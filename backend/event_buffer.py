@@ -0,0 +1,91 @@
+"""
+In-process buffer that writes events to the database in batches.
+
+Request handlers `add` an event (a list append under a lock) and return at
+once; a background thread hands the buffered events to a `flush` function
+every `interval` seconds, or as soon as `batch_size` events are waiting, so
+a burst of thousands of hits becomes a few short transactions instead of
+one commit per request. A failed flush keeps its events for the next try,
+up to `max_pending` events; beyond that the oldest are dropped (with a
+warning) rather than growing without bound while the database is away.
+
+Events still buffered when the process exits are flushed by `close`, which
+the API calls on shutdown (and atexit, for scripts).
+"""
+import atexit
+import threading
+import time
+
+
+class EventBuffer:
+    def __init__(self, name, flush, batch_size=500, interval=1.0, max_pending=100_000):
+        self.name = name
+        self.flush_batch = flush
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._events = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.dropped = 0
+
+    def add(self, event):
+        with self._lock:
+            self._events.append(event)
+            pending = len(self._events)
+            if self._thread is None:
+                self._start()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes everything buffered so far, a batch at a time. Returns the number of events written."""
+        written = 0
+        while True:
+            with self._lock:
+                batch, self._events = self._events[:self.batch_size], self._events[self.batch_size:]
+            if not batch:
+                return written
+            try:
+                self.flush_batch(batch)
+            except Exception as e:
+                with self._lock:
+                    self._events[:0] = batch
+                    overflow = len(self._events) - self.max_pending
+                    if overflow > 0:
+                        del self._events[:overflow]
+                        self.dropped += overflow
+                print(f"[{self.name.upper()}] ⚠️ Flushing {len(batch)} events failed, will retry: {e}"
+                      + (f" ({overflow} oldest events dropped)" if overflow > 0 else ""))
+                return written
+            written += len(batch)
+            self.flushed += len(batch)
+
+    def pending(self):
+        with self._lock:
+            return len(self._events)
+
+    def close(self, timeout=10.0):
+        """Stops the flusher thread and writes what is left, retrying for up to `timeout` seconds."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            if not self.flush():
+                time.sleep(0.2)
@@ -11,11 +11,17 @@ import time
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from database.db import SessionLocal
 from database.models import Campaign, Lead, EmailContent, User
+from database.bulk import bulk_insert
+from database.campaign_stats import bump as bump_stats, reset_email_counters
+from backend.enrich_leads import enrich_campaign_leads
+from backend.progress import StageProgress
 # Folder creation removed; all data is stored in the database
 # --------- Load API Key ---------
 env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Generated emails are saved in batches, so a long run shows progress and a crash keeps most of it
+EMAIL_INSERT_BATCH_SIZE = 50
 
 # --------- Load Sender Info (User-specific) ---------
 
@@ -44,9 +50,20 @@ def create_prompt(row, sender_info, service="Website Development"):
     state = row['State']
     platform = row['Platform Source']
     description = str(row.get('Profile Description', '') or '').strip()
+    # None: never checked, "": checked and no website found
+    lead_website = row.get('Website')
 
     role_title = INDUSTRY_ROLES.get(industry, f"{industry} Professional")
     title_with_location = f"{role_title} in {state}"
+    if lead_website:
+        website_detail = lead_website
+        website_point = "- Acknowledge their existing website and suggest how it could bring them more clients"
+    elif lead_website == "":
+        website_detail = "None found"
+        website_point = "- Mention they don't have a website"
+    else:
+        website_detail = "Unknown"
+        website_point = "- Do not assume whether they have a website"
 
     prompt = f"""
 You are a professional email copywriter working for a digital agency called {company_name}. 
@@ -63,9 +80,10 @@ Details:
 - State: {state}
 - Source Platform: {platform}
 - Profile Description: "{description or 'N/A'}"
+- Website: {website_detail}
 
 The email should:
-- Mention they don't have a website
+{website_point}
 - Be personalized to their industry and location
 - Be friendly, professional, and concise
 - Start the email with: "Hi {title_with_location},"
@@ -136,14 +154,6 @@ def generate_from_groq(prompt):
 
     return "ERROR", "ERROR"
 
-def convert_to_html(text, email_id):
-    lines = text.strip().splitlines()
-    html = "<p>" + "</p><p>".join(line.strip() for line in lines if line.strip()) + "</p>"
-    # The tracking endpoint is now part of the FastAPI app on port 8000
-    api_base_url = os.getenv("API_BASE_URL", "http://localhost:8000")
-    tracking_pixel = f'<img src="{api_base_url}/track_open?email_id={email_id}" width="1" height="1" alt="" style="display:none;">'
-    return html + tracking_pixel
-
 def generate_emails_for_campaign(username: str, campaign_name: str):
     """
     Generates email content for all leads in a specific campaign for a given user.
@@ -155,15 +165,13 @@ def generate_emails_for_campaign(username: str, campaign_name: str):
         # --- Fetch user object first ---
         user_obj = session.query(User).filter_by(username=username).first()
         if not user_obj:
-            print(f"❌ User '{username}' not found.")
-            return
+            raise Exception(f"User '{username}' not found.")
 
         # --- Fetch sender config from DB ---
         from database.models import SenderConfig
         sender_config = session.query(SenderConfig).filter_by(user_id=user_obj.id).first()
         if not sender_config:
-            print(f"❌ Sender config not found for user '{username}'. Please set it from the Sender Settings UI.")
-            return
+            raise Exception(f"Sender config not found for user '{username}'. Please set it from the Sender Settings UI.")
 
         sender_info = {
             "company_name": sender_config.company_name,
@@ -176,8 +184,7 @@ def generate_emails_for_campaign(username: str, campaign_name: str):
         # --- Fetch campaign using user_id ---
         campaign_obj = session.query(Campaign).filter_by(user_id=user_obj.id, name=campaign_name).first()
         if not campaign_obj:
-            print(f"❌ Campaign '{campaign_name}' not found for user '{username}'")
-            return
+            raise Exception(f"Campaign '{campaign_name}' not found for user '{username}'")
 
         campaign_obj.status = "Generating Emails"
         session.commit()
@@ -185,10 +192,17 @@ def generate_emails_for_campaign(username: str, campaign_name: str):
         # --- Delete existing emails for this campaign ---
         print(f"🗑️ Deleting existing email content for campaign '{campaign_name}'...")
         session.query(EmailContent).filter_by(campaign_id=campaign_obj.id).delete()
+        reset_email_counters(session, campaign_obj.id)
         session.commit()
         print("✅ Existing content deleted.")
 
-        all_leads = session.query(Lead).filter_by(campaign_id=campaign_obj.id).all()
+        # Leads scraped before enrichment existed are checked now
+        enrich_campaign_leads(session, campaign_obj.id)
+
+        # Only the columns the prompt needs
+        all_leads = session.query(
+            Lead.id, Lead.industry, Lead.state, Lead.platform_source, Lead.profile_description, Lead.website
+        ).filter_by(campaign_id=campaign_obj.id).all()
         if not all_leads:
             print("⚠️ No leads found in database for this campaign.")
             campaign_obj.status = "Idle"
@@ -197,30 +211,32 @@ def generate_emails_for_campaign(username: str, campaign_name: str):
 
         print(f"\n📬 Generating emails using Groq API for {len(all_leads)} leads...\n")
 
-        for lead in tqdm(all_leads):
-            prompt = create_prompt({
-                "Industry": lead.industry,
-                "State": lead.state,
-                "Platform Source": lead.platform_source,
-                "Profile Description": lead.profile_description
-            }, sender_info)
-            subject, email = generate_from_groq(prompt)
-
-            # Create a placeholder first to get an ID
-            email_content = EmailContent(
-                lead_id=lead.id,
-                campaign_id=campaign_obj.id,
-                subject=subject,
-                body=email
-            )
-            session.add(email_content)
-            session.flush()  # Assigns an ID to email_content without committing
-
-            # Now generate HTML with the correct ID and update the object
-            email_html = convert_to_html(email, email_id=email_content.id)
-            email_content.html = email_html
-
-        session.commit()
+        # Only the plain-text body is stored: the HTML part and its tracking pixel
+        # are rendered at send time (backend/email_render.py), so no id is needed here
+        pending = []
+        with StageProgress(campaign_obj.id, "generate_emails", total=len(all_leads)) as progress:
+            for lead in tqdm(all_leads):
+                prompt = create_prompt({
+                    "Industry": lead.industry,
+                    "State": lead.state,
+                    "Platform Source": lead.platform_source,
+                    "Profile Description": lead.profile_description,
+                    "Website": lead.website
+                }, sender_info)
+                subject, email = generate_from_groq(prompt)
+                pending.append({"lead_id": lead.id, "campaign_id": campaign_obj.id, "subject": subject, "body": email})
+
+                if len(pending) >= EMAIL_INSERT_BATCH_SIZE:
+                    bulk_insert(session.connection(), EmailContent.__table__, pending)
+                    bump_stats(session, campaign_obj.id, emails_generated=len(pending))
+                    session.commit()
+                    pending = []
+                failed = subject == "ERROR"
+                progress.advance(errors=int(failed), error="Groq API returned no email" if failed else None)
+
+            bulk_insert(session.connection(), EmailContent.__table__, pending)
+            bump_stats(session, campaign_obj.id, emails_generated=len(pending))
+            session.commit()
         campaign_obj.status = "Idle"
         session.commit()
         print("\n✅ Emails saved to database.")
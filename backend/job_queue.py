@@ -0,0 +1,300 @@
+"""
+Database-backed job queue for the pipeline stages.
+
+The API used to run every stage with FastAPI BackgroundTasks inside the
+uvicorn process: jobs died with every reload or restart, nothing limited how
+many ran at once, and there was no way to ask how one was doing. Now the API
+only `enqueue`s a row in the `jobs` table and returns its id; the worker pool
+(backend/worker.py, a separate process) runs them:
+
+- workers `claim_next` the queued job with the highest priority (oldest
+  first), skipping users that already have JOB_MAX_PER_USER jobs running
+  and jobs with an older unfinished job for the same args: stages of one
+  campaign run one at a time, in the order they were queued, whatever
+  their priority;
+- a running job's heartbeat is refreshed every JOB_HEARTBEAT_SECONDS;
+  `recover_stale_jobs` requeues jobs whose worker stopped beating for
+  JOB_STALE_SECONDS (a killed or crashed worker);
+- a job that raises is retried after a growing delay, up to the task's
+  max attempts. Sending is never retried: it could mail leads twice. A stale
+  job that is out of attempts also fails its campaign's stage status, or a
+  campaign left "Sending Emails" could never be sent again; a deletion out
+  of attempts moves its campaigns from "Deleting" to DELETION_FAILED.
+
+On PostgreSQL jobs are claimed with SKIP LOCKED (database/claims.py); two
+workers claiming at the same instant can briefly put one user over the limit.
+"""
+import os
+import sys
+import json
+import socket
+import datetime
+from dotenv import load_dotenv
+from sqlalchemy import select, update, func, exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from database.db import SessionLocal, engine
+from database.models import Job, User, Campaign, DeletionJob
+from database.claims import claim_rows
+
+load_dotenv()
+JOB_MAX_PER_USER = int(os.getenv("JOB_MAX_PER_USER", "2"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+JOB_RETRY_DELAY_SECONDS = float(os.getenv("JOB_RETRY_DELAY_SECONDS", "30"))
+
+# kind -> (module, function, default priority, max attempts)
+TASKS = {
+    "scrape_leads": ("backend.scraper", "run_scraper_for_campaign", 0, 3),  # resumes from its checkpoints
+    "generate_emails": ("backend.generate_emails", "generate_emails_for_campaign", 10, 2),
+    "send_emails": ("backend.send_emails", "send_emails_for_campaign", 20, 1),
+    "run_campaign": ("backend.run_campaign", "run_campaign", 0, 1),
+    "analyze_replies": ("backend.analyze_replies", "analyze_replies", 10, 3),
+    "delete_data": ("backend.delete_data", "run_deletion_job", 5, 3),
+}
+UNFINISHED = ("Queued", "Running")
+# Campaign statuses the stages set while they run
+STAGE_STATUSES = ("Scraping", "Generating Emails", "Sending Emails", "Analyzing Replies")
+# Campaign status once deleting it has failed for good; some of its rows may be gone
+DELETION_FAILED = "Failed: Deletion error"
+
+
+def utcnow():
+    return datetime.datetime.utcnow()
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def encode_args(args):
+    # Campaign stages share one encoding of {"username", "campaign_name"}: equal args mean the same campaign
+    return json.dumps(args, sort_keys=True)
+
+
+def campaign_args(username, campaign_name):
+    """The encoded args of every stage job of a campaign."""
+    return encode_args({"username": username, "campaign_name": campaign_name})
+
+
+def enqueue(kind, args, username=None, priority=None):
+    """
+    Queues task `kind` with keyword arguments `args` for `username` (whose
+    running jobs count towards the per-user limit). An identical job still
+    queued or running is returned instead of a second one. Returns the job id.
+    Returns None, queueing nothing, if `args` name a campaign that does not
+    exist. Raises ValueError for a stage of a campaign that is being deleted.
+    """
+    module, function, default_priority, max_attempts = TASKS[kind]
+    encoded = encode_args(args)
+    with SessionLocal() as session:
+        existing = session.query(Job.id).filter(
+            Job.kind == kind, Job.args == encoded, Job.status.in_(UNFINISHED)
+        ).scalar()
+        if existing is not None:
+            return existing
+        user_id = session.query(User.id).filter_by(username=username).scalar() if username else None
+        job = Job(
+            kind=kind, args=encoded, user_id=user_id, status="Queued", attempts=0, max_attempts=max_attempts,
+            priority=default_priority if priority is None else priority, run_after=utcnow(),
+        )
+        session.add(job)
+        try:
+            session.flush()
+        except IntegrityError:
+            # Queued by a concurrent call since the check above (uq_jobs_unfinished_kind_args): look again
+            session.rollback()
+            return enqueue(kind, args, username, priority)
+        if "campaign_name" in args:
+            # After the insert: a deletion requested meanwhile either is seen here or sees this job
+            if not check_campaign_stage(session, args.get("username"), args["campaign_name"]):
+                return None  # Rolled back when the session closes
+        session.commit()
+        print(f"[QUEUE] Job {job.id} queued: {kind} {args}")
+        return job.id
+
+
+def check_campaign_stage(session, username, campaign_name):
+    """
+    Whether the user has a campaign by that name. Raises ValueError if the
+    campaign is being deleted, or its user is: a stage would write rows for
+    it between delete chunks and overwrite the "Deleting" status.
+    """
+    # Locks the campaign row on PostgreSQL until the job is committed; deletions update it first
+    campaign = session.query(Campaign.id, Campaign.user_id, Campaign.status).join(User, Campaign.user_id == User.id).filter(
+        User.username == username, Campaign.name == campaign_name
+    ).with_for_update(of=Campaign).first()
+    if campaign is None:
+        return False
+    deletions = session.scalars(select(DeletionJob.id).where(
+        ((DeletionJob.kind == "campaign") & (DeletionJob.target_id == campaign.id))
+        | ((DeletionJob.kind == "user") & (DeletionJob.target_id == campaign.user_id))
+    )).all()
+    pending = deletions and session.query(Job.id).filter(
+        Job.kind == "delete_data", Job.args.in_([encode_args({"job_id": d}) for d in deletions]), Job.status.in_(UNFINISHED)
+    ).first()
+    if campaign.status == "Deleting" or pending:
+        raise ValueError(f"Campaign '{campaign_name}' is being deleted.")
+    return True
+
+
+def claim_next(worker_id):
+    """Marks the next runnable job as running for `worker_id`. Returns (id, kind, args, attempts) or None."""
+    busy_users = (
+        select(Job.user_id)
+        .where(Job.status == "Running", Job.user_id.isnot(None))
+        .group_by(Job.user_id)
+        .having(func.count() >= JOB_MAX_PER_USER)
+    )
+    # Priority orders different campaigns; a campaign's own stages wait for the ones queued before them
+    earlier = aliased(Job)
+    waits_for_earlier = exists().where(earlier.args == Job.args, earlier.id < Job.id, earlier.status.in_(UNFINISHED))
+    now = utcnow()
+    with SessionLocal() as session:
+        claimed = claim_rows(
+            session, Job,
+            Job.status == "Queued", Job.run_after <= now,
+            Job.user_id.is_(None) | Job.user_id.not_in(busy_users),
+            ~waits_for_earlier,
+            values={"status": "Running", "worker_id": worker_id, "heartbeat_at": now, "started_at": now,
+                    "attempts": Job.attempts + 1, "error": None},
+            limit=1, order_by=(Job.priority.desc(), Job.id),
+        )
+        if not claimed:
+            session.rollback()
+            return None
+        session.commit()
+        job = session.execute(select(Job.id, Job.kind, Job.args, Job.attempts).where(Job.id == claimed[0])).first()
+        return job.id, job.kind, json.loads(job.args or "{}"), job.attempts
+
+
+def heartbeat(job_id, worker_id):
+    """Refreshes the job's heartbeat. Returns False once the job is no longer this worker's."""
+    with engine.begin() as conn:
+        return bool(conn.execute(
+            update(Job.__table__)
+            .where(Job.id == job_id, Job.worker_id == worker_id, Job.status == "Running")
+            .values(heartbeat_at=utcnow())
+        ).rowcount)
+
+
+def finish(job_id, worker_id, error=None):
+    """
+    Records the outcome of a job run by `worker_id`: Completed, or after an
+    error either Queued again for a later retry or Failed for good. Returns
+    the new status, or None if the job was meanwhile recovered as stale.
+    """
+    jobs = Job.__table__
+    now = utcnow()
+    mine = (jobs.c.id == job_id, jobs.c.worker_id == worker_id, jobs.c.status == "Running")
+    with engine.begin() as conn:
+        if error is None:
+            status, values = "Completed", {"finished_at": now, "error": None}
+        else:
+            attempts, max_attempts = conn.execute(select(jobs.c.attempts, jobs.c.max_attempts).where(jobs.c.id == job_id)).first()
+            if attempts < max_attempts:
+                delay = JOB_RETRY_DELAY_SECONDS * 2 ** (attempts - 1)
+                status, values = "Queued", {"worker_id": None, "error": error, "run_after": now + datetime.timedelta(seconds=delay)}
+            else:
+                status, values = "Failed", {"finished_at": now, "error": error}
+        updated = conn.execute(update(jobs).where(*mine).values(status=status, **values)).rowcount
+    return status if updated else None
+
+
+def release(job_id, worker_id):
+    """Puts a job interrupted by a worker shutdown back in the queue, without counting the attempt."""
+    jobs = Job.__table__
+    with engine.begin() as conn:
+        conn.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.worker_id == worker_id, jobs.c.status == "Running").values(
+            status="Queued", worker_id=None, attempts=jobs.c.attempts - 1, run_after=utcnow()
+        ))
+
+
+def recover_stale_jobs():
+    """Requeues (or fails, when out of attempts) running jobs whose worker stopped sending heartbeats."""
+    jobs = Job.__table__
+    now = utcnow()
+    stale = (jobs.c.status == "Running", jobs.c.heartbeat_at < now - datetime.timedelta(seconds=JOB_STALE_SECONDS))
+    error = "Worker stopped responding"
+    with engine.begin() as conn:
+        requeued = conn.execute(update(jobs).where(*stale, jobs.c.attempts < jobs.c.max_attempts).values(
+            status="Queued", worker_id=None, error=error, run_after=now
+        )).rowcount
+        failed_jobs = conn.execute(
+            update(jobs).where(*stale).values(status="Failed", finished_at=now, error=error).returning(jobs.c.kind, jobs.c.args)
+        ).all()
+        failed = len(failed_jobs)
+        for kind, args in set(failed_jobs):
+            if kind == "delete_data":
+                fail_deletion(conn, json.loads(args)["job_id"], error)
+            else:
+                fail_campaign_stage(conn, args, f"Failed: {error}")
+    if requeued or failed:
+        print(f"[QUEUE] Recovered stale jobs: {requeued} requeued, {failed} failed.")
+    return requeued, failed
+
+
+def fail_campaign_stage(conn, args, status):
+    """
+    Sets `status` on the campaign named in a dead job's `args` if it is
+    still in a stage status and no other job for it is running.
+    """
+    decoded = json.loads(args or "{}")
+    if "campaign_name" not in decoded:
+        return
+    if conn.execute(select(Job.id).where(Job.args == args, Job.status == "Running").limit(1)).first():
+        return
+    user_id = select(User.id).where(User.username == decoded.get("username")).scalar_subquery()
+    conn.execute(update(Campaign.__table__).where(
+        Campaign.user_id == user_id, Campaign.name == decoded["campaign_name"], Campaign.status.in_(STAGE_STATUSES)
+    ).values(status=status))
+
+
+def fail_deletion(conn, deletion_id, error):
+    """
+    Marks a deletion that will not be retried as failed, and moves the
+    campaigns it left "Deleting" to DELETION_FAILED: their stages can run
+    again, and deleting them can be requested again.
+    """
+    deletions = DeletionJob.__table__
+    deletion = conn.execute(select(deletions.c.kind, deletions.c.target_id).where(deletions.c.id == deletion_id)).first()
+    if deletion is None:
+        return
+    conn.execute(update(deletions).where(deletions.c.id == deletion_id, deletions.c.status != "Completed").values(
+        status=f"Failed: {error}"
+    ))
+    target = Campaign.id if deletion.kind == "campaign" else Campaign.user_id
+    conn.execute(update(Campaign.__table__).where(target == deletion.target_id, Campaign.status == "Deleting").values(
+        status=DELETION_FAILED
+    ))
+
+
+def job_status(job_id):
+    """The job as a dict (with its place in the queue while queued), or None if there is no such job."""
+    with engine.connect() as conn:
+        job = conn.execute(select(Job.__table__).where(Job.id == job_id)).first()
+        if job is None:
+            return None
+        position = None
+        if job.status == "Queued":
+            position = conn.execute(select(func.count()).select_from(Job.__table__).where(
+                Job.status == "Queued",
+                (Job.priority > job.priority) | ((Job.priority == job.priority) & (Job.id < job.id)),
+            )).scalar() + 1
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "args": json.loads(job.args or "{}"),
+        "status": job.status,
+        "priority": job.priority,
+        "queue_position": position,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "heartbeat_at": job.heartbeat_at,
+        "finished_at": job.finished_at,
+    }
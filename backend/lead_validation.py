@@ -0,0 +1,112 @@
+"""
+Validation and junk filtering for scraped lead emails.
+
+The scraper's email regex runs over whole HTML pages, so it also picks up
+asset names (logo@2x.png), template placeholders (example@domain.com),
+error-tracker DSNs (…@sentry.wixpress.com) and unattended role mailboxes.
+Each of those would later cost an LLM generation and an SMTP send, so every
+batch goes through `validate_emails` before a Lead row is created.
+
+Checks are vectorized with pandas string operations over the whole batch.
+Optional local lists (one domain per line) add disposable-domain and
+no-MX filtering without any network lookups:
+    LEAD_DISPOSABLE_DOMAINS_FILE, LEAD_NO_MX_DOMAINS_FILE
+"""
+import os
+import re
+from functools import lru_cache
+from collections import Counter
+import pandas as pd
+
+# Strict address syntax: dot-atom local part, LDH domain labels, alphabetic TLD
+EMAIL_SYNTAX = (
+    r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,24}"
+)
+
+FILE_EXTENSION_TLDS = {
+    "png", "jpg", "jpeg", "gif", "webp", "svg", "bmp", "ico", "tif", "tiff", "avif",
+    "css", "js", "json", "xml", "mp4", "webm", "mov", "woff", "woff2", "ttf", "eot", "pdf", "zip",
+}
+PLACEHOLDER_DOMAINS = {
+    "example.com", "example.org", "example.net", "domain.com", "yourdomain.com", "mydomain.com",
+    "email.com", "company.com", "yourcompany.com", "website.com", "yoursite.com", "test.com", "sample.com",
+}
+PLACEHOLDER_LOCAL_PARTS = {
+    "you", "your", "yourname", "your.name", "name", "firstname", "first.last", "john.doe", "jane.doe",
+    "johndoe", "user", "username", "email", "youremail", "example", "test", "sample",
+}
+# Matched as domain suffixes, so ingest.sentry.io or sentry-next.wixpress.com are caught too
+TRACKER_DOMAINS = ("sentry.io", "wixpress.com", "sentry.wixpress.com", "mixpanel.com", "segment.io", "hotjar.com")
+ROLE_LOCAL_PARTS = {
+    "noreply", "no-reply", "no_reply", "donotreply", "do-not-reply", "mailer-daemon", "postmaster",
+    "hostmaster", "webmaster", "abuse", "bounce", "bounces", "unsubscribe", "privacy", "dmca",
+}
+
+TRACKER_PATTERN = r"(?:^|\.)(?:" + "|".join(re.escape(d) for d in TRACKER_DOMAINS) + r")$"
+# Long hex local parts are Sentry DSN keys and similar tokens, never people
+TOKEN_LOCAL_PATTERN = r"[0-9a-f]{16,}"
+
+
+@lru_cache(maxsize=None)
+def load_domain_list(path):
+    if not path or not os.path.exists(path):
+        return frozenset()
+    with open(path, encoding="utf-8") as f:
+        return frozenset(
+            line.strip().lower() for line in f if line.strip() and not line.startswith("#")
+        )
+
+
+def validate_emails(emails):
+    """
+    Normalizes and validates a batch of raw email strings.
+    Returns a DataFrame with the normalized `email` and a `reason` column
+    that is None for valid addresses and the first failed check otherwise.
+    """
+    raw = pd.Series(list(emails), dtype="object").fillna("")
+    email = (
+        raw.str.strip()
+        .str.lower()
+        .str.replace(r"^(?:mailto:|%20|u003e)+", "", regex=True)
+        .str.rstrip(".,;:)>'\"")
+    )
+    parts = email.str.rpartition("@")
+    local, domain = parts[0], parts[2]
+    tld = domain.str.rpartition(".")[2]
+
+    reason = pd.Series(None, index=email.index, dtype="object")
+
+    def reject(mask, why):
+        reason[mask & reason.isna()] = why
+
+    reject(~email.str.fullmatch(EMAIL_SYNTAX), "syntax")
+    reject(tld.isin(FILE_EXTENSION_TLDS), "file_extension")
+    reject(domain.isin(PLACEHOLDER_DOMAINS) | local.isin(PLACEHOLDER_LOCAL_PARTS), "placeholder")
+    reject(domain.str.contains(TRACKER_PATTERN, regex=True) | local.str.fullmatch(TOKEN_LOCAL_PATTERN), "tracker")
+    reject(local.isin(ROLE_LOCAL_PARTS), "role")
+    reject(domain.isin(load_domain_list(os.getenv("LEAD_DISPOSABLE_DOMAINS_FILE"))), "disposable")
+    reject(domain.isin(load_domain_list(os.getenv("LEAD_NO_MX_DOMAINS_FILE"))), "no_mx")
+
+    return pd.DataFrame({"email": email, "reason": reason.astype(object).where(reason.notna(), None)})
+
+
+def filter_leads(leads, rejects=None):
+    """
+    Keeps the lead dicts whose email is valid, with the email normalized.
+    Reject reasons are tallied into the `rejects` Counter when given.
+    """
+    if not leads:
+        return []
+    checked = validate_emails(lead["email"] for lead in leads)
+    if rejects is not None:
+        rejects.update(checked["reason"].dropna())
+    return [
+        {**lead, "email": email}
+        for lead, email, reason in zip(leads, checked["email"], checked["reason"])
+        if pd.isna(reason)
+    ]
+
+
+def format_rejects(rejects):
+    return ", ".join(f"{why}={count}" for why, count in Counter(rejects).most_common())
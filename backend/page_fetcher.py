@@ -0,0 +1,182 @@
+"""
+Bounded concurrent fetcher for the result pages found by the scraper.
+
+Pages are fetched on a thread pool so they overlap with the Selenium
+navigation of the next query. Each worker thread keeps its own keep-alive
+requests.Session, and a per-host limit stops us from hammering a single
+site (yelp.com, linkedin.com, ...) with every worker at once. The limit is
+applied before work reaches the pool: pages of a busy host wait in a queue
+of their own, so the pool threads stay free for other hosts. When a
+PageCache is given, fresh entries are served from disk and stale ones are
+revalidated with If-None-Match / If-Modified-Since.
+"""
+import os
+import re
+import random
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}")
+
+FETCH_WORKERS = int(os.getenv("SCRAPER_FETCH_WORKERS", "16"))
+FETCH_PER_HOST = int(os.getenv("SCRAPER_FETCH_PER_HOST", "2"))
+FETCH_TIMEOUT = float(os.getenv("SCRAPER_FETCH_TIMEOUT", "7"))
+
+
+def extract_emails(text):
+    """Returns the set of email-looking strings found in `text`."""
+    if not text:
+        return set()
+    return set(EMAIL_PATTERN.findall(text))
+
+
+class PooledFetcher:
+    """
+    Thread pool with keep-alive sessions and per-host limits, shared by the
+    concurrent fetchers. Subclasses submit work for a URL with
+    `_submit(key, url, fn, *args)`; work already submitted under the same key
+    shares one Future. At most `per_host` jobs per host are in the pool at
+    once; the rest wait in the host's queue without holding a thread.
+    """
+
+    def __init__(self, user_agents, max_workers=FETCH_WORKERS, per_host=FETCH_PER_HOST, timeout=FETCH_TIMEOUT,
+                 thread_name_prefix="page-fetch"):
+        self.user_agents = user_agents
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self._pool_size = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._host_pending = {}  # host -> deque of (future, fn, args) not yet in the pool
+        self._host_active = {}  # host -> jobs in the pool
+        self._futures = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self.per_host)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+        return session
+
+    def _headers(self):
+        return {"User-Agent": random.choice(self.user_agents)}
+
+    def _submit(self, key, url, fn, *args):
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self._futures[key] = Future()
+                host = urlsplit(url).netloc.lower()
+                self._host_pending.setdefault(host, deque()).append((future, fn, args))
+                self._dispatch(host)
+            return future
+
+    def _dispatch(self, host):
+        # Called with self._lock held: moves the host's queued work into the pool while it has free slots
+        pending = self._host_pending.get(host)
+        while pending and self._host_active.get(host, 0) < self.per_host:
+            future, fn, args = pending.popleft()
+            self._host_active[host] = self._host_active.get(host, 0) + 1
+            self._executor.submit(self._run, host, future, fn, args)
+        if not pending:
+            self._host_pending.pop(host, None)
+
+    def _run(self, host, future, fn, args):
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                self._host_active[host] -= 1
+                self._dispatch(host)
+                self._drained.notify_all()
+
+    def close(self):
+        # Queued work only enters the pool as earlier work of its host finishes: wait for all of it first
+        with self._drained:
+            self._drained.wait_for(lambda: not self._host_pending)
+        self._executor.shutdown(wait=True)
+
+
+class PageFetcher(PooledFetcher):
+    """
+    Fetches pages concurrently and returns the emails found on each one.
+
+    `submit(url)` returns a Future resolving to a set of emails. A URL that is
+    already in flight (or was already fetched during this run) shares the
+    same Future, so duplicate links across dork patterns cost one request.
+    """
+
+    def __init__(self, user_agents, cache=None, metrics=None, max_workers=FETCH_WORKERS, per_host=FETCH_PER_HOST, timeout=FETCH_TIMEOUT):
+        super().__init__(user_agents, max_workers=max_workers, per_host=per_host, timeout=timeout)
+        self.cache = cache
+        self.metrics = metrics
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "errors": 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def fetch(self, url):
+        """Fetches `url` on the calling thread, outside the per-host limit. Errors yield an empty set."""
+        if self.metrics is None:
+            return self._fetch(url)
+        with self.metrics.timed("fetching"):
+            emails = self._fetch(url)
+        self.metrics.count("pages")
+        return emails
+
+    def _fetch(self, url):
+        cached = self.cache.get(url) if self.cache else None
+        headers = self._headers()
+        if cached:
+            emails, etag, last_modified, is_fresh = cached
+            if is_fresh:
+                self._count("hits")
+                return emails
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        try:
+            resp = self._session().get(url, headers=headers, timeout=self.timeout)
+            if resp.status_code == 304 and cached:
+                self._count("revalidated")
+                self.cache.touch(url)
+                return cached[0]
+            self._count("misses")
+            if resp.status_code == 200:
+                emails = extract_emails(resp.text)
+                if self.cache:
+                    self.cache.put(url, emails, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+                return emails
+        except Exception:
+            self._count("errors")
+        return set()
+
+    def hit_rate(self):
+        served = self.stats["hits"] + self.stats["revalidated"]
+        total = served + self.stats["misses"]
+        return served / total if total else 0.0
+
+    def submit(self, url):
+        return self._submit(url, url, self.fetch, url)
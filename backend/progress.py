@@ -0,0 +1,256 @@
+"""
+Live progress of the pipeline stages of a campaign.
+
+A stage reports what it is doing through a `StageProgress`:
+
+    with StageProgress(campaign.id, "send_emails", total=len(emails)) as progress:
+        for email in emails:
+            ...
+            progress.advance(errors=0 if sent else 1, error=None if sent else reason)
+
+Every change is published to the subscribers of the campaign in this
+process (`subscribe`), and stored in the `campaign_progress` table, one row
+per campaign and stage. Stages run in the worker pool, a different process
+than the API, so the table is what carries their progress across:
+GET /campaigns/{id}/events relays local events as they come and reads the
+table every PROGRESS_POLL_SECONDS for the rest. Counts are written at most
+every PROGRESS_WRITE_SECONDS per stage; starting, finishing and failing
+always are. A failed progress write is logged and never fails the stage.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import datetime
+import threading
+from collections import defaultdict
+from dotenv import load_dotenv
+from sqlalchemy import select, update, insert
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from database.db import engine, read_engine
+from database.models import Campaign, CampaignProgress
+
+load_dotenv()
+PROGRESS_WRITE_SECONDS = float(os.getenv("PROGRESS_WRITE_SECONDS", "1"))
+PROGRESS_POLL_SECONDS = float(os.getenv("PROGRESS_POLL_SECONDS", "1"))
+ERROR_MAX_LENGTH = 500
+# Comment lines keep idle streams open through proxies that drop silent connections
+KEEPALIVE_SECONDS = 15
+
+_subscribers = defaultdict(set)
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(campaign_id, callback):
+    """Calls `callback(event)` for every event of the campaign published in this process, from the publishing thread."""
+    with _subscribers_lock:
+        _subscribers[campaign_id].add(callback)
+
+
+def unsubscribe(campaign_id, callback):
+    with _subscribers_lock:
+        _subscribers[campaign_id].discard(callback)
+        if not _subscribers[campaign_id]:
+            del _subscribers[campaign_id]
+
+
+def publish(event):
+    with _subscribers_lock:
+        callbacks = list(_subscribers.get(event["campaign_id"], ()))
+    for callback in callbacks:
+        try:
+            callback(event)
+        except Exception as e:
+            print(f"[PROGRESS] ⚠️ Subscriber failed: {e}")
+
+
+def utcnow():
+    return datetime.datetime.utcnow()
+
+
+def stage_event(campaign_id, stage, status, processed, total, errors, last_error, message, started_at, updated_at, finished_at):
+    """The event (and /progress entry) of a stage, with its throughput so far."""
+    elapsed = ((finished_at or updated_at) - started_at).total_seconds() if started_at and updated_at else 0
+    return {
+        "campaign_id": campaign_id,
+        "stage": stage,
+        "status": status,
+        "processed": processed,
+        "total": total,
+        "errors": errors,
+        "last_error": last_error,
+        "message": message,
+        # Not before a second has passed: the first items alone would give wild rates
+        "per_second": round(processed / elapsed, 2) if elapsed >= 1 else None,
+        "started_at": started_at.isoformat() if started_at else None,
+        "updated_at": updated_at.isoformat() if updated_at else None,
+        "finished_at": finished_at.isoformat() if finished_at else None,
+    }
+
+
+class StageProgress:
+    """Progress of one stage run; as a context manager it completes the stage, or fails it on an exception."""
+
+    def __init__(self, campaign_id, stage, total=None, processed=0):
+        self.campaign_id = campaign_id
+        self.stage = stage
+        self.total = total
+        self.processed = processed
+        self.errors = 0
+        self.last_error = None
+        self.message = None
+        self.status = "Running"
+        self.started_at = utcnow()
+        self.finished_at = None
+        self._last_write = 0.0
+        self._changed(force=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.fail(f"{exc_type.__name__}: {exc}")
+        elif self.status == "Running":
+            self.finish()
+        return False
+
+    def advance(self, count=1, errors=0, error=None, message=None):
+        """Counts `count` more items processed, `errors` of which failed (the latest with `error`)."""
+        self.processed += count
+        self.errors += errors
+        if error:
+            self.last_error = str(error)[:ERROR_MAX_LENGTH]
+        if message is not None:
+            self.message = message
+        self._changed()
+
+    def finish(self, message=None):
+        self.status = "Completed"
+        self.message = message or self.message
+        self.finished_at = utcnow()
+        self._changed(force=True)
+
+    def fail(self, error):
+        self.status = "Failed"
+        self.last_error = str(error)[:ERROR_MAX_LENGTH]
+        self.finished_at = utcnow()
+        self._changed(force=True)
+
+    def event(self):
+        return stage_event(
+            self.campaign_id, self.stage, self.status, self.processed, self.total, self.errors, self.last_error,
+            self.message, self.started_at, utcnow(), self.finished_at,
+        )
+
+    def _changed(self, force=False):
+        event = self.event()
+        publish(event)
+        if force or time.monotonic() - self._last_write >= PROGRESS_WRITE_SECONDS:
+            self._last_write = time.monotonic()
+            try:
+                store(self)
+            except Exception as e:
+                print(f"[PROGRESS] ⚠️ Could not save progress of {self.stage} for campaign {self.campaign_id}: {e}")
+
+
+def store(progress):
+    table = CampaignProgress.__table__
+    values = {
+        "status": progress.status, "processed": progress.processed, "total": progress.total,
+        "errors": progress.errors, "last_error": progress.last_error, "message": progress.message,
+        "started_at": progress.started_at, "updated_at": utcnow(), "finished_at": progress.finished_at,
+    }
+    key = (table.c.campaign_id == progress.campaign_id, table.c.stage == progress.stage)
+    with engine.begin() as conn:
+        if not conn.execute(update(table).where(*key).values(**values)).rowcount:
+            conn.execute(insert(table).values(campaign_id=progress.campaign_id, stage=progress.stage, **values))
+
+
+def campaign_progress(executor, campaign_id):
+    """Latest stored event of every stage the campaign has run, most recently started first."""
+    table = CampaignProgress.__table__
+    rows = executor.execute(
+        select(table).where(table.c.campaign_id == campaign_id).order_by(table.c.started_at.desc())
+    ).all()
+    return [
+        stage_event(campaign_id, row.stage, row.status, row.processed, row.total, row.errors, row.last_error,
+                    row.message, row.started_at, row.updated_at, row.finished_at)
+        for row in rows
+    ]
+
+
+def campaign_snapshot(campaign_id):
+    """{"campaign_id", "status", "stages"} of the campaign, or None if it doesn't exist. Two indexed reads."""
+    with read_engine.connect() as conn:
+        status = conn.execute(select(Campaign.status).where(Campaign.id == campaign_id)).first()
+        if status is None:
+            return None
+        return {"campaign_id": campaign_id, "status": status[0], "stages": campaign_progress(conn, campaign_id)}
+
+
+def _sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+def _state(event):
+    return (event["status"], event["processed"], event["total"], event["errors"], event["last_error"], event["message"])
+
+
+async def stream_events(campaign_id, is_disconnected):
+    """
+    Server-sent events for the campaign until the client goes away (or the
+    campaign is deleted): "campaign" when its status changes, "stage" when a
+    stage starts or finishes, "progress" for new counts, "error" when a stage
+    counts another failed item.
+    """
+    loop = asyncio.get_running_loop()
+    local = asyncio.Queue()
+
+    def relay(event):
+        loop.call_soon_threadsafe(local.put_nowait, event)
+
+    subscribe(campaign_id, relay)
+    sent, campaign_status = {}, object()
+    next_poll, last_write = 0.0, time.monotonic()
+    try:
+        while not await is_disconnected():
+            events = []
+            try:
+                events.append(await asyncio.wait_for(local.get(), timeout=max(next_poll - time.monotonic(), 0)))
+            except asyncio.TimeoutError:
+                pass
+            if time.monotonic() >= next_poll:
+                next_poll = time.monotonic() + PROGRESS_POLL_SECONDS
+                snapshot = await asyncio.to_thread(campaign_snapshot, campaign_id)
+                if snapshot is None:
+                    yield _sse("campaign", {"campaign_id": campaign_id, "status": "Deleted"})
+                    return
+                if snapshot["status"] != campaign_status:
+                    campaign_status = snapshot["status"]
+                    yield _sse("campaign", {"campaign_id": campaign_id, "status": campaign_status})
+                    last_write = time.monotonic()
+                # Oldest first, so the latest stage is the last one a client sees
+                events.extend(reversed(snapshot["stages"]))
+            for event in events:
+                previous = sent.get(event["stage"])
+                # The table lags behind local events: never step back to an older state
+                if previous is not None and (_state(previous) == _state(event) or
+                                             (event["started_at"], event["updated_at"]) < (previous["started_at"], previous["updated_at"])):
+                    continue
+                sent[event["stage"]] = event
+                if previous is None or previous["status"] != event["status"] or previous["started_at"] != event["started_at"]:
+                    event_type = "stage"
+                elif event["errors"] > previous["errors"]:
+                    event_type = "error"
+                else:
+                    event_type = "progress"
+                yield _sse(event_type, event)
+                last_write = time.monotonic()
+            if time.monotonic() - last_write >= KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_write = time.monotonic()
+    finally:
+        unsubscribe(campaign_id, relay)
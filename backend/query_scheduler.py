@@ -0,0 +1,140 @@
+"""
+Adaptive pacing for Google queries.
+
+Instead of a fixed 4-7 second sleep, every browser identity (user agent +
+proxy) gets its own delay that widens when Google starts answering with
+CAPTCHAs, block pages or errors and narrows again while queries succeed.
+Outcomes are kept over a sliding window; when the block rate of an identity
+crosses SCRAPER_BLOCK_RATE_LIMIT it is paused and the worker rotates to a
+fresh identity, so we spend less time (and fewer Capsolver solves) on an
+identity Google has already flagged.
+"""
+import os
+import time
+import random
+import threading
+from collections import deque, Counter
+
+# Outcomes reported by the scraper for every query
+OK = "ok"
+EMPTY = "empty"
+CAPTCHA = "captcha"  # challenge shown; the query is parked for an async solve
+CAPTCHA_SOLVED = "captcha_solved"  # a parked query resumed successfully
+CAPTCHA_FAILED = "captcha_failed"
+BLOCKED = "blocked"
+ERROR = "error"
+BAD_OUTCOMES = {CAPTCHA, CAPTCHA_FAILED, BLOCKED, ERROR}
+
+BASE_DELAY = (float(os.getenv("SCRAPER_MIN_DELAY", "4")), float(os.getenv("SCRAPER_MAX_DELAY", "7")))
+MAX_BACKOFF = float(os.getenv("SCRAPER_MAX_BACKOFF", "8"))
+WINDOW_SECONDS = float(os.getenv("SCRAPER_BLOCK_WINDOW_SECONDS", "600"))
+BLOCK_RATE_LIMIT = float(os.getenv("SCRAPER_BLOCK_RATE_LIMIT", "0.3"))
+MIN_SAMPLES = 5
+PAUSE_SECONDS = float(os.getenv("SCRAPER_IDENTITY_PAUSE_SECONDS", "900"))
+CAPTCHA_COST = float(os.getenv("CAPSOLVER_COST_PER_SOLVE", "0.0008"))
+
+
+class IdentityState:
+    def __init__(self):
+        self.outcomes = deque()  # (timestamp, outcome) within the sliding window
+        self.backoff = 1.0
+        self.paused_until = 0.0
+        self.totals = Counter()
+
+
+class AdaptiveScheduler:
+    """Thread-safe; shared by all browser workers of a scrape."""
+
+    def __init__(self, base_delay=BASE_DELAY, max_backoff=MAX_BACKOFF, window=WINDOW_SECONDS,
+                 block_rate_limit=BLOCK_RATE_LIMIT, pause_seconds=PAUSE_SECONDS):
+        self.base_delay = base_delay
+        self.max_backoff = max_backoff
+        self.window = window
+        self.block_rate_limit = block_rate_limit
+        self.pause_seconds = pause_seconds
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._identities = {}
+
+    def _state(self, identity):
+        state = self._identities.get(identity)
+        if state is None:
+            state = self._identities[identity] = IdentityState()
+        return state
+
+    def _trim(self, state, now):
+        while state.outcomes and now - state.outcomes[0][0] > self.window:
+            state.outcomes.popleft()
+
+    @staticmethod
+    def _block_rate(state):
+        if len(state.outcomes) < MIN_SAMPLES:
+            return 0.0
+        return sum(1 for _, outcome in state.outcomes if outcome in BAD_OUTCOMES) / len(state.outcomes)
+
+    def record(self, identity, outcome):
+        """
+        Records a query outcome. Returns True when the identity's block rate
+        has spiked and the caller should rotate to another identity.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(identity)
+            state.outcomes.append((now, outcome))
+            state.totals[outcome] += 1
+            self._trim(state, now)
+
+            if outcome in BAD_OUTCOMES:
+                state.backoff = min(self.max_backoff, state.backoff * 1.5)
+            elif outcome == EMPTY:
+                # Empty pages are often a soft block; widen a little
+                state.backoff = min(self.max_backoff, state.backoff * 1.1)
+            else:
+                state.backoff = max(1.0, state.backoff * 0.9)
+
+            if self._block_rate(state) >= self.block_rate_limit:
+                print(f"[SCHEDULER] Block rate {self._block_rate(state):.0%} for {identity}; pausing it for {self.pause_seconds:.0f}s.")
+                state.paused_until = now + self.pause_seconds
+                state.outcomes.clear()
+                return True
+            return False
+
+    def delay(self, identity):
+        with self._lock:
+            backoff = self._state(identity).backoff
+        return random.uniform(*self.base_delay) * backoff
+
+    def wait(self, identity, stop=None, pause=True):
+        """
+        Sleeps out any pause on `identity` (unless `pause` is False) plus its
+        current adaptive delay, or until the `stop` event is set. Returns
+        seconds slept.
+        """
+        with self._lock:
+            paused = max(0.0, self._state(identity).paused_until - time.monotonic()) if pause else 0.0
+        seconds = paused + self.delay(identity)
+        if stop is None:
+            time.sleep(seconds)
+            return seconds
+        started = time.monotonic()
+        stop.wait(seconds)
+        return time.monotonic() - started
+
+    def is_paused(self, identity):
+        with self._lock:
+            return self._state(identity).paused_until > time.monotonic()
+
+    def summary(self):
+        """Prints per-identity outcomes plus successful queries per hour and per CAPTCHA dollar."""
+        with self._lock:
+            totals = Counter()
+            for identity, state in self._identities.items():
+                totals.update(state.totals)
+                print(f"[SCHEDULER] {identity}: {dict(state.totals)} (delay x{state.backoff:.1f})")
+        hours = max(time.monotonic() - self.started, 1.0) / 3600
+        successes = totals[OK] + totals[EMPTY] + totals[CAPTCHA_SOLVED]
+        solves = totals[CAPTCHA_SOLVED] + totals[CAPTCHA_FAILED]
+        line = f"[SCHEDULER] {successes / hours:.0f} successful queries/hour, {solves} CAPTCHA solve(s)"
+        if solves and CAPTCHA_COST:
+            line += f", {successes / (solves * CAPTCHA_COST):.0f} successful queries per Capsolver dollar"
+        print(line)
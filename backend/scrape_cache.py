@@ -0,0 +1,217 @@
+"""
+Persistent on-disk caches for the scraper.
+
+PageCache: result pages cached by normalized URL. Only the set of emails
+extracted from a page is stored (never the HTML), together with the
+ETag/Last-Modified validators so stale entries can be revalidated with a
+conditional GET.
+
+SerpCache: parsed Google results (title, link, snippet) keyed by the
+formatted dork query, so campaigns that share a platform/industry/location
+skip the browser navigation for queries another campaign ran recently.
+Queries that found nothing are not cached, so they are asked again.
+
+WebsiteCache: lead enrichment results (does this domain answer, which
+websites does this profile page link to), so leads sharing a domain or a
+profile are only probed once per TTL.
+
+All three share one SQLite file of their own (SCRAPER_CACHE_PATH), so they
+never contend with app.db.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_PATH = os.getenv("SCRAPER_CACHE_PATH", os.path.join(BASE_DIR, "scrape_cache.db"))
+PAGE_CACHE_TTL = float(os.getenv("SCRAPER_PAGE_CACHE_TTL_HOURS", "168")) * 3600
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("SCRAPER_PAGE_CACHE_MAX_ENTRIES", "200000"))
+SERP_CACHE_TTL = float(os.getenv("SCRAPER_SERP_CACHE_TTL_HOURS", "168")) * 3600
+WEBSITE_CACHE_TTL = float(os.getenv("ENRICH_CACHE_TTL_HOURS", "720")) * 3600
+
+# Query parameters that never change the content of a page
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "ref", "ref_src", "igshid", "sa", "ved", "usg"}
+EVICT_EVERY = 500
+
+
+def normalize_url(url):
+    """Canonical cache key: lowercase scheme/host; fragment, default port, tracking params and trailing slash dropped."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def open_cache_db(path):
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class PageCache:
+    """
+    URL -> extracted emails cache with TTL, conditional revalidation and LRU eviction.
+    Safe to share between the fetcher's worker threads.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=PAGE_CACHE_TTL, max_entries=PAGE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = open_cache_db(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS page_cache (
+                url_key TEXT PRIMARY KEY,
+                emails TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_page_cache_accessed_at ON page_cache (accessed_at)")
+
+    def get(self, url):
+        """
+        Returns (emails, etag, last_modified, is_fresh) or None on a miss.
+        A hit also refreshes the entry's LRU position.
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT emails, etag, last_modified, fetched_at FROM page_cache WHERE url_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE page_cache SET accessed_at = ? WHERE url_key = ?", (now, key))
+        emails, etag, last_modified, fetched_at = row
+        return set(json.loads(emails)), etag, last_modified, (now - fetched_at) < self.ttl
+
+    def put(self, url, emails, etag=None, last_modified=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_cache (url_key, emails, etag, last_modified, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), json.dumps(sorted(emails)), etag, last_modified, now, now),
+            )
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict()
+
+    def touch(self, url):
+        """Marks a revalidated (304) entry as fresh again."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE page_cache SET fetched_at = ?, accessed_at = ? WHERE url_key = ?",
+                (now, now, normalize_url(url)),
+            )
+
+    def _evict(self):
+        # Drop the least recently used entries beyond the size cap
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM page_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM page_cache WHERE url_key IN "
+                "(SELECT url_key FROM page_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.close()
+
+
+class SerpCache:
+    """Formatted query -> list of {"title", "link", "snippet"} results, with a TTL."""
+
+    def __init__(self, path=CACHE_PATH, ttl=SERP_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = open_cache_db(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS serp_cache (
+                query TEXT PRIMARY KEY,
+                results TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, query):
+        """Returns the cached results if they are younger than the TTL, else None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results FROM serp_cache WHERE query = ? AND fetched_at > ?",
+                (query, time.time() - self.ttl),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, query, results):
+        # An empty page is often a soft block, not an answer: caching it would hide the query for a whole TTL
+        if not results:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO serp_cache (query, results, fetched_at) VALUES (?, ?, ?)",
+                (query, json.dumps(results), time.time()),
+            )
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM serp_cache WHERE fetched_at <= ?", (time.time() - self.ttl,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WebsiteCache:
+    """Probe key -> JSON-serializable enrichment result, with a TTL."""
+
+    def __init__(self, path=CACHE_PATH, ttl=WEBSITE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = open_cache_db(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS website_cache (
+                probe_key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                checked_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, key):
+        """Returns (True, result) for a fresh entry, else (False, None)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM website_cache WHERE probe_key = ? AND checked_at > ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+        return (True, json.loads(row[0])) if row else (False, None)
+
+    def put(self, key, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO website_cache (probe_key, result, checked_at) VALUES (?, ?, ?)",
+                (key, json.dumps(result), time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,61 @@
+"""
+Throughput and time-split accounting for one scrape run.
+
+Stages are summed across threads, so with several browsers and fetch
+workers running at once the stage totals can exceed the wall-clock time.
+"""
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+STAGES = ("navigation", "parsing", "fetching", "sleeping")
+
+
+class ScrapeMetrics:
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.finished = None
+        self.seconds = Counter()
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] += seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+
+    @contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def stop(self):
+        self.finished = time.monotonic()
+
+    def report(self):
+        with self._lock:
+            elapsed = max((self.finished or time.monotonic()) - self.started, 1e-9)
+            return {
+                "elapsed_seconds": elapsed,
+                "queries": self.counts["queries"],
+                "queries_per_minute": self.counts["queries"] / elapsed * 60,
+                "pages": self.counts["pages"],
+                "pages_per_second": self.counts["pages"] / elapsed,
+                "leads": self.counts["leads"],
+                **{f"{stage}_seconds": self.seconds[stage] for stage in STAGES},
+            }
+
+    def summary(self):
+        r = self.report()
+        split = ", ".join(f"{stage} {r[f'{stage}_seconds']:.1f}s" for stage in STAGES)
+        print(f"[METRICS] {r['queries']} queries in {r['elapsed_seconds']:.1f}s "
+              f"({r['queries_per_minute']:.1f}/min), {r['pages']} pages ({r['pages_per_second']:.1f}/s), "
+              f"{r['leads']} leads. Time split: {split}")
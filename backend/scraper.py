@@ -3,29 +3,40 @@ import sys
 import os
 import json
 import time
-import random
-import re
 import requests
 import base64
+import queue
+import threading
+from concurrent.futures import wait as futures_wait
 from pathlib import Path
-from bs4 import BeautifulSoup
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from itertools import product
-import logging
+from collections import Counter
 import capsolver
 from dotenv import load_dotenv
 
 # Setup paths
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from database.db import SessionLocal
-from database.models import User, Campaign, SenderConfig, Lead
+from database.models import User, Campaign, SenderConfig, Lead, ScrapeProgress
+from backend.page_fetcher import PageFetcher, extract_emails
+from backend.scrape_cache import PageCache, SerpCache
+from backend.browser_pool import IdentityPool, RateLimiter, start_sessions
+from backend.query_scheduler import AdaptiveScheduler
+import backend.query_scheduler as scheduling
+from backend.captcha_queue import CaptchaSolveQueue
+from backend.lead_validation import filter_leads, format_rejects
+from backend.enrich_leads import enrich_campaign_leads
+from database.blind_index import email_hash
+from database.bulk import bulk_insert
+from database.campaign_stats import bump as bump_stats
+from backend.scrape_metrics import ScrapeMetrics
+from backend.progress import StageProgress
+from backend.serp_parser import parse_serp, selectors as serp_selectors
 
 # --------- Constants ---------
 USER_AGENTS = [
@@ -48,15 +59,21 @@ DORK_PATTERNS = [
 # Load environment variables from .env file
 load_dotenv()
 
+# Streamed leads are committed every LEAD_BATCH_SIZE new leads or LEAD_FLUSH_SECONDS
+LEAD_BATCH_SIZE = int(os.getenv("SCRAPER_LEAD_BATCH_SIZE", "25"))
+LEAD_FLUSH_SECONDS = float(os.getenv("SCRAPER_LEAD_FLUSH_SECONDS", "15"))
+# Also skip addresses already collected by any other campaign of the same user
+DEDUPE_ACROSS_CAMPAIGNS = os.getenv("SCRAPER_DEDUPE_ACROSS_CAMPAIGNS", "false").lower() == "true"
+WORKER_DONE = object()
+# Overridable so the offline benchmark harness can stand in for Google
+SEARCH_URL = os.getenv("SCRAPER_SEARCH_URL", "https://www.google.com/search")
+
 # Access the API key and set it for the capsolver library
 capsolver.api_key = os.getenv("CAPSOLVER_API_KEY")
 
 
 # --------- Utility Functions ---------
 
-def has_website(text):
-    return bool(re.search(r"https?://[\w.-]+|www\.[\w.-]+", text))
-
 def is_captcha_present(driver):
     """
     ### FINAL VERSION - Detects reCAPTCHA v2 ###
@@ -72,162 +89,416 @@ def is_captcha_present(driver):
     except TimeoutException:
         return False
 
-def solve_recaptcha(driver):
+def read_captcha_challenge(driver):
     """
-    ### FINAL VERSION - Solves reCAPTCHA v2 ###
-    Solves the Google reCAPTCHA v2 using Capsolver's ReCaptchaV2TaskProxyless.
+    Reads the reCAPTCHA v2 challenge on the current page.
+    Returns (page_url, sitekey) for Capsolver, or None if no sitekey is found.
     """
-    print("[CAPTCHA] reCAPTCHA v2 detected. Solving with Capsolver...")
+    print("[CAPTCHA] reCAPTCHA v2 detected. Queuing a Capsolver solve...")
     try:
-        # 1. Extract the sitekey from the g-recaptcha div element on the page.
+        # Extract the sitekey from the g-recaptcha div element on the page.
         recaptcha_element = WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.CLASS_NAME, "g-recaptcha"))
         )
         sitekey = recaptcha_element.get_attribute("data-sitekey")
-        
-        if not sitekey:
-            print("[CAPTCHA] FATAL: Could not find the reCAPTCHA sitekey on the page.")
-            return False
+    except Exception as e:
+        print(f"[CAPTCHA] An unexpected error occurred while reading the reCAPTCHA: {e}")
+        return None
+    if not sitekey:
+        print("[CAPTCHA] FATAL: Could not find the reCAPTCHA sitekey on the page.")
+        return None
+    return driver.current_url, sitekey
 
-        print(f"[CAPTCHA] Sitekey found: {sitekey}")
-        
-        # 2. Create the task on Capsolver with the correct type.
-        solution = capsolver.solve({
-            "type": "ReCaptchaV2TaskProxyless",
-            "websiteURL": driver.current_url,
-            "websiteKey": sitekey
-        })
-        
-        recaptcha_token = solution.get("gRecaptchaResponse")
-        if not recaptcha_token:
-            print("[CAPTCHA] FAILED: Capsolver did not return a solution token.")
-            print(f"[CAPTCHA] Full response from Capsolver: {solution}")
-            return False
-            
-        print("[CAPTCHA] Solution token received from Capsolver.")
-
-        # 3. Inject the solution token into the hidden textarea element.
+def submit_captcha_token(driver, recaptcha_token):
+    """
+    Injects a solved reCAPTCHA v2 token into the challenge page and submits it.
+    Returns True once the browser has left the CAPTCHA page.
+    """
+    try:
+        # 1. Inject the solution token into the hidden textarea element.
         driver.execute_script(
-            f"document.getElementById('g-recaptcha-response').innerHTML = '{recaptcha_token}';"
+            "document.getElementById('g-recaptcha-response').innerHTML = arguments[0];", recaptcha_token
         )
-        print("[CAPTCHA] Injected solution token into the page.")
-        
-        # 4. Find and click the submit button.
+
+        # 2. Find and click the submit button.
         submit_button = WebDriverWait(driver, 10).until(
             EC.element_to_be_clickable((By.CSS_SELECTOR, "button[type='submit'], input[type='submit']"))
         )
         submit_button.click()
-        print("[CAPTCHA] Submit button clicked.")
-
-        # 5. Wait and verify that we have successfully left the CAPTCHA page.
-        time.sleep(5)
-        if "sorry/index" in driver.current_url:
-            print("[CAPTCHA] FAILED. Still on CAPTCHA page after submission.")
-            return False
-        else:
-            print("[CAPTCHA] SUCCESS! CAPTCHA appears to be solved.")
-            return True
 
+        # 3. Verify that we have successfully left the CAPTCHA page.
+        WebDriverWait(driver, 10).until(lambda d: "sorry/index" not in d.current_url)
+        print("[CAPTCHA] SUCCESS! CAPTCHA appears to be solved.")
+        return True
+    except TimeoutException:
+        print("[CAPTCHA] FAILED. Still on CAPTCHA page after submission.")
+        return False
     except Exception as e:
-        print(f"[CAPTCHA] An unexpected error occurred during reCAPTCHA solving: {e}")
+        print(f"[CAPTCHA] An unexpected error occurred during reCAPTCHA submission: {e}")
         return False
 
-def scrape_google(combinations):
+class ParkedQuery:
+    """A query that hit a CAPTCHA and is waiting for its Capsolver token."""
+
+    def __init__(self, task, challenge_url, token_future):
+        self.task = task
+        self.challenge_url = challenge_url
+        self.token_future = token_future
+
+def build_query(platform, industry, location, dork):
+    site_domain = platform if '.' in platform else f"{platform}.com"
+    return dork.format(site_domain=site_domain, industry=industry, location=location)
+
+def run_query(driver, query, metrics):
     """
-    Initializes a headless Selenium driver and scrapes Google for leads.
+    Runs one dork query in `driver`.
+    Returns (outcome, results) where outcome is one of the query_scheduler
+    outcomes and results is the parsed SERP, or None when the query could not
+    be run. A CAPTCHA is reported as scheduling.CAPTCHA and left on screen for
+    the caller to park.
     """
-    # Setup robust browser options for a server environment
-    options = Options()
-    # options.add_argument("--headless=new")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--window-size=1920,1200")
-    # options.add_argument("--disable-features=SignInPromoUI") # Prevents the Chrome sign-in popup
-    options.add_argument("--disable-blink-features=AutomationControlled") # Helps avoid bot detection
-    options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
-    options.add_experimental_option('useAutomationExtension', False)
-    
-    # Suppress console logs from Selenium
-    service = Service(log_path=os.devnull)
-    logging.getLogger('selenium').setLevel(logging.CRITICAL)
+    with metrics.timed("navigation"):
+        driver.get(SEARCH_URL + "?q=" + requests.utils.quote(query))
+        captcha = is_captcha_present(driver)
+    if captcha:
+        return scheduling.CAPTCHA, None
+    return collect_results(driver, scheduling.OK, metrics)
+
+def resume_parked_query(driver, parked, metrics):
+    """Reopens a parked query's challenge page, submits the solved token and collects the results."""
+    token = parked.token_future.result()
+    if not token:
+        print("[INFO] Skipping query due to failed CAPTCHA.")
+        return scheduling.CAPTCHA_FAILED, None
+    with metrics.timed("navigation"):
+        driver.get(parked.challenge_url)
+        # Google may already have lifted the block, in which case we land on the results
+        solved = not is_captcha_present(driver) or submit_captcha_token(driver, token)
+    if not solved:
+        print("[INFO] Skipping query due to failed CAPTCHA.")
+        return scheduling.CAPTCHA_FAILED, None
+    return collect_results(driver, scheduling.CAPTCHA_SOLVED, metrics)
 
+def collect_results(driver, outcome, metrics):
+    """Parses the SERP currently loaded in `driver`."""
+    # Wait for the first result, then parse the whole page in-process
     try:
-        driver = webdriver.Chrome(service=service, options=options)
-    except WebDriverException as e:
-        print(f"❌ Failed to start WebDriver: {e}. Ensure Chrome/ChromeDriver are installed and compatible.")
-        return []
+        with metrics.timed("navigation"):
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, serp_selectors()["result"]))
+            )
+            html = driver.page_source
+    except TimeoutException:
+        if "sorry/index" in driver.current_url:
+            return scheduling.BLOCKED, None
+        # A genuine "no results" page; the query is done
+        return scheduling.EMPTY, []
+    with metrics.timed("parsing"):
+        results = parse_serp(html)
+    return (outcome if results else scheduling.EMPTY), results
+
+def queue_result_pages(task, results, fetcher):
+    """
+    Queues every result page of a query on `fetcher`.
+    Returns the pending (result fields, snippet emails, Future) entries.
+    """
+    platform, industry, location, _ = task
+    pending = []
+    for result in results:
+        # The page itself is fetched in the background while we move on
+        fields = {
+            "name": result["title"],
+            "platform_source": platform.capitalize(),
+            "profile_link": result["link"],
+            "state": location,
+            "industry": industry,
+        }
+        pending.append((fields, extract_emails(result["snippet"]), fetcher.submit(result["link"])))
+    return pending
 
+def build_leads(pending):
+    """Turns a query's fetched result pages into lead dicts."""
     leads = []
-    email_pattern = r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}"
-    for platform, industry, location in combinations:
-        site_domain = platform if '.' in platform else f"{platform}.com"
-        for dork in DORK_PATTERNS:
-            query = dork.format(site_domain=site_domain, industry=industry, location=location)
-            print(f"[SEARCH] {query}")
+    for fields, emails, future in pending:
+        for email in emails | future.result():
+            leads.append({
+                **fields,
+                "email": email.strip().lower(),
+                "profile_description": ""
+            })
+    return leads
+
+def emit_finished_queries(in_flight, results, wait=False):
+    """
+    Puts (task, leads) on `results` for every query whose result pages have
+    all been fetched. Returns the queries still in flight (none when `wait`).
+    A query whose pages could not be read is dropped, so the next run retries it.
+    """
+    still_in_flight = []
+    for task, pending in in_flight:
+        if not wait and not all(future.done() for _, _, future in pending):
+            still_in_flight.append((task, pending))
+            continue
+        try:
+            leads = build_leads(pending)
+        except Exception as e:
+            print(f"[ERROR] Could not collect the result pages of {build_query(*task)}: {e}")
+            continue
+        results.put((task, leads))
+    return still_in_flight
+
+class ScrapeContext:
+    """State shared by every worker thread of one scrape_google run."""
+
+    def __init__(self, tasks, fetcher, serp_cache, identities, metrics):
+        self.tasks = tasks
+        self.fetcher = fetcher
+        self.serp_cache = serp_cache
+        self.identities = identities
+        self.metrics = metrics
+        self.rate_limiter = RateLimiter()
+        self.scheduler = AdaptiveScheduler()
+        self.captchas = CaptchaSolveQueue()
+        self.results = queue.Queue()
+        self.stop = threading.Event()
+
+def replay_cached_queries(cached, ctx):
+    """Feeds queries answered by the SerpCache through the page fetcher, no browser needed."""
+    try:
+        in_flight = [(task, queue_result_pages(task, serp_results, ctx.fetcher)) for task, serp_results in cached]
+        emit_finished_queries(in_flight, ctx.results, wait=True)
+    except Exception as e:
+        print(f"[ERROR] Replaying cached queries failed: {e}")
+    finally:
+        # scrape_google waits for one WORKER_DONE per thread, whatever happened
+        ctx.results.put(WORKER_DONE)
+
+def scrape_worker(session, ctx):
+    """
+    Pulls (platform, industry, location, dork) tasks off the shared queue and
+    runs them in this worker's browser until the queue is empty or `stop` is set.
+    Pacing comes from the AdaptiveScheduler, which may ask us to rotate identity.
+
+    A query that hits a CAPTCHA is parked while Capsolver works on it, and the
+    worker backs off from Google until the token comes back: another query
+    from the browser that was just challenged would most likely be challenged
+    too and cost another solve. The parked query then resumes in the same
+    browser, which the challenge is tied to, while other workers keep scraping.
+    """
+    in_flight = []  # (task, pending entries) whose result pages are still being fetched
+    parked = None
+    rotate_due = False
+    try:
+        while not ctx.stop.is_set():
+            resuming = None
+            if parked is not None:
+                if not parked.token_future.done():
+                    # No new query on this identity until the challenge is answered
+                    with ctx.metrics.timed("sleeping"):
+                        futures_wait([parked.token_future], timeout=1)
+                    in_flight = emit_finished_queries(in_flight, ctx.results)
+                    continue
+                resuming, parked = parked, None
+                task = resuming.task
+            else:
+                try:
+                    task = ctx.tasks.get_nowait()
+                except queue.Empty:
+                    break
+            query = build_query(*task)
+            print(f"[{'RESUME' if resuming else 'SEARCH'}] ({session.label}) {query}")
             try:
-                # Set a realistic user agent for each request
-                driver.execute_cdp_cmd('Network.setUserAgentOverride', {"userAgent": random.choice(USER_AGENTS)})
-                driver.get("https://www.google.com/search?q=" + requests.utils.quote(query))
-                
-                # Check for and solve the reCAPTCHA if it appears
-                if is_captcha_present(driver):
-                    if not solve_recaptcha(driver):
-                        print("[INFO] Skipping query due to failed CAPTCHA.")
-                        continue # Move to the next dork
-                
-                # Proceed to scrape results
-                results = WebDriverWait(driver, 10).until(
-                    EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.tF2Cxc, div.g"))
-                )
-
-                for result in results:
-                    try:
-                        title = result.find_element(By.CSS_SELECTOR, "h3").text
-                        link = result.find_element(By.CSS_SELECTOR, "a").get_attribute("href")
-                        
-                        description = ""
-                        try:
-                            description = result.find_element(By.CSS_SELECTOR, "div.VwiC3b, span.st").text
-                        except NoSuchElementException:
-                            pass
-
-                        emails = set(re.findall(email_pattern, description))
-                        
-                        try:
-                            resp = requests.get(link, headers={"User-Agent": random.choice(USER_AGENTS)}, timeout=7)
-                            if resp.status_code == 200:
-                                page_emails = set(re.findall(email_pattern, resp.text))
-                                emails.update(page_emails)
-                        except Exception:
-                            pass
-
-                        if emails:
-                            for email in emails:
-                                leads.append({
-                                    "name": title,
-                                    "email": email.strip().lower(),
-                                    "platform_source": platform.capitalize(),
-                                    "profile_link": link,
-                                    "state": location,
-                                    "industry": industry,
-                                    "profile_description": "" 
-                                })
-                    except Exception as e:
-                        print(f"Error parsing an individual result: {e}")
-                        continue
-                
-                # Wait a bit before the next search to avoid being blocked
-                time.sleep(random.uniform(4, 7))
+                if resuming:
+                    outcome, serp_results = resume_parked_query(session.driver, resuming, ctx.metrics)
+                else:
+                    ctx.metrics.add("sleeping", ctx.rate_limiter.acquire())
+                    outcome, serp_results = run_query(session.driver, query, ctx.metrics)
 
+                if outcome == scheduling.CAPTCHA:
+                    challenge = read_captcha_challenge(session.driver)
+                    if challenge:
+                        parked = ParkedQuery(task, challenge[0], ctx.captchas.submit(*challenge))
+                        print(f"[CAPTCHA] ({session.label}) Query parked until Capsolver returns a token; backing off meanwhile.")
+                    else:
+                        outcome = scheduling.CAPTCHA_FAILED
+                elif serp_results is not None:
+                    ctx.serp_cache.put(query, serp_results)
+                    in_flight.append((task, queue_result_pages(task, serp_results, ctx.fetcher)))
+
+                # Hand over every query whose pages finished while this one was navigating
+                in_flight = emit_finished_queries(in_flight, ctx.results)
             except Exception as e:
-                print(f"[ERROR] A critical error occurred in the main search loop: {e}")
-                driver.save_screenshot('error_screenshot.png') # Helpful for debugging
+                outcome = scheduling.ERROR
+                print(f"[ERROR] A critical error occurred in the main search loop ({session.label}): {e}")
+                try:
+                    session.driver.save_screenshot(f'error_screenshot_{session.index}.png') # Helpful for debugging
+                except Exception:
+                    pass  # The driver itself may be what failed
+
+            try:
+                rotate_due = ctx.scheduler.record(session.identity, outcome) or rotate_due
+                # A parked query resumes in this browser first: its challenge belongs to this identity
+                if rotate_due and parked is None:
+                    session.rotate(ctx.identities, ctx.scheduler)
+                    rotate_due = False
+            except WebDriverException as e:
+                print(f"❌ {session.label} could not restart after rotating identity: {e}")
+                break
+
+            # Wait before the next search; the delay adapts to how blocked this identity is. A parked
+            # query skips the identity's pause: its token expires in about two minutes, so it resumes
+            # first, and the deferred rotation or pause follows
+            ctx.metrics.add("sleeping", ctx.scheduler.wait(session.identity, ctx.stop, pause=parked is None))
+    except Exception as e:
+        print(f"[ERROR] {session.label} stopped: {e}")
+    finally:
+        # Always hand over what was fetched, and always report done: scrape_google waits for every worker
+        emit_finished_queries(in_flight, ctx.results, wait=True)
+        ctx.results.put(WORKER_DONE)
+
+def scrape_google(combinations, completed=frozenset(), metrics=None):
+    """
+    Scrapes Google for leads with a pool of headless browsers.
+    Every (platform, industry, location, dork) query goes on a shared queue
+    that the browser workers drain in parallel under one global rate budget.
+    Queries with fresh results in the SerpCache skip the browser entirely.
+
+    This is a generator: it yields (task, leads) as soon as each query's result
+    pages have been fetched. Tasks in `completed` are skipped, and queries that
+    could not be run are never yielded, so they are retried on the next run.
+    Throughput and time split are recorded on `metrics` (a ScrapeMetrics).
+    """
+    metrics = metrics or ScrapeMetrics()
+    serp_cache = SerpCache()
+    serp_cache.purge_expired()
+    tasks = queue.Queue()
+    cached = []
+    for platform, industry, location in combinations:
+        for dork in DORK_PATTERNS:
+            task = (platform, industry, location, dork)
+            if task in completed:
                 continue
-    driver.quit()
-    print(f"Total leads found: {len(leads)}")
-    return leads
+            serp_results = serp_cache.get(build_query(*task))
+            if serp_results is not None:
+                cached.append((task, serp_results))
+            else:
+                tasks.put(task)
+    if not cached and tasks.empty():
+        print("[POOL] Every query for this campaign has already been run.")
+        serp_cache.close()
+        return
+    if cached:
+        print(f"[CACHE] {len(cached)} queries answered from the SERP cache.")
+
+    identities = IdentityPool(USER_AGENTS)
+    sessions = start_sessions(identities) if not tasks.empty() else []
+    if sessions:
+        print(f"[POOL] {tasks.qsize()} queries across {len(sessions)} headless browser(s).")
+    elif not tasks.empty():
+        print(f"[POOL] No browser could be started; {tasks.qsize()} queries left for the next run.")
+
+    page_cache = PageCache()
+    fetcher = PageFetcher(USER_AGENTS, cache=page_cache, metrics=metrics)
+    ctx = ScrapeContext(tasks, fetcher, serp_cache, identities, metrics)
+    workers = [
+        threading.Thread(target=scrape_worker, args=(session, ctx), name=session.label)
+        for session in sessions
+    ]
+    if cached:
+        workers.append(threading.Thread(target=replay_cached_queries, args=(cached, ctx), name="serp-cache"))
+    for worker in workers:
+        worker.start()
+
+    try:
+        running = len(workers)
+        while running:
+            item = ctx.results.get()
+            if item is WORKER_DONE:
+                running -= 1
+                continue
+            metrics.count("queries")
+            metrics.count("leads", len(item[1]))
+            yield item
+    finally:
+        # Also reached when the consumer stops early: let the workers wind down
+        ctx.stop.set()
+        for worker in workers:
+            worker.join()
+        for session in sessions:
+            session.quit()
+        fetcher.close()
+        page_cache.close()
+        serp_cache.close()
+        ctx.captchas.close()
+        metrics.stop()
+        ctx.scheduler.summary()
+        ctx.captchas.summary()
+        stats = fetcher.stats
+        print(f"[CACHE] Page cache hit rate: {fetcher.hit_rate():.0%} "
+              f"(hits={stats['hits']}, revalidated={stats['revalidated']}, misses={stats['misses']}, errors={stats['errors']})")
+        metrics.summary()
+
+class LeadWriter:
+    """
+    Persists streamed leads in small validated, deduplicated batches.
+
+    Each flush commits the new leads together with the ScrapeProgress rows of
+    the queries they came from and the campaign's lead counter, so a crash
+    loses at most one batch and a rerun skips every query that was already
+    saved.
+    """
+
+    def __init__(self, session, campaign_obj, batch_size=LEAD_BATCH_SIZE, flush_seconds=LEAD_FLUSH_SECONDS):
+        self.session = session
+        self.campaign_id = campaign_obj.id
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        # Dedupe on the blind index, so known leads are never loaded or decrypted
+        known = session.query(Lead.email_hash)
+        if DEDUPE_ACROSS_CAMPAIGNS:
+            known = known.join(Campaign, Lead.campaign_id == Campaign.id).filter(Campaign.user_id == campaign_obj.user_id)
+        else:
+            known = known.filter(Lead.campaign_id == campaign_obj.id)
+        self.existing_hashes = {hashed for (hashed,) in known if hashed}
+        self.rejects = Counter()
+        self.scraped = 0
+        self.saved = 0
+        self.completed = 0
+        self._leads = []
+        self._tasks = []
+        self._last_flush = time.monotonic()
+
+    def add(self, task, leads):
+        self.scraped += len(leads)
+        # Junk addresses (asset names, placeholders, trackers, ...) never become leads
+        for lead_dict in filter_leads(leads, self.rejects):
+            hashed = email_hash(lead_dict["email"])
+            if hashed not in self.existing_hashes:
+                self.existing_hashes.add(hashed)
+                self._leads.append({**lead_dict, "email_hash": hashed, "campaign_id": self.campaign_id})
+        self._tasks.append(task)
+        if len(self._leads) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
 
-def run_scraper_for_campaign(username: str, campaign_name: str):
+    def flush(self):
+        if self._leads or self._tasks:
+            # COPY on PostgreSQL, one multi-row INSERT on SQLite
+            bulk_insert(self.session.connection(), Lead.__table__, self._leads)
+            bump_stats(self.session, self.campaign_id, leads=len(self._leads))
+            self.session.add_all(
+                ScrapeProgress(campaign_id=self.campaign_id, platform=platform, industry=industry, location=location, dork=dork)
+                for platform, industry, location, dork in self._tasks
+            )
+            self.session.commit()
+            if self._leads:
+                print(f"[TASK] Saved {len(self._leads)} new leads ({self.saved + len(self._leads)} this run).")
+            self.saved += len(self._leads)
+            self.completed += len(self._tasks)
+            self._leads = []
+            self._tasks = []
+        self._last_flush = time.monotonic()
+
+def run_scraper_for_campaign(username: str, campaign_name: str, metrics=None):
     """
     Main task function that connects to the DB and runs the scraper.
     """
@@ -250,33 +521,48 @@ def run_scraper_for_campaign(username: str, campaign_name: str):
         locations = campaign_obj.locations.split(",")
         combinations = list(product(platforms, industries, locations))
 
-        leads_data = scrape_google(combinations)
-        
-        if leads_data:
-            existing_emails = {lead.email for lead in campaign_obj.leads}
-            new_leads_added = 0
-            for lead_dict in leads_data:
-                if lead_dict["email"] not in existing_emails:
-                    new_lead = Lead(**lead_dict, campaign_id=campaign_obj.id)
-                    session.add(new_lead)
-                    existing_emails.add(new_lead.email)
-                    new_leads_added += 1
-            if new_leads_added > 0:
-                print(f"[TASK] SUCCESS: Saved {new_leads_added} new leads for campaign '{campaign_name}'.")
-                session.commit()
-            else:
-                print(f"[TASK] INFO: Scraped {len(leads_data)} leads, but all were duplicates.")
+        total_queries = len(combinations) * len(DORK_PATTERNS)
+        completed = {
+            (p.platform, p.industry, p.location, p.dork)
+            for p in session.query(ScrapeProgress).filter_by(campaign_id=campaign_obj.id)
+        }
+        if completed:
+            print(f"[TASK] Resuming: {len(completed)}/{total_queries} queries were already scraped.")
+
+        writer = LeadWriter(session, campaign_obj)
+        with StageProgress(campaign_obj.id, "scrape_leads", total=total_queries, processed=len(completed)) as progress:
+            for task, leads in scrape_google(combinations, completed, metrics):
+                writer.add(task, leads)
+                progress.advance(message=f"{writer.saved} new leads saved")
+            writer.flush()
+            progress.finish(message=f"{writer.saved} new leads saved")
+        if writer.rejects:
+            print(f"[VALIDATION] Rejected {sum(writer.rejects.values())} scraped emails for campaign "
+                  f"'{campaign_name}': {format_rejects(writer.rejects)}")
+
+        if writer.saved > 0:
+            print(f"[TASK] SUCCESS: Saved {writer.saved} new leads for campaign '{campaign_name}'.")
+        elif writer.scraped > 0:
+            print(f"[TASK] INFO: Scraped {writer.scraped} leads, but all were duplicates.")
         else:
             print("[TASK] INFO: Scraper finished with no new leads found.")
-            
+
+        # Lets generation tell businesses that already have a website apart
+        enrich_campaign_leads(session, campaign_obj.id)
+
+        # A fully finished scrape starts from scratch next time; a partial one resumes
+        if len(completed) + writer.completed >= total_queries:
+            session.query(ScrapeProgress).filter_by(campaign_id=campaign_obj.id).delete()
+
         campaign_obj.status = "Idle"
         session.commit()
     except Exception as e:
         print(f"[TASK] FAILED for campaign '{campaign_name}': {e}")
+        session.rollback()
         if campaign_obj:
             campaign_obj.status = "Failed: Scraping error"
             session.commit()
-        session.rollback()
+        raise  # The job queue records the failure and retries the scrape
     finally:
         session.close()
 
@@ -2,13 +2,19 @@ import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from dotenv import load_dotenv
+from collections import Counter
 import os
 import sys
 from pathlib import Path
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from sqlalchemy import update
 from database.db import SessionLocal
+from database.claims import claim_rows
+from database.campaign_stats import bump as bump_stats, delivery_field
+from backend.email_render import render_html
+from backend.progress import StageProgress
 from database.models import Campaign, EmailContent, Lead, User, SenderConfig
 
 # --------- Load SMTP credentials from .env ---------
@@ -28,14 +34,12 @@ def send_emails_for_campaign(username: str, campaign_name: str):
         # Get user object
         user = session.query(User).filter_by(username=username).first()
         if not user:
-            print(f"❌ User '{username}' not found in database.")
-            return
+            raise Exception(f"User '{username}' not found in database.")
 
         # Get sender config from DB
         sender_config = session.query(SenderConfig).filter_by(user_id=user.id).first()
         if not sender_config:
-            print(f"❌ Sender config not found in database for user '{username}'")
-            return
+            raise Exception(f"Sender config not found in database for user '{username}'")
 
         # Set reply-to (fallback to SMTP username if empty)
         reply_to_email = sender_config.sender_email or SMTP_USERNAME
@@ -43,15 +47,26 @@ def send_emails_for_campaign(username: str, campaign_name: str):
         # Get campaign
         campaign_obj = session.query(Campaign).filter_by(user_id=user.id, name=campaign_name).first()
         if not campaign_obj:
-            print(f"❌ Campaign '{campaign_name}' not found for user '{username}'")
-            return
-
-        campaign_obj.status = "Sending Emails"
+            raise Exception(f"Campaign '{campaign_name}' not found for user '{username}'")
+
+        # Claim the campaign so a second sender (another API worker or host) can't send the same emails
+        if not claim_rows(
+            session, Campaign, Campaign.id == campaign_obj.id,
+            Campaign.status.is_(None) | Campaign.status.in_(["Idle", "Completed"]) | Campaign.status.like("Failed%"),
+            values={"status": "Sending Emails"},
+        ):
+            session.rollback()
+            campaign_obj = None  # Leave the running task's status alone
+            raise Exception(f"Campaign '{campaign_name}' is busy; not sending.")
         session.commit()
 
-        # Use a join to fetch both EmailContent and Lead in one query, avoiding N+1 problem.
-        # Also, only fetch emails that have not been sent yet to avoid re-sending.
-        emails_to_send = session.query(EmailContent, Lead).join(Lead, EmailContent.lead_id == Lead.id).filter(
+        # Use a join to fetch the email and its recipient in one query, avoiding N+1 problem.
+        # Only the columns needed to send are selected (no lead profile, no reply),
+        # and only emails that have not been sent yet to avoid re-sending.
+        emails_to_send = session.query(
+            EmailContent.id, EmailContent.subject, EmailContent.body, EmailContent.html,
+            EmailContent.delivery_status, Lead.email
+        ).join(Lead, EmailContent.lead_id == Lead.id).filter(
             EmailContent.campaign_id == campaign_obj.id,
             (EmailContent.delivery_status == None) | (EmailContent.delivery_status != 'Sent')
         ).all()
@@ -64,40 +79,58 @@ def send_emails_for_campaign(username: str, campaign_name: str):
 
         print(f"\n📤 Sending {len(emails_to_send)} emails via SMTP...\n")
 
-        # --------- Setup SMTP server ---------
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-
-        # --------- Send Emails ---------
-        for email, lead in emails_to_send:
-            recipient = lead.email.strip().lower() if lead and lead.email else None
-
-            if not recipient or "@" not in recipient:
-                email.delivery_status = "Invalid Email"
-                continue
-
-            try:
-                msg = MIMEMultipart("alternative")
-                msg["Subject"] = email.subject
-                msg["From"] = SMTP_USERNAME
-                msg["To"] = recipient
-                msg["Reply-To"] = reply_to_email
-
-                msg.attach(MIMEText(email.body, "plain"))
-                msg.attach(MIMEText(email.html, "html"))
-
-                server.sendmail(SMTP_USERNAME, recipient, msg.as_string())
-
-                email.delivery_status = "Sent"
-                print(f"✅ Sent to {recipient}")
-
-            except Exception as e:
-                email.delivery_status = f"Failed: {str(e)}"
-                print(f"❌ Failed to {recipient} — {e}")
-
-        session.commit()
-        server.quit()
+        with StageProgress(campaign_obj.id, "send_emails", total=len(emails_to_send)) as progress:
+            # --------- Setup SMTP server ---------
+            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
+            server.starttls()
+            server.login(SMTP_USERNAME, SMTP_PASSWORD)
+
+            # --------- Send Emails ---------
+            statuses = []
+            previous_status = {}
+            for email_id, subject, body, html, delivery_status, lead_email in emails_to_send:
+                previous_status[email_id] = delivery_status
+                recipient = lead_email.strip().lower() if lead_email else None
+
+                if not recipient or "@" not in recipient:
+                    statuses.append({"id": email_id, "delivery_status": "Invalid Email"})
+                    progress.advance(errors=1, error=f"Invalid email address: {recipient}")
+                    continue
+
+                try:
+                    msg = MIMEMultipart("alternative")
+                    msg["Subject"] = subject
+                    msg["From"] = SMTP_USERNAME
+                    msg["To"] = recipient
+                    msg["Reply-To"] = reply_to_email
+
+                    msg.attach(MIMEText(body, "plain"))
+                    # Emails generated by older releases carry a stored HTML copy; others are rendered now
+                    msg.attach(MIMEText(html or render_html(body, email_id), "html"))
+
+                    server.sendmail(SMTP_USERNAME, recipient, msg.as_string())
+
+                    statuses.append({"id": email_id, "delivery_status": "Sent"})
+                    print(f"✅ Sent to {recipient}")
+                    progress.advance()
+
+                except Exception as e:
+                    statuses.append({"id": email_id, "delivery_status": f"Failed: {str(e)}"})
+                    print(f"❌ Failed to {recipient} — {e}")
+                    progress.advance(errors=1, error=f"{recipient}: {e}")
+
+            # Statuses are written by primary key, without loading the email rows back
+            if statuses:
+                session.execute(update(EmailContent), statuses)
+                # Retried emails move from failed to sent: count what each status change adds and removes
+                deltas = Counter()
+                for status in statuses:
+                    deltas[delivery_field(previous_status[status["id"]])] -= 1
+                    deltas[delivery_field(status["delivery_status"])] += 1
+                deltas.pop(None, None)
+                bump_stats(session, campaign_obj.id, **deltas)
+            session.commit()
+            server.quit()
         campaign_obj.status = "Idle"
         session.commit()
         print("\n✅ All done. Email statuses saved to the database.")
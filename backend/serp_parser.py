@@ -0,0 +1,59 @@
+"""
+In-process parsing of Google result pages.
+
+The scraper grabs `driver.page_source` once per query and hands it to
+`parse_serp`, instead of paying a chromedriver round trip for every title,
+link and snippet. All CSS selectors live in SERP_SELECTORS, keyed by layout
+version, so a Google markup change is fixed by adding one entry here.
+"""
+import os
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+SERP_SELECTORS = {
+    # Layout in use since 2023: results are div.tF2Cxc inside the older div.g wrapper
+    "2023-01": {
+        "result": "div.tF2Cxc, div.g",
+        "title": "h3",
+        "link": "a[href]",
+        "snippet": "div.VwiC3b, span.st",
+    },
+}
+SERP_LAYOUT_VERSION = os.getenv("SCRAPER_SERP_LAYOUT", "2023-01")
+
+
+def selectors(version=SERP_LAYOUT_VERSION):
+    return SERP_SELECTORS[version]
+
+
+def parse_serp(html, version=SERP_LAYOUT_VERSION):
+    """
+    Returns the organic results on a SERP as a list of
+    {"title", "link", "snippet"} dicts, in page order and deduplicated by link.
+    """
+    sel = selectors(version)
+    soup = BeautifulSoup(html, HTML_PARSER)
+    results = []
+    seen_links = set()
+    for block in soup.select(sel["result"]):
+        title_el = block.select_one(sel["title"])
+        link_el = block.select_one(sel["link"])
+        if title_el is None or link_el is None:
+            continue
+        link = link_el.get("href", "")
+        # The outer div.g and inner div.tF2Cxc match the same result
+        if not link.startswith(("http://", "https://")) or link in seen_links:
+            continue
+        seen_links.add(link)
+        snippet_el = block.select_one(sel["snippet"])
+        results.append({
+            "title": title_el.get_text(" ", strip=True),
+            "link": link,
+            "snippet": snippet_el.get_text(" ", strip=True) if snippet_el else "",
+        })
+    return results
@@ -0,0 +1,181 @@
+"""
+Open and click tracking for the /track_open pixel and /track_click links.
+
+Every pixel hit used to commit its own UPDATE (plus a counter upsert) before
+the image was returned, so a campaign landing in thousands of inboxes at
+once queued thousands of writers on the database lock, and each request
+also re-read pixel.png from disk. Now the handler only records the hit in
+`open_events`, an in-process buffer (backend/event_buffer.py), and returns
+the pixel from memory. The buffer is flushed every TRACK_FLUSH_SECONDS (or
+every TRACK_BATCH_SIZE hits) in one transaction that:
+
+- marks the emails opened, counting first opens in campaign_stats;
+- sets their first_opened_at (once) and last_opened_at;
+- inserts every hit into email_open_events, with the user agent and the
+  client's network (ip_class), not its full address.
+
+/track_click works the same way with `click_events`: the link's token
+(backend/link_tokens.py) names the email and the URL, so the redirect is
+answered without touching the database, and each flush marks the emails
+clicked (and opened: image proxies hide many opens, a click proves one),
+adds clicks to campaign_stats and inserts every click into
+email_click_events.
+
+Hits for emails that don't exist are dropped. Events of the last second can
+be lost if the API process is killed outright; a normal shutdown flushes.
+"""
+import os
+import sys
+import datetime
+import ipaddress
+from collections import Counter
+from dotenv import load_dotenv
+from sqlalchemy import select, update, func, bindparam
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from database.db import engine
+from database.models import EmailContent, EmailOpenEvent, EmailClickEvent
+from database.campaign_stats import bump as bump_stats
+from database.bulk import bulk_insert
+from backend.event_buffer import EventBuffer
+
+load_dotenv()
+TRACK_BATCH_SIZE = int(os.getenv("TRACK_BATCH_SIZE", "500"))
+TRACK_FLUSH_SECONDS = float(os.getenv("TRACK_FLUSH_SECONDS", "1"))
+TRACK_BUFFER_MAX = int(os.getenv("TRACK_BUFFER_MAX", "100000"))
+# Only behind a reverse proxy that sets X-Forwarded-For; otherwise clients could forge it
+TRACK_TRUST_FORWARDED_FOR = os.getenv("TRACK_TRUST_FORWARDED_FOR", "false").lower() == "true"
+USER_AGENT_MAX_LENGTH = 300
+
+PIXEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../static/pixel.png"))
+PIXEL_BYTES = open(PIXEL_PATH, "rb").read() if os.path.exists(PIXEL_PATH) else b""
+# Every open and click must reach us: mail clients and proxies may not answer from a cache
+NO_CACHE_HEADERS = {
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+
+def ip_class(address):
+    """The /24 (IPv4) or /48 (IPv6) network of `address`, e.g. "203.0.113.0/24"; None if it isn't an IP."""
+    try:
+        ip = ipaddress.ip_address(address)
+    except (TypeError, ValueError):
+        return None
+    prefix = 24 if ip.version == 4 else 48
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+
+def client_address(request):
+    if TRACK_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+
+def record_open(email_id, request):
+    """Buffers one pixel hit; called on the request path, so it never touches the database."""
+    user_agent = request.headers.get("user-agent")
+    open_events.add((
+        email_id,
+        datetime.datetime.utcnow(),
+        user_agent[:USER_AGENT_MAX_LENGTH] if user_agent else None,
+        ip_class(client_address(request)),
+    ))
+
+
+def record_click(email_id, url, request):
+    """Buffers one followed link; like `record_open`, never touches the database."""
+    user_agent = request.headers.get("user-agent")
+    click_events.add((
+        email_id,
+        url,
+        datetime.datetime.utcnow(),
+        user_agent[:USER_AGENT_MAX_LENGTH] if user_agent else None,
+        ip_class(client_address(request)),
+    ))
+
+
+def email_campaigns(conn, email_ids):
+    """Campaign id of each of `email_ids` that still exists."""
+    emails = EmailContent.__table__
+    return dict(conn.execute(select(emails.c.id, emails.c.campaign_id).where(emails.c.id.in_(set(email_ids)))).all())
+
+
+def mark_first(conn, email_ids, flag, counter):
+    """Sets boolean column `flag` on the emails that don't have it yet and adds them to `counter`. Returns how many."""
+    emails = EmailContent.__table__
+    campaign_ids = conn.execute(
+        update(emails).where(emails.c.id.in_(email_ids), emails.c[flag].isnot(True))
+        .values({flag: True}).returning(emails.c.campaign_id)
+    ).scalars().all()
+    for campaign_id, marked in Counter(campaign_ids).items():
+        bump_stats(conn, campaign_id, **{counter: marked})
+    return len(campaign_ids)
+
+
+def write_open_events(events):
+    """Flushes a batch of (email_id, opened_at, user_agent, ip_class) hits in one transaction."""
+    emails = EmailContent.__table__
+    with engine.begin() as conn:
+        campaigns = email_campaigns(conn, (event[0] for event in events))
+        events = [event for event in events if event[0] in campaigns]
+        if not events:
+            return
+        first_opens = mark_first(conn, campaigns, "opened", "emails_opened")
+
+        times = {}
+        for email_id, opened_at, _, _ in events:
+            first, last = times.get(email_id, (opened_at, opened_at))
+            times[email_id] = (min(first, opened_at), max(last, opened_at))
+        conn.execute(
+            update(emails).where(emails.c.id == bindparam("email_id")).values(
+                first_opened_at=func.coalesce(emails.c.first_opened_at, bindparam("first")),
+                last_opened_at=bindparam("last"),
+            ),
+            [{"email_id": email_id, "first": first, "last": last} for email_id, (first, last) in times.items()],
+        )
+        bulk_insert(conn, EmailOpenEvent.__table__, [
+            {"email_id": email_id, "campaign_id": campaigns[email_id], "opened_at": opened_at,
+             "user_agent": user_agent, "ip_class": network}
+            for email_id, opened_at, user_agent, network in events
+        ])
+    print(f"[TRACK] Logged {len(events)} opens ({first_opens} first opens).")
+
+
+def write_click_events(events):
+    """Flushes a batch of (email_id, url, clicked_at, user_agent, ip_class) clicks in one transaction."""
+    emails = EmailContent.__table__
+    with engine.begin() as conn:
+        campaigns = email_campaigns(conn, (event[0] for event in events))
+        events = [event for event in events if event[0] in campaigns]
+        if not events:
+            return
+        first_clicks = mark_first(conn, campaigns, "clicked", "emails_clicked")
+        mark_first(conn, campaigns, "opened", "emails_opened")
+        first_click_times = {}
+        for email_id, _, clicked_at, _, _ in events:
+            first_click_times[email_id] = min(first_click_times.get(email_id, clicked_at), clicked_at)
+        conn.execute(
+            update(emails).where(emails.c.id == bindparam("email_id"))
+            .values(first_opened_at=func.coalesce(emails.c.first_opened_at, bindparam("first"))),
+            [{"email_id": email_id, "first": first} for email_id, first in first_click_times.items()],
+        )
+        for campaign_id, clicks in Counter(campaigns[event[0]] for event in events).items():
+            bump_stats(conn, campaign_id, clicks=clicks)
+        bulk_insert(conn, EmailClickEvent.__table__, [
+            {"email_id": email_id, "campaign_id": campaigns[email_id], "url": url, "clicked_at": clicked_at,
+             "user_agent": user_agent, "ip_class": network}
+            for email_id, url, clicked_at, user_agent, network in events
+        ])
+    print(f"[TRACK] Logged {len(events)} clicks ({first_clicks} first clicks).")
+
+
+open_events = EventBuffer(
+    "track", write_open_events, batch_size=TRACK_BATCH_SIZE, interval=TRACK_FLUSH_SECONDS, max_pending=TRACK_BUFFER_MAX
+)
+click_events = EventBuffer(
+    "click", write_click_events, batch_size=TRACK_BATCH_SIZE, interval=TRACK_FLUSH_SECONDS, max_pending=TRACK_BUFFER_MAX
+)
@@ -0,0 +1,121 @@
+"""
+Worker pool that runs the jobs queued in the database (backend/job_queue.py).
+
+Usage: python backend/worker.py [--workers N]
+
+Starts JOB_WORKERS worker processes (4 by default). Each one claims a job,
+runs the task with a heartbeat thread alongside, records the outcome and
+claims the next; it polls every JOB_POLL_SECONDS while the queue is empty.
+The parent process restarts workers that die and periodically requeues
+jobs whose worker stopped sending heartbeats. Stopping the pool (Ctrl+C or
+SIGTERM) puts the jobs that were running back in the queue.
+
+start_app.py launches the pool next to the API and the dashboard; more
+pools can run on other hosts against a shared PostgreSQL database.
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import importlib
+import threading
+import traceback
+import multiprocessing
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+load_dotenv()
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+
+
+def keep_beating(job_queue, job_id, worker_id, stop):
+    while not stop.wait(job_queue.JOB_HEARTBEAT_SECONDS):
+        try:
+            if not job_queue.heartbeat(job_id, worker_id):
+                print(f"[WORKER] ⚠️ Job {job_id} was taken over (stale); its result will be ignored.")
+                return
+        except Exception as e:
+            print(f"[WORKER] ⚠️ Heartbeat for job {job_id} failed: {e}")
+
+
+def run_job(job_queue, job_id, kind, args, attempt, worker_id):
+    module, function, _, _ = job_queue.TASKS[kind]
+    stop = threading.Event()
+    beater = threading.Thread(target=keep_beating, args=(job_queue, job_id, worker_id, stop), daemon=True)
+    beater.start()
+    print(f"[WORKER] {worker_id} running job {job_id}: {kind} {args} (attempt {attempt})")
+    error = None
+    try:
+        getattr(importlib.import_module(module), function)(**args)
+    except KeyboardInterrupt:
+        stop.set()
+        job_queue.release(job_id, worker_id)
+        print(f"[WORKER] Job {job_id} interrupted; back in the queue.")
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        stop.set()
+    outcome = job_queue.finish(job_id, worker_id, error)
+    if outcome is None:
+        print(f"[WORKER] ⚠️ Job {job_id} ({kind}) finished after it was recovered as stale; outcome not recorded.")
+        return
+    print(f"[WORKER] {'✅' if outcome == 'Completed' else '❌'} Job {job_id} ({kind}): {outcome}"
+          + (f" — {error}" if error else ""))
+
+
+def worker_loop():
+    # Only the pool stops workers (SIGTERM, handled like Ctrl+C so the job is released);
+    # a Ctrl+C reaching the whole process group would interrupt them twice
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    import backend.job_queue as job_queue
+    worker_id = job_queue.worker_name()
+    try:
+        while True:
+            job = job_queue.claim_next(worker_id)
+            if job is None:
+                time.sleep(JOB_POLL_SECONDS)
+                continue
+            run_job(job_queue, *job, worker_id)
+    except KeyboardInterrupt:
+        pass
+
+
+def run_pool(workers):
+    from database.db import engine
+    from database.migrations import upgrade
+    import backend.job_queue as job_queue
+    # Pools on other hosts may start before the app has migrated the database
+    upgrade(engine)
+    # Fresh interpreters: no database connection or browser state is shared with the parent
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    print(f"👷 Starting {workers} job worker(s)...")
+    try:
+        while True:
+            processes = [p for p in processes if p.is_alive()]
+            while len(processes) < workers:
+                process = context.Process(target=worker_loop, daemon=False)
+                process.start()
+                processes.append(process)
+            job_queue.recover_stale_jobs()
+            time.sleep(job_queue.JOB_HEARTBEAT_SECONDS)
+    except KeyboardInterrupt:
+        print("🛑 Stopping job workers...")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        print("✅ Job workers stopped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued pipeline jobs.")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS, help="number of worker processes")
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    run_pool(args.workers)
@@ -0,0 +1,139 @@
+"""
+Ingestion and claim benchmark for database/bulk.py and database/claims.py.
+
+Usage: python benchmarks/bench_bulk_ingest.py [database_url] [leads] [workers]
+
+Without a URL it runs on a throwaway SQLite file. To test PostgreSQL, create
+an empty scratch database and pass its URL, e.g.
+    createdb outreach_bench
+    python benchmarks/bench_bulk_ingest.py postgresql+psycopg://localhost/outreach_bench
+The script refuses to touch a database that already holds users, and drops
+the tables it created when it is done.
+
+It inserts `leads` encrypted leads and emails (50,000 by default) twice,
+once as ORM objects with add_all and once with `bulk_insert` (COPY on
+PostgreSQL, multi-row INSERT elsewhere), then lets `workers` threads claim
+the emails in batches with `claim_rows` and checks that no email was
+claimed twice.
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+from sqlalchemy import inspect, select, func, delete
+from sqlalchemy.orm import Session
+from database.db import make_engine
+from database.models import Base, User, Campaign, Lead, EmailContent
+from database.migrations import upgrade
+from database.blind_index import email_hash
+from database.bulk import bulk_insert
+from database.claims import claim_rows
+
+BODY = "We build fast, simple websites for independent businesses. " * 12
+CLAIM_BATCH = 100
+
+
+def lead_rows(count, campaign_id):
+    for i in range(count):
+        address = f"owner{i}@business{i}.com"
+        yield {
+            "campaign_id": campaign_id, "name": f"Business {i}", "email": address, "email_hash": email_hash(address),
+            "profile_link": f"https://www.facebook.com/business{i}", "state": "Texas", "industry": "Dentist",
+            "platform_source": "Facebook", "profile_description": BODY,
+        }
+
+
+def timed(label, count, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<34}{elapsed:8.2f} s {count / elapsed:10.0f} rows/s")
+    return elapsed
+
+
+def ingest_orm(engine, count, campaign_id):
+    with Session(engine) as session:
+        session.add_all(Lead(**row) for row in lead_rows(count, campaign_id))
+        session.commit()
+
+
+def ingest_bulk(engine, count, campaign_id):
+    with Session(engine) as session:
+        bulk_insert(session.connection(), Lead.__table__, lead_rows(count, campaign_id))
+        session.commit()
+
+
+def ingest_emails(engine, campaign_id):
+    with Session(engine) as session:
+        lead_ids = session.execute(select(Lead.id).where(Lead.campaign_id == campaign_id)).scalars().all()
+        bulk_insert(session.connection(), EmailContent.__table__, (
+            {"lead_id": lead_id, "campaign_id": campaign_id, "subject": "A website for you", "body": BODY}
+            for lead_id in lead_ids
+        ))
+        session.commit()
+    return len(lead_ids)
+
+
+def claim_loop(engine, worker, campaign_id, claimed, lock):
+    while True:
+        with Session(engine) as session:
+            ids = claim_rows(
+                session, EmailContent, EmailContent.campaign_id == campaign_id, EmailContent.delivery_status.is_(None),
+                values={"delivery_status": f"Claimed by {worker}"}, limit=CLAIM_BATCH,
+            )
+            session.commit()
+        if not ids:
+            return
+        with lock:
+            claimed.extend(ids)
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ingest-bench-'), 'bench.db')}"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    engine = make_engine(url)
+
+    if inspect(engine).has_table(User.__tablename__):
+        with engine.connect() as conn:
+            if conn.execute(select(func.count()).select_from(User.__table__)).scalar():
+                sys.exit("❌ This database already has users; point the benchmark at an empty scratch database.")
+    upgrade(engine)
+    with Session(engine) as session:
+        user = User(username="bench")
+        session.add(user)
+        session.flush()
+        orm_campaign, bulk_campaign = Campaign(name="orm", user_id=user.id), Campaign(name="bulk", user_id=user.id)
+        session.add_all([orm_campaign, bulk_campaign])
+        session.commit()
+        orm_id, bulk_id = orm_campaign.id, bulk_campaign.id
+
+    print(f"\n📥 Inserting {count:,} encrypted leads into {engine.dialect.name} ({engine.dialect.driver})")
+    orm_time = timed("ORM add_all", count, lambda: ingest_orm(engine, count, orm_id))
+    bulk_time = timed("bulk_insert", count, lambda: ingest_bulk(engine, count, bulk_id))
+    print(f"  speedup {orm_time / bulk_time:.1f}x")
+    emails = ingest_emails(engine, bulk_id)
+
+    print(f"\n🔐 {workers} workers claiming {emails:,} emails in batches of {CLAIM_BATCH}")
+    claimed, lock = [], threading.Lock()
+    threads = [threading.Thread(target=claim_loop, args=(engine, w, bulk_id, claimed, lock)) for w in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    duplicates = len(claimed) - len(set(claimed))
+    print(f"  claimed {len(set(claimed)):,}/{emails:,} in {elapsed:.2f}s ({len(claimed) / elapsed:,.0f} rows/s), "
+          f"{duplicates} claimed twice")
+
+    with engine.begin() as conn:
+        for table in (EmailContent, Lead, Campaign, User):
+            conn.execute(delete(table.__table__))
+    Base.metadata.drop_all(engine)
+    if duplicates or len(set(claimed)) != emails:
+        sys.exit(1)
@@ -0,0 +1,132 @@
+"""
+Benchmark for the campaign summary read from campaign_stats.
+
+Usage: python benchmarks/bench_campaign_stats.py [leads]
+
+Builds a throwaway SQLite database with one campaign of `leads` leads
+(50,000 by default), each with a generated email, some sent, opened and
+replied to. It then compares:
+
+- the summary as the dashboard computed it before: every lead and email row
+  loaded (and decrypted) into pandas and counted;
+- the summary read from the campaign's campaign_stats row.
+
+It also reports what the counter adds to a pixel hit (the conditional
+UPDATE alone vs. UPDATE + counter upsert in one transaction), and how long
+a full rebuild and consistency check take.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+import pandas as pd
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from database.db import make_engine
+from database.models import User, Campaign, Lead, EmailContent
+from database.migrations import upgrade
+from database.bulk import bulk_insert
+import database.campaign_stats as campaign_stats
+
+BODY = "I came across your clinic and noticed patients mostly find you through your profile page. " * 4
+SENTIMENTS = ["Positive", "Neutral", "Negative"]
+
+
+def populate(engine, leads):
+    upgrade(engine)
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        bulk_insert(conn, User.__table__, [{"id": 1, "username": "bench"}])
+        bulk_insert(conn, Campaign.__table__, [{"id": 1, "name": "bench", "user_id": 1}])
+        for start in range(1, leads + 1, 10_000):
+            ids = range(start, min(leads, start + 9_999) + 1)
+            bulk_insert(conn, Lead.__table__, ({
+                "id": i, "campaign_id": 1, "name": f"Clinic {i}", "email": f"owner{i}@clinic{i}.com",
+                "profile_description": BODY,
+            } for i in ids))
+            rows = []
+            for i in ids:
+                sent = rng.random() < 0.9
+                replied = sent and rng.random() < 0.05
+                rows.append({
+                    "id": i, "lead_id": i, "campaign_id": 1, "subject": "A website for your clinic", "body": BODY,
+                    "delivery_status": "Sent" if sent else "Failed: timeout", "opened": sent and rng.random() < 0.3,
+                    "reply_text": "Sounds interesting, tell me more." if replied else None,
+                    "reply_sentiment": rng.choice(SENTIMENTS) if replied else None,
+                })
+            bulk_insert(conn, EmailContent.__table__, rows)
+        campaign_stats.rebuild(conn)
+
+
+def summary_before(engine):
+    with Session(engine) as db:
+        results = db.query(
+            Lead.name, Lead.email, Lead.profile_link, Lead.state, Lead.industry, Lead.platform_source,
+            Lead.profile_description, EmailContent.id.label("email_id"), EmailContent.subject, EmailContent.body,
+            EmailContent.delivery_status, EmailContent.opened, EmailContent.reply_text, EmailContent.reply_sentiment,
+        ).outerjoin(EmailContent, Lead.id == EmailContent.lead_id).filter(Lead.campaign_id == 1).all()
+        df = pd.DataFrame([{
+            "email": row.email, "delivery_status": row.delivery_status,
+            "opened": "Yes" if row.opened else "No", "reply_text": row.reply_text,
+        } for row in results]).drop_duplicates(subset=["email"])
+        return len(df), df["delivery_status"].eq("Sent").sum(), df["opened"].eq("Yes").sum(), df["reply_text"].notna().sum()
+
+
+def summary_after(engine):
+    with Session(engine) as db:
+        stats = campaign_stats.load(db, 1)
+        return stats["leads"], stats["emails_sent"], stats["emails_opened"], stats["replies"]
+
+
+def pixel_hits(engine, email_ids, count):
+    """Per-hit latency of the open UPDATE, optionally with the counter upsert in the same transaction."""
+    started = time.perf_counter()
+    for email_id in email_ids:
+        with Session(engine) as session:
+            marked = session.execute(
+                update(EmailContent).where(EmailContent.id == email_id, EmailContent.opened.isnot(True))
+                .values(opened=True).returning(EmailContent.campaign_id),
+                execution_options={"synchronize_session": False},
+            ).first()
+            if marked and count:
+                campaign_stats.bump(session, marked.campaign_id, emails_opened=1)
+            session.commit()
+    return (time.perf_counter() - started) / len(email_ids)
+
+
+if __name__ == "__main__":
+    leads = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    path = os.path.join(tempfile.mkdtemp(prefix="stats-bench-"), "bench.db")
+    engine = make_engine(f"sqlite:///{path}")
+
+    print(f"\n🧱 Building a campaign of {leads:,} leads and emails...")
+    populate(engine, leads)
+
+    print("\n📊 Campaign summary (leads, sent, opened, replies)")
+    for label, summary in (("before", summary_before), ("after", summary_after)):
+        started = time.perf_counter()
+        totals = summary(engine)
+        elapsed = time.perf_counter() - started
+        print(f"  {label:<7} {elapsed * 1000:9.1f} ms  {tuple(int(t) for t in totals)}")
+
+    with Session(engine) as db:
+        unopened = [i for (i,) in db.query(EmailContent.id).filter(EmailContent.opened.isnot(True)).limit(2_000)]
+    half = len(unopened) // 2
+    plain = pixel_hits(engine, unopened[:half], count=False)
+    counted = pixel_hits(engine, unopened[half:], count=True)
+    print(f"\n👁️  Pixel hit: {plain * 1000:.2f} ms without the counter, {counted * 1000:.2f} ms with it")
+
+    with engine.begin() as conn:
+        started = time.perf_counter()
+        campaign_stats.rebuild(conn)
+        rebuilt = time.perf_counter() - started
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        mismatches = campaign_stats.check(conn)
+        checked = time.perf_counter() - started
+    print(f"\n🔁 Rebuild {rebuilt * 1000:.0f} ms, check {checked * 1000:.0f} ms, {len(mismatches)} mismatch(es)")
+    os.remove(path)
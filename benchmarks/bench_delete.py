@@ -0,0 +1,102 @@
+"""
+Benchmark for deleting a large campaign.
+
+Usage: python benchmarks/bench_delete.py [leads]
+
+Builds a throwaway SQLite database with a campaign of `leads` leads (100,000
+by default), each with a generated email, and deletes it twice:
+
+- before: the old ORM cascade, which loaded every lead and email (decrypting
+  them) and deleted them row by row in one transaction;
+- after: the chunked background job of backend/delete_data.py.
+
+A writer thread keeps marking emails of another campaign as opened (like the
+tracking pixel) meanwhile; its worst wait shows how long each approach holds
+the write lock.
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+
+os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="delete-bench-"), "bench.db")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from sqlalchemy import text
+from sqlalchemy.orm import undefer
+from database.db import engine, SessionLocal, DATABASE_URL
+from database.models import User, Campaign, Lead, EmailContent
+from database.migrations import upgrade
+from database.bulk import bulk_insert
+import backend.delete_data as delete_data
+
+PARAGRAPH = "I came across your clinic and noticed patients mostly find you through your profile page. "
+OTHER_EMAILS = 1_000
+
+
+def populate(leads):
+    upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM users"))
+        bulk_insert(conn, User.__table__, [{"id": 1, "username": "bench"}])
+        bulk_insert(conn, Campaign.__table__, [{"id": 1, "name": "big", "user_id": 1}, {"id": 2, "name": "other", "user_id": 1}])
+        bulk_insert(conn, Lead.__table__, [{"id": i, "campaign_id": 2} for i in range(1, OTHER_EMAILS + 1)])
+        bulk_insert(conn, EmailContent.__table__, [{"id": i, "lead_id": i, "campaign_id": 2} for i in range(1, OTHER_EMAILS + 1)])
+        for start in range(OTHER_EMAILS + 1, OTHER_EMAILS + leads + 1, 10_000):
+            ids = range(start, min(OTHER_EMAILS + leads, start + 9_999) + 1)
+            bulk_insert(conn, Lead.__table__, ({
+                "id": i, "campaign_id": 1, "name": f"Clinic {i}", "email": f"owner{i}@clinic{i}.com",
+                "profile_description": PARAGRAPH * 2,
+            } for i in ids))
+            bulk_insert(conn, EmailContent.__table__, ({
+                "id": i, "lead_id": i, "campaign_id": 1, "subject": "A website for your clinic", "body": PARAGRAPH * 4,
+            } for i in ids))
+
+
+def delete_before():
+    with SessionLocal() as session:
+        campaign = session.get(Campaign, 1)
+        # What cascade="all, delete-orphan" without passive_deletes did
+        for lead in session.query(Lead).options(undefer("*")).filter_by(campaign_id=1):
+            session.delete(lead)
+        for email in session.query(EmailContent).options(undefer("*")).filter_by(campaign_id=1):
+            session.delete(email)
+        session.delete(campaign)
+        session.commit()
+
+
+def delete_after():
+    delete_data.run_deletion_job(delete_data.request_campaign_deletion("bench", "big"))
+
+
+def pixel_writer(stop, waits):
+    i = 0
+    while not stop.is_set():
+        i = i % OTHER_EMAILS + 1
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE email_contents SET opened = NOT opened WHERE id = :id"), {"id": i})
+        waits.append(time.perf_counter() - started)
+        time.sleep(0.005)
+
+
+def run(label, delete, leads):
+    populate(leads)
+    stop, waits = threading.Event(), []
+    writer = threading.Thread(target=pixel_writer, args=(stop, waits))
+    writer.start()
+    started = time.perf_counter()
+    delete()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    writer.join()
+    print(f"  {label:<7} {elapsed:6.2f}s  pixel writes {len(waits):5,}, max wait {max(waits) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    leads = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"\n🗑️  Deleting a campaign of {leads:,} leads and emails")
+    run("before", delete_before, leads)
+    run("after", delete_after, leads)
+    os.remove(DATABASE_URL[len("sqlite:///"):])
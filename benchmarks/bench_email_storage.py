@@ -0,0 +1,131 @@
+"""
+Benchmark for storing only the email body and rendering HTML at send time.
+
+Usage: python benchmarks/bench_email_storage.py [emails]
+
+Saves `emails` generated emails (20,000 by default, instant stand-in for the
+Groq call) into two throwaway SQLite databases:
+
+- before: the old generation loop, which added each email, flushed it to get
+  its id and stored an encrypted HTML copy with the tracking pixel;
+- after: the current loop, which bulk-inserts subject and body in batches.
+
+It reports the time spent saving, the database size after VACUUM, and how
+fast `render_html` builds the HTML part at send time.
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from database.models import User, Campaign, Lead, EmailContent
+from database.migrations import upgrade
+from database.bulk import bulk_insert
+from backend.email_render import render_html
+from backend.generate_emails import EMAIL_INSERT_BATCH_SIZE
+
+SUBJECT = "A new website for your clinic in Texas"
+BODY = "\n".join([
+    "Hi Clinic Manager in Texas,",
+    "",
+    "I came across your clinic on Facebook and noticed patients mostly find you through your profile page.",
+    "A fast website with online booking and your reviews up front could bring you more new patients every month.",
+    "We have built sites like this for several clinics in Texas, usually live within two weeks.",
+    "Can we connect for a quick chat this week?",
+    "",
+    "Best,",
+    "Alex Doe",
+    "Acme Web Studio",
+    "📧 alex@acme.example",
+    "🌐 https://acme.example",
+    "📞 +1 555 0100",
+])
+
+
+def legacy_html(text, email_id):
+    """convert_to_html as it was before rendering moved to send time."""
+    lines = text.strip().splitlines()
+    html = "<p>" + "</p><p>".join(line.strip() for line in lines if line.strip()) + "</p>"
+    tracking_pixel = f'<img src="http://localhost:8000/track_open?email_id={email_id}" width="1" height="1" alt="" style="display:none;">'
+    return html + tracking_pixel
+
+
+def setup(path, emails):
+    engine = create_engine(f"sqlite:///{path}")
+    upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__).values(id=1, username="bench", is_admin=False))
+        conn.execute(insert(Campaign.__table__).values(id=1, name="bench", user_id=1))
+        conn.execute(insert(Lead.__table__), [{"id": i, "campaign_id": 1} for i in range(1, emails + 1)])
+    return engine
+
+
+def save_before(engine, emails):
+    with Session(engine) as session:
+        for lead_id in range(1, emails + 1):
+            email_content = EmailContent(lead_id=lead_id, campaign_id=1, subject=SUBJECT, body=BODY)
+            session.add(email_content)
+            session.flush()
+            email_content.html = legacy_html(BODY, email_id=email_content.id)
+        session.commit()
+
+
+def save_after(engine, emails):
+    with Session(engine) as session:
+        pending = []
+        for lead_id in range(1, emails + 1):
+            pending.append({"lead_id": lead_id, "campaign_id": 1, "subject": SUBJECT, "body": BODY})
+            if len(pending) >= EMAIL_INSERT_BATCH_SIZE:
+                bulk_insert(session.connection(), EmailContent.__table__, pending)
+                session.commit()
+                pending = []
+        bulk_insert(session.connection(), EmailContent.__table__, pending)
+        session.commit()
+
+
+def run(label, save, emails, workdir):
+    path = os.path.join(workdir, f"{label}.db")
+    engine = setup(path, emails)
+    started = time.perf_counter()
+    save(engine, emails)
+    elapsed = time.perf_counter() - started
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+        table_bytes = conn.exec_driver_sql(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name = 'email_contents'"
+        ).scalar() if _has_dbstat(conn) else None
+    size = os.path.getsize(path)
+    engine.dispose()
+    return elapsed, size, table_bytes
+
+
+def _has_dbstat(conn):
+    try:
+        conn.exec_driver_sql("SELECT 1 FROM dbstat LIMIT 1")
+        return True
+    except Exception:
+        return False
+
+
+if __name__ == "__main__":
+    emails = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    workdir = tempfile.mkdtemp(prefix="email-storage-bench-")
+
+    print(f"\n✉️  Saving {emails:,} generated emails")
+    before = run("before", save_before, emails, workdir)
+    after = run("after", save_after, emails, workdir)
+    for label, (elapsed, size, table_bytes) in (("before", before), ("after", after)):
+        table = f", email_contents {table_bytes / 2**20:.1f} MiB" if table_bytes else ""
+        print(f"  {label:<7} save {elapsed:6.2f}s ({emails / elapsed:8,.0f} emails/s)  "
+              f"database {size / 2**20:.1f} MiB{table}")
+    print(f"  saving {before[0] / after[0]:.1f}x faster, database {1 - after[1] / before[1]:.0%} smaller")
+
+    started = time.perf_counter()
+    for email_id in range(emails):
+        render_html(BODY, email_id)
+    elapsed = time.perf_counter() - started
+    print(f"\n🖨️  render_html at send time: {emails / elapsed:,.0f} emails/s ({elapsed / emails * 1e6:.1f} µs each)")
@@ -0,0 +1,181 @@
+"""
+Benchmark for backend/enrich_leads.py against a local HTTP stand-in.
+
+Usage: python benchmarks/bench_enrichment.py [leads] [--slow-rate 0.05] [--slow-seconds 3]
+
+Generates synthetic leads with a known answer and serves everything they
+point at from a local server:
+
+  /domain/<domain>   the lead's email domain: a real site, a 404, or a
+                     redirect to a social profile (which is not a website)
+  /profile/<n>       profile pages linking to the lead's site directly, through
+                     a /biz_redir?url=... wrapper, or not at all
+  /site/<n>          the linked website, live or dead
+
+The enrichment runs twice on a throwaway cache, so the report shows cold
+throughput, warm (cached) throughput and accuracy against the known answers.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, quote
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+from backend.enrich_leads import WebsiteProber, find_websites
+from backend.scrape_cache import WebsiteCache
+
+
+class StandIn:
+    def __init__(self, slow_rate, slow_seconds, seed=7):
+        self.rng = random.Random(seed)
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self.live_domains = set()
+        self.social_domains = set()
+        self.live_sites = set()
+        self.profiles = {}
+        self.slow = set()
+        self.port = None
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def make_leads(self, count):
+        leads, truth = [], {}
+        for n in range(count):
+            kind = self.rng.random()
+            domain, link = None, None
+            if kind < 0.25:
+                domain = f"biz{n}.example"
+                self.live_domains.add(domain)
+            elif kind < 0.35:
+                domain = f"social{n}.example"
+                self.social_domains.add(domain)
+            elif kind < 0.45:
+                domain = f"gone{n}.example"
+            link_kind = self.rng.random()
+            if link_kind < 0.3:
+                link = "direct"
+            elif link_kind < 0.5:
+                link = "wrapped"
+            self.profiles[n] = link
+            site_live = link is not None and self.rng.random() < 0.8
+            if site_live:
+                self.live_sites.add(n)
+            if self.rng.random() < self.slow_rate:
+                self.slow.add(n)
+            # Many leads share a profile page or domain in real scrapes; model some reuse
+            profile = n if self.rng.random() < 0.8 else self.rng.randrange(max(1, n))
+            leads.append(SimpleNamespace(
+                id=n,
+                email=f"owner@{domain}" if domain else f"owner{n}@gmail.com",
+                profile_link=f"http://localhost:{self.port}/profile/{profile}",
+                profile_description="",
+            ))
+            truth[n] = (domain in self.live_domains) or (self.profiles.get(profile) is not None and profile in self.live_sites)
+        return leads, truth
+
+    def profile_page(self, n):
+        site = f"http://127.0.0.1:{self.port}/site/{n}"
+        link = self.profiles.get(n)
+        if link == "direct":
+            anchor = f'<a href="{site}">Visit website</a>'
+        elif link == "wrapped":
+            anchor = f'<a href="http://localhost:{self.port}/biz_redir?url={quote(site, safe="")}&amp;s=1">Business website</a>'
+        else:
+            anchor = ""
+        return (f'<html><body><h1>Business {n}</h1>{anchor}'
+                f'<a href="https://www.facebook.com/biz{n}">Facebook</a>'
+                f'<img src="https://s3-media0.fl.yelpcdn.com/logo.png"></body></html>')
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Dropped connections are expected: the prober gave up on a slow site
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def make_handler(stand_in):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, html="", location=None):
+            body = html.encode("utf-8")
+            self.send_response(status)
+            if location:
+                self.send_header("Location", location)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with stand_in._lock:
+                stand_in.requests += 1
+            kind, _, key = urlsplit(self.path).path.strip("/").partition("/")
+            if kind == "domain":
+                if key in stand_in.live_domains:
+                    return self.reply(200, f"<html><body>{key}</body></html>")
+                if key in stand_in.social_domains:
+                    return self.reply(301, location=f"http://localhost:{stand_in.port}/social/{key}")
+                return self.reply(404)
+            if kind == "profile":
+                return self.reply(200, stand_in.profile_page(int(key)))
+            if kind == "site":
+                if int(key) in stand_in.slow:
+                    time.sleep(stand_in.slow_seconds)
+                return self.reply(200 if int(key) in stand_in.live_sites else 404, "<html><body>site</body></html>")
+            self.reply(200 if kind == "social" else 404, "<html></html>")
+
+    return Handler
+
+
+def run_once(leads, truth, port, cache_path, args):
+    cache = WebsiteCache(path=cache_path)
+    started = time.perf_counter()
+    with WebsiteProber(cache=cache, domain_url=f"http://127.0.0.1:{port}/domain/{{domain}}",
+                       per_host=args.per_host, timeout=args.timeout) as prober:
+        websites = find_websites(leads, prober)
+    elapsed = time.perf_counter() - started
+    cache.close()
+    correct = sum(1 for lead in leads if bool(websites.get(lead.id)) == truth[lead.id])
+    return elapsed, correct / len(leads), sum(1 for site in websites.values() if site), prober
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark lead website enrichment against a local stand-in.")
+    parser.add_argument("leads", nargs="?", type=int, default=500)
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="share of websites that hang")
+    parser.add_argument("--slow-seconds", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=2.0, help="probe timeout in seconds")
+    # Every stand-in site shares one host, where real leads are spread over many
+    parser.add_argument("--per-host", type=int, default=16, help="per-host limit for the stand-in's single host")
+    args = parser.parse_args()
+
+    stand_in = StandIn(args.slow_rate, args.slow_seconds)
+    server = StandInServer(("127.0.0.1", 0), make_handler(stand_in))
+    stand_in.port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    leads, truth = stand_in.make_leads(args.leads)
+    cache_path = os.path.join(tempfile.mkdtemp(prefix="enrich-bench-"), "cache.db")
+
+    print(f"\n🌐 Enriching {len(leads)} leads ({sum(truth.values())} have a live website)")
+    for label in ("cold", "warm"):
+        before = stand_in.requests
+        elapsed, accuracy, found, prober = run_once(leads, truth, stand_in.port, cache_path, args)
+        print(f"  {label:<5} {elapsed:6.2f} s  {len(leads) / elapsed:8.0f} leads/s  {stand_in.requests - before:5} requests  "
+              f"cache hit rate {prober.hit_rate():4.0%}  found {found}  accuracy {accuracy:.1%}  errors {prober.stats['errors']}")
+    server.shutdown()
@@ -0,0 +1,134 @@
+"""
+Benchmark for the indexes added by schema version 1 (database/migrations.py).
+
+Usage: python benchmarks/bench_indexes.py [email_rows] [repeats]
+
+Builds a throwaway SQLite database with the pre-migration schema (the model
+tables without their indexes), fills it with `email_rows` email_contents rows
+(1,000,000 by default) plus matching users, campaigns and leads, and times the
+lookups the pipeline and dashboards run. It then upgrades the database in
+place with `upgrade(engine)` and times the same lookups again.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+from sqlalchemy import create_engine, inspect, text
+from database.models import Base
+from database.migrations import upgrade
+
+USERS = 100
+CAMPAIGNS_PER_USER = 20
+EMAILS_PER_LEAD = 5
+STATUSES = ("Sent", "Sent", "Sent", "Failed", None)
+
+QUERIES = {
+    "campaign by user + name": (
+        "SELECT id FROM campaigns WHERE user_id = :user_id AND name = :name",
+        lambda rng, n: {"user_id": rng.randint(1, USERS), "name": f"campaign_{rng.randrange(CAMPAIGNS_PER_USER)}"},
+    ),
+    "sender config by user": (
+        "SELECT id FROM sender_configs WHERE user_id = :user_id",
+        lambda rng, n: {"user_id": rng.randint(1, USERS)},
+    ),
+    "leads of a campaign": (
+        "SELECT id FROM leads WHERE campaign_id = :campaign_id",
+        lambda rng, n: {"campaign_id": rng.randint(1, n["campaigns"])},
+    ),
+    "emails of a lead": (
+        "SELECT id FROM email_contents WHERE lead_id = :lead_id",
+        lambda rng, n: {"lead_id": rng.randint(1, n["leads"])},
+    ),
+    "sent count of a campaign": (
+        "SELECT count(*) FROM email_contents WHERE campaign_id = :campaign_id AND delivery_status = 'Sent'",
+        lambda rng, n: {"campaign_id": rng.randint(1, n["campaigns"])},
+    ),
+    "dashboard leads + emails": (
+        "SELECT leads.id, email_contents.id FROM leads "
+        "LEFT OUTER JOIN email_contents ON leads.id = email_contents.lead_id WHERE leads.campaign_id = :campaign_id",
+        lambda rng, n: {"campaign_id": rng.randint(1, n["campaigns"])},
+    ),
+}
+
+
+def build_database(path, email_rows):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    campaigns = USERS * CAMPAIGNS_PER_USER
+    leads = max(1, email_rows // EMAILS_PER_LEAD)
+    with engine.begin() as conn:
+        # Start from the schema older releases created: no secondary indexes
+        inspector = inspect(conn)
+        for table in inspector.get_table_names():
+            for index in inspector.get_indexes(table):
+                conn.exec_driver_sql(f"DROP INDEX {index['name']}")
+        conn.exec_driver_sql(
+            "INSERT INTO users (id, username, is_admin) VALUES (?, ?, 0)",
+            [(u, f"user_{u}") for u in range(1, USERS + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO sender_configs (id, user_id) VALUES (?, ?)",
+            [(u, u) for u in range(1, USERS + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO campaigns (id, name, user_id, status) VALUES (?, ?, ?, 'Idle')",
+            [(c + 1, f"campaign_{c % CAMPAIGNS_PER_USER}", c // CAMPAIGNS_PER_USER + 1) for c in range(campaigns)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO leads (id, campaign_id, industry, state) VALUES (?, ?, 'Restaurant', 'Texas')",
+            [(lead, (lead - 1) % campaigns + 1) for lead in range(1, leads + 1)],
+        )
+        batch = []
+        for email_id in range(1, email_rows + 1):
+            lead = (email_id - 1) // EMAILS_PER_LEAD + 1
+            batch.append((email_id, lead, (lead - 1) % campaigns + 1, STATUSES[email_id % len(STATUSES)]))
+            if len(batch) == 100_000:
+                conn.exec_driver_sql(
+                    "INSERT INTO email_contents (id, lead_id, campaign_id, delivery_status) VALUES (?, ?, ?, ?)", batch
+                )
+                batch = []
+        if batch:
+            conn.exec_driver_sql(
+                "INSERT INTO email_contents (id, lead_id, campaign_id, delivery_status) VALUES (?, ?, ?, ?)", batch
+            )
+    return engine, {"campaigns": campaigns, "leads": leads}
+
+
+def time_queries(engine, sizes, repeats):
+    timings = {}
+    with engine.connect() as conn:
+        for label, (sql, make_params) in QUERIES.items():
+            rng = random.Random(label)
+            params = [make_params(rng, sizes) for _ in range(repeats)]
+            statement = text(sql)
+            started = time.perf_counter()
+            for p in params:
+                conn.execute(statement, p).all()
+            timings[label] = (time.perf_counter() - started) / repeats
+    return timings
+
+
+if __name__ == "__main__":
+    email_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    path = os.path.join(tempfile.mkdtemp(prefix="index-bench-"), "bench.db")
+
+    print(f"\n🧱 Building a pre-migration database with {email_rows:,} email rows...")
+    started = time.perf_counter()
+    engine, sizes = build_database(path, email_rows)
+    print(f"  built in {time.perf_counter() - started:.1f}s ({os.path.getsize(path) / 2**20:.0f} MiB)")
+
+    before = time_queries(engine, sizes, repeats)
+    started = time.perf_counter()
+    version = upgrade(engine)
+    print(f"  upgraded to schema version {version} in {time.perf_counter() - started:.1f}s")
+    after = time_queries(engine, sizes, repeats)
+
+    print(f"\n{'query':<28}{'before':>12}{'after':>12}{'speedup':>10}")
+    for label in QUERIES:
+        print(f"{label:<28}{before[label] * 1000:9.2f} ms{after[label] * 1000:9.2f} ms{before[label] / after[label]:9.0f}x")
+    os.remove(path)
@@ -0,0 +1,87 @@
+"""
+Benchmark for the job queue and worker pool.
+
+Usage: python benchmarks/bench_job_queue.py [jobs] [workers]
+
+Queues `jobs` jobs (400 by default) for ten users into a throwaway SQLite
+database, as fast as the API would, then runs backend/worker.py with
+`workers` processes (4 by default) until the queue is drained. The jobs are
+deletions of campaigns that no longer exist, so each one is only the
+queue's own overhead: claim, heartbeat thread, task lookup, outcome.
+
+It reports enqueue latency, drained jobs/s, and the most jobs any one user
+had running at once, which must not exceed JOB_MAX_PER_USER.
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="queue-bench-"), "bench.db")
+os.environ.setdefault("JOB_POLL_SECONDS", "0.05")
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from sqlalchemy import select, func
+from database.db import engine, DATABASE_URL
+from database.models import User, Job, DeletionJob
+from database.migrations import upgrade
+from database.bulk import bulk_insert
+import backend.job_queue as job_queue
+
+USERS = 10
+
+
+def max_running_per_user():
+    """Largest number of jobs of one user whose [started_at, finished_at] intervals overlap."""
+    with engine.connect() as conn:
+        rows = conn.execute(select(Job.user_id, Job.started_at, Job.finished_at)).all()
+    events = sorted([(user, start, 1) for user, start, _ in rows] + [(user, end, -1) for user, _, end in rows],
+                    key=lambda e: (e[0], e[1], e[2]))
+    worst, running, current_user = 0, 0, None
+    for user, _, step in events:
+        if user != current_user:
+            current_user, running = user, 0
+        running += step
+        worst = max(worst, running)
+    return worst
+
+
+if __name__ == "__main__":
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    upgrade(engine)
+    with engine.begin() as conn:
+        bulk_insert(conn, User.__table__, [{"id": i, "username": f"user{i}"} for i in range(1, USERS + 1)])
+        bulk_insert(conn, DeletionJob.__table__, [
+            {"id": i, "kind": "campaign", "target_id": 10**9 + i, "target_name": "gone", "status": "Queued"}
+            for i in range(1, jobs + 1)
+        ])
+
+    print(f"\n📥 Queueing {jobs} jobs for {USERS} users...")
+    started = time.perf_counter()
+    for i in range(1, jobs + 1):
+        job_queue.enqueue("delete_data", {"job_id": i}, username=f"user{i % USERS + 1}")
+    elapsed = time.perf_counter() - started
+    print(f"  {elapsed / jobs * 1000:.2f} ms per enqueue")
+
+    print(f"\n👷 Draining with {workers} worker processes...")
+    pool = subprocess.Popen([sys.executable, os.path.join(ROOT, "backend", "worker.py"), "--workers", str(workers)],
+                            stdout=subprocess.DEVNULL)
+    started = time.perf_counter()
+    first_done = None
+    while True:
+        with engine.connect() as conn:
+            done = conn.execute(select(func.count()).select_from(Job.__table__).where(Job.status == "Completed")).scalar()
+        if done and first_done is None:
+            first_done = time.perf_counter()
+        if done >= jobs:
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - first_done
+    pool.terminate()
+    pool.wait()
+    print(f"  {jobs} jobs in {elapsed:.1f}s after the first finished: {jobs / elapsed:.0f} jobs/s")
+    print(f"  most jobs running at once for one user: {max_running_per_user()} (limit {job_queue.JOB_MAX_PER_USER})")
+    os.remove(DATABASE_URL[len("sqlite:///"):])
@@ -0,0 +1,150 @@
+"""
+Benchmark for deferred encrypted columns and per-stage column projections.
+
+Usage: python benchmarks/bench_projection.py [leads] [repeats]
+
+Builds a throwaway SQLite campaign of `leads` leads (20,000 by default), each
+with a generated email whose subject, body, HTML copy and profile description
+are encrypted like in production. Every stage then loads the campaign twice:
+the way it used to (full ORM rows with every encrypted column decrypted) and
+the way it does now (deferred columns plus explicit projections), and the
+script reports wall time and peak Python memory (tracemalloc) for each.
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+from sqlalchemy import create_engine, insert, update, func
+from sqlalchemy.orm import Session, Load
+from database.models import User, Campaign, Lead, EmailContent
+from database.migrations import upgrade
+
+PARAGRAPH = (
+    "I came across your practice while looking at clinics in Texas and noticed that "
+    "patients mostly find you through your profile page. We build fast, simple websites "
+    "for independent businesses, with online booking and reviews on the front page. "
+)
+BODY = PARAGRAPH * 4
+HTML = "<p>" + "</p><p>".join([PARAGRAPH] * 4) + '</p><img src="http://localhost:8000/track_open?email_id=0">'
+DESCRIPTION = PARAGRAPH * 2
+
+
+def populate(engine, leads):
+    upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__).values(id=1, username="bench", is_admin=False))
+        conn.execute(insert(Campaign.__table__).values(id=1, name="bench", user_id=1, status="Idle"))
+        for start in range(0, leads, 5000):
+            ids = range(start + 1, min(leads, start + 5000) + 1)
+            conn.execute(insert(Lead.__table__), [{
+                "id": i, "campaign_id": 1, "name": f"Clinic {i}", "email": f"owner{i}@clinic{i}.com",
+                "profile_link": f"https://www.facebook.com/clinic{i}", "state": "Texas", "industry": "Dentist",
+                "platform_source": "Facebook", "profile_description": DESCRIPTION,
+            } for i in ids])
+            conn.execute(insert(EmailContent.__table__), [{
+                "id": i, "lead_id": i, "campaign_id": 1, "subject": "A website for your clinic",
+                "body": BODY, "html": HTML, "delivery_status": "Sent" if i % 3 else None, "opened": i % 5 == 0,
+                "reply_text": "Sounds interesting, tell me more." if i % 50 == 0 else None,
+            } for i in ids])
+
+
+def full_rows(*entities):
+    """Loader options reproducing the old models, where nothing was deferred."""
+    return [Load(entity).undefer("*") for entity in entities]
+
+
+# stage: (before, after); each callable takes a session and returns the number of rows handled
+STAGES = {
+    "send: emails to send": (
+        lambda s: len(s.query(EmailContent, Lead).options(*full_rows(EmailContent, Lead))
+                      .join(Lead, EmailContent.lead_id == Lead.id).filter(EmailContent.campaign_id == 1).all()),
+        lambda s: len(s.query(EmailContent.id, EmailContent.subject, EmailContent.body, EmailContent.html, Lead.email)
+                      .join(Lead, EmailContent.lead_id == Lead.id).filter(EmailContent.campaign_id == 1).all()),
+    ),
+    "send: save statuses": (
+        lambda s: _entity_statuses(s),
+        lambda s: _bulk_statuses(s),
+    ),
+    "replies: address map": (
+        lambda s: len(s.query(EmailContent, Lead).options(*full_rows(EmailContent, Lead))
+                      .join(Lead, EmailContent.lead_id == Lead.id).filter(EmailContent.campaign_id == 1).all()),
+        lambda s: len(s.query(EmailContent.id, Lead.email)
+                      .join(Lead, EmailContent.lead_id == Lead.id).filter(EmailContent.campaign_id == 1).all()),
+    ),
+    "generate: leads": (
+        lambda s: len(s.query(Lead).options(*full_rows(Lead)).filter_by(campaign_id=1).all()),
+        lambda s: len(s.query(Lead.id, Lead.industry, Lead.state, Lead.platform_source, Lead.profile_description,
+                              Lead.website).filter_by(campaign_id=1).all()),
+    ),
+    "dashboard: campaign table": (
+        lambda s: len(s.query(Lead, EmailContent).options(*full_rows(Lead, EmailContent))
+                      .outerjoin(EmailContent, Lead.id == EmailContent.lead_id).filter(Lead.campaign_id == 1).all()),
+        lambda s: len(s.query(Lead.name, Lead.email, Lead.profile_link, Lead.state, Lead.industry,
+                              Lead.platform_source, Lead.profile_description, EmailContent.id, EmailContent.subject,
+                              EmailContent.body, EmailContent.delivery_status, EmailContent.opened,
+                              EmailContent.reply_text, EmailContent.reply_sentiment)
+                      .outerjoin(EmailContent, Lead.id == EmailContent.lead_id).filter(Lead.campaign_id == 1).all()),
+    ),
+    "status summary": (
+        lambda s: sum(1 for e in s.query(EmailContent).options(*full_rows(EmailContent))
+                      .filter_by(campaign_id=1).all() if e.delivery_status == "Sent"),
+        lambda s: s.query(func.count(EmailContent.id))
+                   .filter(EmailContent.campaign_id == 1, EmailContent.delivery_status == "Sent").scalar(),
+    ),
+}
+
+
+def _entity_statuses(session):
+    emails = session.query(EmailContent).options(*full_rows(EmailContent)).filter_by(campaign_id=1).all()
+    for email in emails:
+        email.delivery_status = "Sent"
+    session.flush()
+    return len(emails)
+
+
+def _bulk_statuses(session):
+    ids = [row.id for row in session.query(EmailContent.id).filter_by(campaign_id=1)]
+    session.execute(update(EmailContent), [{"id": i, "delivery_status": "Sent"} for i in ids])
+    return len(ids)
+
+
+def measure(engine, stage, repeats):
+    """Best wall time over `repeats` runs, then peak traced memory of one more run."""
+    best = float("inf")
+    for _ in range(repeats):
+        with Session(engine) as session:
+            started = time.perf_counter()
+            stage(session)
+            best = min(best, time.perf_counter() - started)
+            session.rollback()
+    with Session(engine) as session:
+        tracemalloc.start()
+        stage(session)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        session.rollback()
+    return best, peak
+
+
+if __name__ == "__main__":
+    leads = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    path = os.path.join(tempfile.mkdtemp(prefix="projection-bench-"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+
+    print(f"\n🧱 Building a campaign with {leads:,} leads and encrypted emails...")
+    started = time.perf_counter()
+    populate(engine, leads)
+    print(f"  built in {time.perf_counter() - started:.1f}s ({os.path.getsize(path) / 2**20:.0f} MiB)")
+
+    print(f"\n{'stage':<28}{'before':>10}{'after':>10}{'speedup':>9}{'mem before':>13}{'mem after':>12}")
+    for label, (before, after) in STAGES.items():
+        before_time, before_peak = measure(engine, before, repeats)
+        after_time, after_peak = measure(engine, after, repeats)
+        print(f"{label:<28}{before_time:8.2f} s{after_time:8.2f} s{before_time / max(after_time, 1e-9):8.1f}x"
+              f"{before_peak / 2**20:9.1f} MiB{after_peak / 2**20:8.1f} MiB")
+    os.remove(path)
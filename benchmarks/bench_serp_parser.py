@@ -0,0 +1,54 @@
+"""
+Micro-benchmark for backend/serp_parser.py on saved SERP fixtures.
+
+Usage: python benchmarks/bench_serp_parser.py [iterations]
+
+For each fixture it reports the parse time per page with every available
+HTML parser, and how many chromedriver round trips the old per-element
+extraction (3x find_element + get_attribute per result) would have needed.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import backend.serp_parser as serp_parser
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "serp"
+
+
+def available_parsers():
+    parsers = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        parsers.insert(0, "lxml")
+    except ImportError:
+        pass
+    return parsers
+
+
+def bench(html, parser, iterations):
+    serp_parser.HTML_PARSER = parser
+    results = serp_parser.parse_serp(html)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        serp_parser.parse_serp(html)
+    elapsed = time.perf_counter() - start
+    return results, elapsed / iterations
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    fixtures = sorted(FIXTURES.glob("*.html"))
+    if not fixtures:
+        print(f"No fixtures found in {FIXTURES}")
+        sys.exit(1)
+
+    for fixture in fixtures:
+        html = fixture.read_text(encoding="utf-8")
+        print(f"\n📄 {fixture.name} ({len(html) / 1024:.1f} KiB)")
+        for parser in available_parsers():
+            results, per_page = bench(html, parser, iterations)
+            print(f"  {parser:<12} {per_page * 1000:7.2f} ms/page  {1 / per_page:8.0f} pages/s  {len(results)} results")
+        print(f"  (per-element WebDriver extraction: {len(results) * 4} chromedriver round trips per page)")
@@ -0,0 +1,187 @@
+"""
+Load test for the /track_open tracking pixel and the /track_click redirect.
+
+Usage: python benchmarks/bench_tracking_pixel.py [seconds] [connections] [--clicks]
+
+Builds a throwaway SQLite database with 10,000 sent emails and serves two
+apps with uvicorn on local ports, one after the other:
+
+- before: the old handler, one UPDATE (and counter upsert) committed per
+  hit, then pixel.png read from disk with FileResponse;
+- after: backend/api.py, which buffers the hit and serves the pixel from
+  memory (backend/tracking.py).
+
+Each is hammered for `seconds` (10 by default) by `connections` keep-alive
+HTTP/1.1 clients (50 by default) requesting random emails, a fifth of them
+repeat opens. It reports requests/s and latency percentiles, then checks
+that every hit of the "after" run reached email_open_events and that the
+opened counters match the emails table.
+
+With --clicks the clients follow signed /track_click links instead (a
+fifth of them repeat clicks) against backend/api.py only, and the clicks
+are checked against email_click_events and the clicks counters.
+"""
+import os
+import sys
+import time
+import random
+import socket
+import asyncio
+import tempfile
+import threading
+
+os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="pixel-bench-"), "bench.db")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import FileResponse
+from sqlalchemy import select, update, func
+from database.db import engine, SessionLocal, DATABASE_URL
+from database.models import User, Campaign, Lead, EmailContent, EmailOpenEvent, EmailClickEvent, CampaignStats
+from database.migrations import upgrade
+from database.bulk import bulk_insert
+from database.campaign_stats import bump as bump_stats
+import backend.tracking as tracking
+from backend.email_render import tracked_link, API_BASE_URL
+from backend.api import app as new_app
+
+EMAILS = 10_000
+
+old_app = FastAPI()
+
+
+@old_app.get("/track_open")
+async def old_track_open(email_id: int = None):
+    # The handler as it was before the open buffer
+    if email_id:
+        session = SessionLocal()
+        try:
+            marked = session.execute(
+                update(EmailContent)
+                .where(EmailContent.id == email_id, EmailContent.opened.isnot(True))
+                .values(opened=True)
+                .returning(EmailContent.campaign_id),
+                execution_options={"synchronize_session": False},
+            ).first()
+            if marked:
+                bump_stats(session, marked.campaign_id, emails_opened=1)
+            session.commit()
+        finally:
+            session.close()
+    return FileResponse(tracking.PIXEL_PATH, media_type="image/png")
+
+
+def populate():
+    upgrade(engine)
+    with engine.begin() as conn:
+        bulk_insert(conn, User.__table__, [{"id": 1, "username": "bench"}])
+        bulk_insert(conn, Campaign.__table__, [{"id": 1, "name": "pixel", "user_id": 1}])
+        bulk_insert(conn, Lead.__table__, [{"id": i, "campaign_id": 1} for i in range(1, EMAILS + 1)])
+        bulk_insert(conn, EmailContent.__table__, [
+            {"id": i, "lead_id": i, "campaign_id": 1, "delivery_status": "Sent", "opened": False}
+            for i in range(1, EMAILS + 1)
+        ])
+
+
+def reset():
+    with engine.begin() as conn:
+        conn.execute(update(EmailContent.__table__).values(opened=False, clicked=False, first_opened_at=None, last_opened_at=None))
+        conn.execute(EmailOpenEvent.__table__.delete())
+        conn.execute(EmailClickEvent.__table__.delete())
+        conn.execute(CampaignStats.__table__.delete())
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(app):
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, port
+
+
+def open_path(email_id):
+    return f"/track_open?email_id={email_id}"
+
+
+def click_path(email_id):
+    return tracked_link(email_id, f"https://example.com/portfolio?for={email_id}")[len(API_BASE_URL):]
+
+
+async def client(port, deadline, latencies, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    opened = []
+    while time.perf_counter() < deadline:
+        if opened and random.random() < 0.2:
+            email_id = random.choice(opened)
+        else:
+            email_id = random.randint(1, EMAILS)
+            opened.append(email_id)
+        started = time.perf_counter()
+        writer.write(f"GET {path(email_id)} HTTP/1.1\r\nHost: bench\r\n"
+                     f"User-Agent: Mozilla/5.0 (bench)\r\n\r\n".encode())
+        await writer.drain()
+        headers = await reader.readuntil(b"\r\n\r\n")
+        length = next(int(line.split(b":")[1]) for line in headers.split(b"\r\n") if line.lower().startswith(b"content-length"))
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - started)
+    writer.close()
+
+
+async def hammer(port, seconds, connections, path):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(client(port, deadline, latencies, path) for _ in range(connections)))
+    return latencies
+
+
+def run(label, app, seconds, connections, path=open_path):
+    reset()
+    server, thread, port = serve(app)
+    latencies = asyncio.run(hammer(port, seconds, connections, path))
+    server.should_exit = True
+    thread.join()
+    latencies.sort()
+    pct = lambda p: latencies[int(len(latencies) * p) - 1] * 1000
+    print(f"  {label:<7} {len(latencies) / seconds:8,.0f} req/s   p50 {pct(0.5):6.1f} ms   p99 {pct(0.99):7.1f} ms")
+    return len(latencies)
+
+
+def count(conn, query):
+    return conn.execute(query).scalar()
+
+
+if __name__ == "__main__":
+    clicks = "--clicks" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--clicks"]
+    seconds = float(args[0]) if len(args) > 0 else 10
+    connections = int(args[1]) if len(args) > 1 else 50
+    populate()
+    if clicks:
+        print(f"\n🔗 Click redirect load test: {connections} connections for {seconds:.0f}s")
+        hits = run("after", new_app, seconds, connections, click_path)
+        with engine.connect() as conn:
+            events = count(conn, select(func.count()).select_from(EmailClickEvent.__table__))
+            clicked = count(conn, select(func.count()).select_from(EmailContent.__table__).where(EmailContent.clicked.is_(True)))
+            stats = conn.execute(select(CampaignStats.clicks, CampaignStats.emails_clicked).where(CampaignStats.campaign_id == 1)).first()
+        print(f"  after:  {events:,} of {hits:,} clicks in email_click_events (counter {stats.clicks:,}); "
+              f"{clicked:,} emails clicked, counter {stats.emails_clicked:,}")
+        os.remove(DATABASE_URL[len("sqlite:///"):])
+        sys.exit(0)
+    print(f"\n📈 Pixel load test: {connections} connections for {seconds:.0f}s each")
+    run("before", old_app, seconds, connections)
+    hits = run("after", new_app, seconds, connections)
+    with engine.connect() as conn:
+        events = conn.execute(select(func.count()).select_from(EmailOpenEvent.__table__)).scalar()
+        opened = conn.execute(select(func.count()).select_from(EmailContent.__table__).where(EmailContent.opened.is_(True))).scalar()
+        counter = conn.execute(select(CampaignStats.emails_opened).where(CampaignStats.campaign_id == 1)).scalar()
+    print(f"  after:  {events:,} of {hits:,} hits in email_open_events; {opened:,} emails opened, counter {counter:,}")
+    os.remove(DATABASE_URL[len("sqlite:///"):])
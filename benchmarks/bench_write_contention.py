@@ -0,0 +1,141 @@
+"""
+Write-contention benchmark for the SQLite engine configuration in database/db.py.
+
+Usage: python benchmarks/bench_write_contention.py [seconds] [pixel_writers] [dashboard_readers]
+
+Simulates the production mix on one database file: tracking-pixel hits
+(many tiny UPDATE + COMMIT), an email sender marking rows as sent, and
+dashboard readers running the leads/emails join. It runs the mix twice on
+fresh copies of the same data, once with the old bare engine
+(rollback journal, no pragmas) and once with `make_engine`
+(WAL, busy_timeout, synchronous=NORMAL, pooled, read-only dashboard engine),
+and reports throughput, write latency and "database is locked" errors.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from database.db import make_engine
+from database.migrations import upgrade
+
+CAMPAIGNS = 20
+LEADS = 40_000
+EMAILS_PER_LEAD = 2
+
+
+def populate(engine):
+    upgrade(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, username, is_admin) VALUES (1, 'bench', 0)")
+        conn.exec_driver_sql(
+            "INSERT INTO campaigns (id, name, user_id, status) VALUES (?, ?, 1, 'Sending')",
+            [(c, f"campaign_{c}") for c in range(1, CAMPAIGNS + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO leads (id, campaign_id, industry, state) VALUES (?, ?, 'Restaurant', 'Texas')",
+            [(lead, lead % CAMPAIGNS + 1) for lead in range(1, LEADS + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO email_contents (id, lead_id, campaign_id, delivery_status, opened) VALUES (?, ?, ?, 'Pending', 0)",
+            [(e, (e - 1) // EMAILS_PER_LEAD + 1, ((e - 1) // EMAILS_PER_LEAD + 1) % CAMPAIGNS + 1)
+             for e in range(1, LEADS * EMAILS_PER_LEAD + 1)],
+        )
+
+
+class Tally:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ops = {"pixel": 0, "send": 0, "read": 0}
+        self.errors = 0
+        self.write_latencies = []
+
+    def record(self, kind, started=None):
+        with self.lock:
+            self.ops[kind] += 1
+            if started is not None:
+                self.write_latencies.append(time.perf_counter() - started)
+
+    def error(self):
+        with self.lock:
+            self.errors += 1
+
+
+def write_loop(engine, kind, tally, stop, seed):
+    rng = random.Random(seed)
+    total = LEADS * EMAILS_PER_LEAD
+    statement = text(
+        "UPDATE email_contents SET opened = 1 WHERE id = :id" if kind == "pixel"
+        else "UPDATE email_contents SET delivery_status = 'Sent' WHERE id = :id"
+    )
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                conn.execute(statement, {"id": rng.randint(1, total)})
+            tally.record(kind, started)
+        except OperationalError:
+            tally.error()
+        if kind == "send":
+            time.sleep(0.005)  # the SMTP round trip between two status updates
+
+
+def read_loop(engine, tally, stop, seed):
+    rng = random.Random(seed)
+    statement = text(
+        "SELECT leads.id, email_contents.delivery_status, email_contents.opened FROM leads "
+        "LEFT OUTER JOIN email_contents ON leads.id = email_contents.lead_id WHERE leads.campaign_id = :campaign_id"
+    )
+    while not stop.is_set():
+        try:
+            with engine.connect() as conn:
+                # Hold the read open like a dashboard rendering row by row
+                for _ in conn.execute(statement, {"campaign_id": rng.randint(1, CAMPAIGNS)}):
+                    pass
+            tally.record("read")
+        except OperationalError:
+            tally.error()
+
+
+def run(label, write_engine, read_engine, seconds, pixel_writers, readers):
+    tally, stop = Tally(), threading.Event()
+    threads = [threading.Thread(target=write_loop, args=(write_engine, "pixel", tally, stop, i)) for i in range(pixel_writers)]
+    threads.append(threading.Thread(target=write_loop, args=(write_engine, "send", tally, stop, -1)))
+    threads += [threading.Thread(target=read_loop, args=(read_engine, tally, stop, 100 + i)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(tally.write_latencies) or [0.0]
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"  {label:<7} pixel {tally.ops['pixel'] / seconds:7.0f}/s  send {tally.ops['send'] / seconds:5.0f}/s  "
+          f"dashboard reads {tally.ops['read'] / seconds:5.1f}/s  write p50 {p50 * 1000:6.1f} ms  "
+          f"p95 {p95 * 1000:7.1f} ms  locked errors {tally.errors}")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    pixel_writers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    readers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    workdir = tempfile.mkdtemp(prefix="contention-bench-")
+
+    print(f"\n🔒 {pixel_writers} pixel writers, 1 sender, {readers} dashboard readers for {seconds:.0f}s each")
+    bare_url = f"sqlite:///{os.path.join(workdir, 'bare.db')}"
+    bare = create_engine(bare_url, connect_args={"check_same_thread": False})
+    populate(bare)
+    run("bare", bare, bare, seconds, pixel_writers, readers)
+
+    tuned_url = f"sqlite:///{os.path.join(workdir, 'tuned.db')}"
+    tuned = make_engine(tuned_url)
+    populate(tuned)
+    run("tuned", tuned, make_engine(tuned_url, read_only=True), seconds, pixel_writers, readers)
@@ -0,0 +1,274 @@
+"""
+Offline benchmark harness for the scraper.
+
+Usage: python benchmarks/scraper_harness.py [--platforms yelp,instagram] [--industries Restaurant]
+           [--locations Texas,Florida] [--captcha-every 7] [--solve-latency 2]
+           [--slow-rate 0.1] [--broken-rate 0.1] [--json report.json]
+
+Runs the full run_scraper_for_campaign flow (headless Chrome, SERP parsing,
+result page fetching, CAPTCHA parking, lead validation and batched inserts)
+against a local HTTP stand-in instead of Google, Capsolver and real websites:
+
+  /search         recorded SERPs from fixtures/serp, with result links rewritten
+                  to local contact pages; every Nth search redirects to a CAPTCHA
+  /sorry/index    a reCAPTCHA v2 challenge page; submitting any token lets the
+                  blocked search through once
+  /site/<name>    contact pages, some slow (past SCRAPER_FETCH_TIMEOUT) or broken (404/500)
+
+Capsolver is replaced by a fake with a fixed latency, and leads are written to
+a throwaway SQLite database. Needs Chrome/ChromeDriver like a real scrape.
+Reports queries/min, pages/sec, leads found and the time split between
+navigation, parsing, fetching and sleeping.
+"""
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, quote
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "serp"
+RESULT_LINK = re.compile(r'href="https?://[^"/]+/biz/([^"]+)"')
+SITEKEY = "6Lbench-harness-sitekey"
+
+
+class StandIn:
+    """Behaviour of the local Google / website stand-in."""
+
+    def __init__(self, captcha_every, slow_rate, broken_rate, slow_seconds):
+        self.fixtures = [p.read_text(encoding="utf-8") for p in sorted(FIXTURES.glob("*.html"))]
+        self.captcha_every = captcha_every
+        self.slow_rate = slow_rate
+        self.broken_rate = broken_rate
+        self.slow_seconds = slow_seconds
+        self.port = None
+        self.searches = 0
+        self.captchas = 0
+        self.pages = 0
+        self._lock = threading.Lock()
+
+    def serp(self, query):
+        """A recorded SERP whose result links point at this query's local contact pages."""
+        key = zlib.crc32(query.encode("utf-8"))
+        html = self.fixtures[key % len(self.fixtures)]
+        # Two "websites", so the per-host limit matters: at most 2 x SCRAPER_FETCH_PER_HOST pages are
+        # fetched at once, like the site: dorks whose links mostly point at one or two platforms
+        hosts = ("127.0.0.1", "localhost")
+
+        def local_link(match):
+            name = f"{match.group(1)}-q{key % 10000}"
+            host = hosts[zlib.crc32(name.encode("utf-8")) % len(hosts)]
+            return f'href="http://{host}:{self.port}/site/{name}"'
+
+        return RESULT_LINK.sub(local_link, html)
+
+    def challenge_next_search(self):
+        with self._lock:
+            self.searches += 1
+            challenge = self.captcha_every > 0 and self.searches % self.captcha_every == 0
+            if challenge:
+                self.captchas += 1
+            return challenge
+
+    def page_kind(self, name):
+        with self._lock:
+            self.pages += 1
+        roll = (zlib.crc32(name.encode("utf-8")) % 1000) / 1000
+        if roll < self.broken_rate / 2:
+            return 404
+        if roll < self.broken_rate:
+            return 500
+        if roll < self.broken_rate + self.slow_rate:
+            return "slow"
+        return 200
+
+
+def sorry_page(continue_url):
+    return f"""<!DOCTYPE html><html><head><title>Sorry...</title></head><body>
+<form action="/sorry/index" method="post">
+<div class="g-recaptcha" data-sitekey="{SITEKEY}"></div>
+<iframe src="/recaptcha/api2/anchor?k={SITEKEY}" width="304" height="78"></iframe>
+<textarea id="g-recaptcha-response" name="g-recaptcha-response" style="display:none"></textarea>
+<input type="hidden" name="continue" value="{continue_url}">
+<button type="submit">Submit</button>
+</form></body></html>"""
+
+
+def contact_page(name):
+    slug = name.replace("-", "")
+    return f"""<!DOCTYPE html><html><head><title>{name}</title></head><body>
+<h1>{name.replace("-", " ").title()}</h1>
+<p>Reach us at <a href="mailto:hello@{slug}.com">hello@{slug}.com</a>.</p>
+<img src="/static/logo@2x.png"><footer>noreply@{slug}.com</footer>
+</body></html>"""
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Dropped connections are expected: the fetcher gave up on a slow page
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def make_handler(stand_in):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_html(self, html, status=200, headers=()):
+            body = html.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for header in headers:
+                self.send_header(*header)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def redirect(self, location, headers=()):
+            self.send_response(302)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            for header in headers:
+                self.send_header(*header)
+            self.end_headers()
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            if url.path == "/search":
+                # A solved challenge lets exactly one search through
+                if "bench_pass=1" in self.headers.get("Cookie", ""):
+                    return self.send_html(stand_in.serp(params.get("q", [""])[0]),
+                                          headers=[("Set-Cookie", "bench_pass=; Max-Age=0; Path=/")])
+                if stand_in.challenge_next_search():
+                    return self.redirect("/sorry/index?continue=" + quote(self.path, safe=""))
+                return self.send_html(stand_in.serp(params.get("q", [""])[0]))
+            if url.path == "/sorry/index":
+                return self.send_html(sorry_page(params.get("continue", ["/search"])[0]), status=429)
+            if url.path.startswith("/recaptcha/"):
+                return self.send_html("<html><body>reCAPTCHA</body></html>")
+            if url.path.startswith("/site/"):
+                name = url.path[len("/site/"):]
+                kind = stand_in.page_kind(name)
+                if kind == "slow":
+                    time.sleep(stand_in.slow_seconds)
+                    kind = 200
+                if kind != 200:
+                    return self.send_html("<html><body>Error</body></html>", status=kind)
+                return self.send_html(contact_page(name))
+            self.send_html("<html><body>Not found</body></html>", status=404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(length).decode("utf-8"))
+            if urlsplit(self.path).path == "/sorry/index" and form.get("g-recaptcha-response", [""])[0]:
+                return self.redirect(form.get("continue", ["/search"])[0],
+                                     headers=[("Set-Cookie", "bench_pass=1; Path=/")])
+            self.send_html(sorry_page(form.get("continue", ["/search"])[0]), status=429)
+
+    return Handler
+
+
+def configure_environment(port, workdir, args):
+    """Points the scraper at the stand-in. Must run before backend modules are imported."""
+    os.environ["SCRAPER_SEARCH_URL"] = f"http://127.0.0.1:{port}/search"
+    os.environ["SCRAPER_CACHE_PATH"] = os.path.join(workdir, "scrape_cache.db")
+    os.environ["SCRAPER_PROXIES"] = ""
+    os.environ.setdefault("DB_ENCRYPTION_KEY", "benchmark-only-key")
+    os.environ.setdefault("SCRAPER_MIN_DELAY", "0.2")
+    os.environ.setdefault("SCRAPER_MAX_DELAY", "0.5")
+    os.environ.setdefault("SCRAPER_QUERIES_PER_MINUTE", "600")
+    os.environ.setdefault("SCRAPER_FETCH_TIMEOUT", str(args.slow_seconds / 2))
+    # Benchmark CAPTCHAs are scheduled, not a sign of a burnt identity
+    os.environ.setdefault("SCRAPER_BLOCK_RATE_LIMIT", "1.1")
+
+
+def fake_capsolver(latency):
+    def solve(task):
+        time.sleep(latency)
+        return {"gRecaptchaResponse": f"bench-token-{task['websiteKey']}"}
+    return solve
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="scraper-bench-")
+    stand_in = StandIn(args.captcha_every, args.slow_rate, args.broken_rate, args.slow_seconds)
+    server = StandInServer(("127.0.0.1", 0), make_handler(stand_in))
+    stand_in.port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    configure_environment(stand_in.port, workdir, args)
+
+    from sqlalchemy import create_engine
+    import capsolver
+    from database.db import SessionLocal
+    from database.models import Base, User, Campaign, Lead
+    from backend.scrape_metrics import ScrapeMetrics, STAGES
+    import backend.scraper as scraper
+
+    capsolver.solve = fake_capsolver(args.solve_latency)
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+
+    session = SessionLocal()
+    user = User(username="benchmark", name="Benchmark", email="bench@localhost", password_hash="")
+    session.add(user)
+    session.flush()
+    campaign = Campaign(name="benchmark", service="Benchmark", user_id=user.id,
+                        platforms=args.platforms, industries=args.industries, locations=args.locations)
+    session.add(campaign)
+    session.commit()
+
+    metrics = ScrapeMetrics()
+    scraper.run_scraper_for_campaign("benchmark", "benchmark", metrics=metrics)
+    report = metrics.report()
+    report["leads_saved"] = session.query(Lead).filter_by(campaign_id=campaign.id).count()
+    report["captchas_served"] = stand_in.captchas
+    session.close()
+    server.shutdown()
+
+    print("\n📊 Scraper benchmark")
+    print(f"  queries        {report['queries']:>8}   {report['queries_per_minute']:8.1f} /min")
+    print(f"  pages fetched  {report['pages']:>8}   {report['pages_per_second']:8.1f} /s")
+    print(f"  leads found    {report['leads']:>8}   ({report['leads_saved']} saved after validation)")
+    print(f"  CAPTCHAs       {report['captchas_served']:>8}")
+    print(f"  wall clock     {report['elapsed_seconds']:8.1f} s")
+    busy = sum(report[f"{stage}_seconds"] for stage in STAGES) or 1.0
+    for stage in STAGES:
+        seconds = report[f"{stage}_seconds"]
+        print(f"  {stage:<14} {seconds:8.1f} s   {seconds / busy:6.0%}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"  report written to {args.json}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local stand-in for Google.")
+    parser.add_argument("--platforms", default="yelp,instagram")
+    parser.add_argument("--industries", default="Restaurant")
+    parser.add_argument("--locations", default="Texas,Florida")
+    parser.add_argument("--captcha-every", type=int, default=7, help="challenge every Nth search (0 = never)")
+    parser.add_argument("--solve-latency", type=float, default=2.0, help="fake Capsolver latency in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.1, help="share of contact pages that hang")
+    parser.add_argument("--broken-rate", type=float, default=0.1, help="share of contact pages answering 404/500")
+    parser.add_argument("--slow-seconds", type=float, default=4.0, help="how long a slow page hangs")
+    parser.add_argument("--json", help="also write the report to this file")
+    run(parser.parse_args())
@@ -1,5 +1,7 @@
 import streamlit as st
 import subprocess
+import requests
+import json
 import pandas as pd
 import os
 import sys
@@ -10,16 +12,62 @@ from reportlab.lib.pagesizes import letter, landscape
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
 from reportlab.lib.styles import getSampleStyleSheet
-from sqlalchemy import text
+from sqlalchemy import text, func
 
 # Setup paths
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from user_auth import get_authenticator, is_admin_user
-from database.db import SessionLocal
-from database.models import User, Campaign, Lead, SenderConfig, EmailContent
+from database.db import ReadSessionLocal
+from database.models import User, Campaign, Lead, SenderConfig, EmailContent, CampaignStats, DeletionJob, Job
+from database.campaign_stats import load as load_stats, SENTIMENT_FIELDS
+from backend.job_queue import campaign_args, UNFINISHED, DELETION_FAILED
 
 st.set_page_config(page_title="📬 AI Automated Email Marketing Tool", layout="wide")
+API_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+PROGRESS_REFRESH_SECONDS = 2
+
+
+def queue_job(endpoint, payload):
+    """Asks the API to queue a task for the worker pool (backend/worker.py). Returns the job id."""
+    resp = requests.post(f"{API_URL}/{endpoint}", json=payload)
+    resp.raise_for_status()
+    return resp.json().get("job_id")
+
+
+def render_live_progress(campaign_id):
+    """Stage counts from the API's tiny progress endpoint; the rest of the page is not rerun meanwhile."""
+    try:
+        resp = requests.get(f"{API_URL}/campaigns/{campaign_id}/progress", timeout=5)
+        resp.raise_for_status()
+        snapshot = resp.json()
+    except Exception as e:
+        st.caption(f"⚠️ Live progress unavailable: {e}")
+        return
+    running = [stage for stage in snapshot["stages"] if stage["status"] == "Running"]
+    for stage in running or snapshot["stages"][:1]:
+        done = f"{stage['processed']}/{stage['total']}" if stage["total"] else str(stage["processed"])
+        rate = f", {stage['per_second']:.1f}/s" if stage["per_second"] else ""
+        errors = f", {stage['errors']} errors" if stage["errors"] else ""
+        label = f"{stage['stage'].replace('_', ' ')}: {stage['status']} — {done}{rate}{errors}"
+        if stage["total"]:
+            st.progress(min(stage["processed"] / stage["total"], 1.0), text=label)
+        else:
+            st.caption(label)
+        if stage["message"]:
+            st.caption(stage["message"])
+        if stage["last_error"] and stage["status"] != "Completed":
+            st.caption(f"❌ {stage['last_error']}")
+    # A stage just finished: rerun the whole page once so tables and buttons catch up
+    was_running = st.session_state.get("progress_running", {}).get(campaign_id, False)
+    st.session_state.setdefault("progress_running", {})[campaign_id] = bool(running)
+    if was_running and not running:
+        st.rerun(scope="app")
+
+
+def deletion_caption(job):
+    done = f"{job.rows_deleted}/{job.rows_total} rows" if job.rows_total else "counting rows"
+    return f"🗑️ Deleting {job.kind} '{job.target_name}': {job.status}, {done}. Refresh to follow progress."
 
 if "authenticator" not in st.session_state:
     st.session_state.authenticator = get_authenticator()
@@ -41,8 +89,8 @@ if st.sidebar.button("🚪 Logout"):
     st.rerun()
 
 
-import database.db as db_mod
-db = SessionLocal()
+# The page only reads; every change (stages, deletions) is queued through the API
+db = ReadSessionLocal()
 user = db.query(User).filter_by(username=username).first()
 if not user:
     st.error("❌ User not found in database.")
@@ -72,30 +120,33 @@ if admin:
         st.dataframe(df_users, use_container_width=True)
 
         st.subheader("📂 User Campaign Activity")
-        for user_row in df_users["username"]:
-            u = db.query(User).filter_by(username=user_row).first()
-            if u:
-                campaign_count = db.query(Campaign).filter(Campaign.user_id == u.id).count()
-                # Count emails marked as "Sent"
-                total_emails_sent = db.query(EmailContent).join(Campaign).filter(Campaign.user_id == u.id, EmailContent.delivery_status == "Sent").count()
-                display_name = u.name if u.name else u.username
-                st.markdown(f"**📂 {display_name}** — {total_emails_sent} emails sent across {campaign_count} campaigns")
+        # One grouped query over the per-campaign counters instead of counting emails per user
+        activity = {
+            user_id: (campaign_count, emails_sent)
+            for user_id, campaign_count, emails_sent in db.query(
+                Campaign.user_id, func.count(Campaign.id), func.coalesce(func.sum(CampaignStats.emails_sent), 0)
+            ).outerjoin(CampaignStats, CampaignStats.campaign_id == Campaign.id).group_by(Campaign.user_id)
+        }
+        for u in all_users:
+            campaign_count, total_emails_sent = activity.get(u.id, (0, 0))
+            display_name = u.name if u.name else u.username
+            st.markdown(f"**📂 {display_name}** — {total_emails_sent} emails sent across {campaign_count} campaigns")
 
         # --- Admin: Delete User Functionality ---
         st.subheader("🗑️ Delete a User")
+        # Deleting runs in the backend, in chunks (backend/delete_data.py): a user with large
+        # campaigns is never loaded into this page
+        for job in db.query(DeletionJob).filter(DeletionJob.kind == "user", DeletionJob.status.in_(["Queued", "Running"])):
+            st.caption(deletion_caption(job))
         user_to_delete = st.selectbox("Select a user to delete", df_users["username"].tolist(), key="delete_user_select")
         if st.button("Delete Selected User", key="delete_user_btn"):
-            with st.spinner(f"Deleting user '{user_to_delete}' and all related data..."):
-                del_user = db.query(User).filter_by(username=user_to_delete).first()
-                # With cascade="all, delete-orphan" on the User model's relationships,
-                # SQLAlchemy will automatically delete all associated campaigns, leads, emails, and sender configs.
-                if del_user:
-                    db.delete(del_user)
-                    db.commit()
-                    st.success(f"✅ User '{user_to_delete}' and all related data deleted!")
+            with st.spinner(f"Starting deletion of user '{user_to_delete}'..."):
+                try:
+                    job_id = queue_job("delete_user", {"username": user_to_delete})
+                    st.success(f"✅ Deletion of user '{user_to_delete}' and all related data queued as job #{job_id}.")
                     st.rerun()
-                else:
-                    st.error(f"❌ User '{user_to_delete}' not found.")
+                except Exception as e:
+                    st.error(f"❌ Failed to start deleting user '{user_to_delete}': {e}")
     else:
         st.warning("No users registered yet.")
     # Removed st.stop() so admin can see campaign dashboard too
@@ -153,19 +204,34 @@ if campaign_obj:
     
     # Display the live status of the campaign
     st.sidebar.markdown(f"**Status:** `{campaign_obj.status}`")
-
-    # Disable buttons if a task is running.
-    is_task_running = campaign_obj.status not in ["Idle", "Completed"] and not campaign_obj.status.startswith("Failed")
-
-    import requests
-    API_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+    # While a stage runs (or is queued) only this panel refreshes, every PROGRESS_REFRESH_SECONDS
+    job_pending = db.query(Job.id).filter(Job.user_id == user.id, Job.status.in_(["Queued", "Running"])).first() is not None
+    stage_running = campaign_obj.status not in ["Idle", "Completed", "Deleting"] and not campaign_obj.status.startswith("Failed")
+    with st.sidebar:
+        st.fragment(render_live_progress, run_every=PROGRESS_REFRESH_SECONDS if job_pending or stage_running else None)(campaign_obj.id)
+    if campaign_obj.status in ("Deleting", DELETION_FAILED):
+        deletion = db.query(DeletionJob).filter(
+            DeletionJob.kind == "campaign", DeletionJob.target_id == campaign_obj.id
+        ).order_by(DeletionJob.id.desc()).first()
+        if campaign_obj.status == DELETION_FAILED:
+            # Some leads and emails may already be gone; deleting again resumes from there
+            st.sidebar.error("❌ Deleting this campaign failed" + (f": {deletion.status.removeprefix('Failed: ')}." if deletion else ".") + " Delete it again to retry.")
+        elif deletion:
+            st.sidebar.caption(deletion_caption(deletion))
+
+    # Disable buttons if a task is running, or queued for this campaign: a second stage would run alongside it
+    campaign_job_pending = db.query(Job.id).filter(
+        Job.args == campaign_args(username, selected_campaign), Job.status.in_(UNFINISHED)
+    ).first() is not None
+    is_task_running = campaign_job_pending or (
+        campaign_obj.status not in ["Idle", "Completed"] and not campaign_obj.status.startswith("Failed")
+    )
 
     if st.sidebar.button("🔍 Scrape Leads", disabled=is_task_running):
         with st.spinner("Sending scrape request to the backend..."):
             try:
-                resp = requests.post(f"{API_URL}/scrape_leads", json={"username": username, "campaign_name": selected_campaign})
-                resp.raise_for_status()
-                st.success("✅ Scrape task started! The browser window should appear shortly. Please refresh the dashboard in a few minutes to see the results.")
+                job_id = queue_job("scrape_leads", {"username": username, "campaign_name": selected_campaign})
+                st.success(f"✅ Scrape queued as job #{job_id}! Headless browsers search in the background once a worker picks it up; progress shows in the sidebar.")
                 st.rerun()
             except Exception as e:
                 st.error(f"❌ Scrape failed: {e}")
@@ -173,9 +239,8 @@ if campaign_obj:
     if st.sidebar.button("🧠 Generate Emails", disabled=is_task_running):
         with st.spinner("Starting email generation... This may take a moment."):
             try:
-                resp = requests.post(f"{API_URL}/generate_emails", json={"username": username, "campaign_name": selected_campaign})
-                resp.raise_for_status()
-                st.success("✅ Email generation started! Refresh in a moment to review the email content.")
+                job_id = queue_job("generate_emails", {"username": username, "campaign_name": selected_campaign})
+                st.success(f"✅ Email generation queued as job #{job_id}! Progress shows in the sidebar.")
                 st.rerun()
             except Exception as e:
                 st.error(f"❌ Failed to start the email task: {e}")
@@ -183,9 +248,8 @@ if campaign_obj:
     if st.sidebar.button("📤 Send Generated Emails", disabled=is_task_running):
         with st.spinner("Starting email sending process..."):
             try:
-                resp = requests.post(f"{API_URL}/send_emails", json={"username": username, "campaign_name": selected_campaign})
-                resp.raise_for_status()
-                st.success("✅ Email sending started! Refresh in a moment to see delivery statuses.")
+                job_id = queue_job("send_emails", {"username": username, "campaign_name": selected_campaign})
+                st.success(f"✅ Email sending queued as job #{job_id}! Progress shows in the sidebar.")
                 st.rerun()
             except Exception as e:
                 st.error(f"❌ Failed to start sending task: {e}")
@@ -193,11 +257,22 @@ if campaign_obj:
     if st.sidebar.button("🔄 Re-analyze Replies", disabled=is_task_running):
         with st.spinner("Starting reply analysis..."):
             try:
-                resp = requests.post(f"{API_URL}/analyze_replies", json={"username": username, "campaign_name": selected_campaign})
-                st.success("✅ Reply analysis started! Please refresh the dashboard in a few minutes to see the results.")
+                job_id = queue_job("analyze_replies", {"username": username, "campaign_name": selected_campaign})
+                st.success(f"✅ Reply analysis queued as job #{job_id}! Progress shows in the sidebar.")
                 st.rerun()
             except Exception as e:
                 st.error(f"❌ Failed to start reply analysis: {e}")
+
+    # The buttons only queue jobs; the worker pool runs them (also at GET /jobs/{id})
+    recent_jobs = db.query(Job).filter(Job.user_id == user.id).order_by(Job.id.desc()).limit(5).all()
+    if recent_jobs:
+        st.sidebar.markdown("### 🧾 Recent Jobs")
+        for job in recent_jobs:
+            campaign_label = json.loads(job.args or "{}").get("campaign_name", "")
+            st.sidebar.caption(
+                f"#{job.id} {job.kind} {campaign_label}: **{job.status}** (attempt {job.attempts}/{job.max_attempts})"
+                + (f" — {job.error}" if job.error and job.status != "Completed" else "")
+            )
     
 else:
     st.sidebar.warning("⚠️ No campaign selected.")
@@ -208,14 +283,16 @@ if campaign_obj:
 
     # Delete Campaign Button
     st.sidebar.markdown("---")
-    if st.sidebar.button("🗑️ Delete This Campaign"):
-        with st.spinner("Deleting campaign and all related data..."):
-            # With the improved cascade settings, deleting the campaign object
-            # will automatically handle the deletion of all its associated leads and emails.
-            db.delete(campaign_obj)
-            db.commit()
-        st.success(f"✅ Campaign '{selected_campaign}' deleted!")
-        st.rerun()
+    # Not while a stage runs or waits: it would write into the rows being deleted
+    if st.sidebar.button("🗑️ Delete This Campaign", disabled=is_task_running):
+        with st.spinner("Starting campaign deletion..."):
+            # Leads and emails are deleted by the backend in chunks, with progress shown above
+            try:
+                job_id = queue_job("delete_campaign", {"username": username, "campaign_name": selected_campaign})
+                st.success(f"✅ Deletion of campaign '{selected_campaign}' queued as job #{job_id}.")
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ Failed to start deleting the campaign: {e}")
 
     # Show dashboard sections based on available data
 
@@ -224,7 +301,13 @@ if campaign_obj:
     # --- Refactored Data Loading ---
     # We always need to join Lead and EmailContent now to get the full picture.
     # We use an outer join to ensure we still see leads even if email hasn't been generated yet.
-    query = db.query(Lead, EmailContent).outerjoin(EmailContent, Lead.id == EmailContent.lead_id).filter(Lead.campaign_id == campaign_obj.id)
+    # Only the displayed columns are selected: the HTML copy of each email is never decrypted.
+    query = db.query(
+        Lead.name, Lead.email, Lead.profile_link, Lead.state, Lead.industry, Lead.platform_source,
+        Lead.profile_description,
+        EmailContent.id.label("email_id"), EmailContent.subject, EmailContent.body,
+        EmailContent.delivery_status, EmailContent.opened, EmailContent.reply_text, EmailContent.reply_sentiment,
+    ).outerjoin(EmailContent, Lead.id == EmailContent.lead_id).filter(Lead.campaign_id == campaign_obj.id)
 
     if dashboard_mode == "Generated Emails":
         query = query.filter(EmailContent.id != None)
@@ -233,23 +316,23 @@ if campaign_obj:
 
     results = query.all()
     data = []
-    for result in results:
-        lead, email = result  # Result is always a tuple now
+    for row in results:
+        has_email = row.email_id is not None
 
         data.append({
-            "name": lead.name,
-            "email": lead.email,
-            "profile_link": lead.profile_link,
-            "state": lead.state,
-            "industry": lead.industry,
-            "platform_source": lead.platform_source,
-            "profile_description": lead.profile_description,
-            "email_subject": email.subject if email else None,
-            "generated_email": email.body if email else None,
-            "delivery_status": email.delivery_status if email else "Not Generated",
-            "opened": "Yes" if email and email.opened else "No",
-            "reply_text": email.reply_text if email else None,
-            "reply_sentiment": email.reply_sentiment if email else None,
+            "name": row.name,
+            "email": row.email,
+            "profile_link": row.profile_link,
+            "state": row.state,
+            "industry": row.industry,
+            "platform_source": row.platform_source,
+            "profile_description": row.profile_description,
+            "email_subject": row.subject,
+            "generated_email": row.body,
+            "delivery_status": row.delivery_status if has_email else "Not Generated",
+            "opened": "Yes" if has_email and row.opened else "No",
+            "reply_text": row.reply_text,
+            "reply_sentiment": row.reply_sentiment,
         })
 
     # st.write("[DEBUG] Raw leads data from DB:", data)
@@ -269,16 +352,16 @@ if campaign_obj:
     df = df.drop_duplicates(subset=["email"])  # Remove duplicate leads by email
 
     st.subheader("📊 Campaign Summary")
-    total_leads = len(df)
-    total_sent = df["delivery_status"].eq("Sent").sum() if (not df.empty and "delivery_status" in df.columns) else 0
-    total_opened = df["opened"].eq("Yes").sum() if (not df.empty and "opened" in df.columns) else 0
-    replies = df["reply_text"].notna().sum() if (not df.empty and "reply_text" in df.columns) else 0
+    # Totals and charts read the campaign's counters row (database/campaign_stats.py),
+    # so they cost the same for ten leads or a million
+    stats = load_stats(db, campaign_obj.id)
 
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Leads", total_leads)
-    col2.metric("Emails Sent", total_sent)
-    col3.metric("Emails Opened", total_opened)
-    col4.metric("Replies", replies)
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Leads", stats["leads"])
+    col2.metric("Emails Sent", stats["emails_sent"])
+    col3.metric("Emails Opened", stats["emails_opened"])
+    col4.metric("Emails Clicked", stats["emails_clicked"], help=f"{stats['clicks']} link clicks in total")
+    col5.metric("Replies", stats["replies"])
 
     # Filters
     st.subheader("📊 Campaign Results")
@@ -341,13 +424,15 @@ if campaign_obj:
             st.error(f"PDF generation failed: {e}")
 
     # Charts
-    if "reply_sentiment" in df.columns and not df["reply_sentiment"].isnull().all():
+    sentiments = {sentiment: stats[field] for sentiment, field in SENTIMENT_FIELDS.items()}
+    if any(sentiments.values()):
         st.subheader("📈 Sentiment Distribution")
-        st.bar_chart(df["reply_sentiment"].value_counts())
+        st.bar_chart(pd.Series(sentiments, name="count"))
 
-    if "opened" in df.columns and not df["opened"].isnull().all():
+    if stats["emails_sent"]:
         st.subheader("📈 Open Rate")
-        st.bar_chart(df["opened"].value_counts())
+        opened = stats["emails_opened"]
+        st.bar_chart(pd.Series({"Yes": opened, "No": max(stats["emails_sent"] - opened, 0)}, name="count"))
 
     if "reply_text" in df.columns:
         st.subheader("📬 Live Reply Viewer")
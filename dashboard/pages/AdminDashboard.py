@@ -10,8 +10,9 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")
 from user_auth import get_authenticator, is_admin_user
 
 # Import DB session and models
-from database.db import SessionLocal
-from database.models import User, Campaign, EmailContent, Lead
+from database.db import ReadSessionLocal
+from sqlalchemy import func
+from database.models import User, Campaign, CampaignStats
 
 # Page config
 st.set_page_config(page_title="🛠️ Admin Dashboard", layout="wide")
@@ -42,7 +43,7 @@ authenticator.logout("🚪 Logout", "sidebar")
 # --- Admin dashboard content ---
 st.title("🛠️ Admin Dashboard")
 
-db = SessionLocal()
+db = ReadSessionLocal()
 
 # --- Show registered users ---
 st.subheader("👤 Registered Users")
@@ -64,23 +65,25 @@ else:
 # --- Show campaign + email summary from DB ---
 st.subheader("📂 User Campaign Summary")
 
-campaigns = db.query(Campaign).all()
-if not campaigns:
+# One grouped query over the per-campaign counters: no lead or email row is read
+summary_rows = (
+    db.query(
+        Campaign.user_id,
+        func.count(Campaign.id).label("campaigns"),
+        func.coalesce(func.sum(CampaignStats.emails_sent), 0).label("emails"),
+    )
+    .outerjoin(CampaignStats, CampaignStats.campaign_id == Campaign.id)
+    .group_by(Campaign.user_id)
+    .all()
+)
+if not summary_rows:
     st.info("No campaigns found.")
 else:
+    users_by_id = {u.id: u for u in users}
     summary = {}
-    for c in campaigns:
-        key = c.user
-        summary.setdefault(key, {"campaigns": 0, "emails": 0})
-        summary[key]["campaigns"] += 1
-        email_count = (
-            db.query(EmailContent)
-            .join(Lead, EmailContent.lead_id == Lead.id)
-            .join(Campaign, Lead.campaign_id == Campaign.id)
-            .filter(Campaign.user_id == c.user_id, Campaign.name == c.name)
-            .count()
-        )
-        summary[key]["emails"] += email_count
+    for user_id, campaign_count, email_count in summary_rows:
+        key = users_by_id.get(user_id, user_id)
+        summary[key] = {"campaigns": campaign_count, "emails": email_count}
 
     for user, stats in summary.items():
         display_name = user.name if hasattr(user, 'name') and user.name else (user.username if hasattr(user, 'username') else str(user))
@@ -0,0 +1,108 @@
+"""
+Keyed-HMAC blind index for encrypted email columns.
+
+`User.email` and `Lead.email` are encrypted, so they cannot be looked up,
+deduplicated or indexed without decrypting rows. Each of them gets an
+`email_hash` column next to it holding HMAC-SHA256(key, normalized email):
+equal addresses give equal hashes, so lookups become indexed equality
+queries, while the hash reveals nothing without the key.
+
+The key comes from BLIND_INDEX_KEY, or is derived from DB_ENCRYPTION_KEY
+when that is not set. Changing it invalidates every stored hash; run the
+backfill with --rehash afterwards.
+
+Usage: python database/blind_index.py [--rehash]   (fills missing hashes in the configured database)
+"""
+import os
+import sys
+import hmac
+import hashlib
+from sqlalchemy import select, update, bindparam, type_coerce, LargeBinary
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from database.crypto import derive_subkey
+
+load_dotenv()
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _load_key():
+    key = os.getenv("BLIND_INDEX_KEY")
+    if key:
+        return key.encode("utf-8")
+    derived = derive_subkey(b"email-blind-index")
+    if derived is None:
+        raise ValueError("Neither BLIND_INDEX_KEY nor DB_ENCRYPTION_KEY is set in the .env file.")
+    return derived
+
+
+BLIND_INDEX_KEY = _load_key()
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def email_hash(email):
+    """Blind index of `email`, or None for an empty address."""
+    normalized = normalize_email(email)
+    if not normalized:
+        return None
+    # 128 bits is plenty to keep distinct addresses apart and halves the index size
+    return hmac.new(BLIND_INDEX_KEY, normalized.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def backfill_email_hashes(conn, table, unique=False, rehash=False, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Computes email_hash for the rows of `table` (users or leads) that lack one.
+    Only the id and email columns are read. With `rehash` every hash is
+    recomputed (after a key change). With `unique`, a row whose address is
+    already hashed on an older row keeps a NULL hash, so accounts registered
+    twice before the check could see through encryption don't block the
+    unique index. Rows whose email cannot be decrypted with the current key
+    are reported and left without a hash. Returns the number of rows hashed.
+    """
+    if rehash:
+        conn.execute(update(table).values(email_hash=None))
+    email_type = table.c.email.type
+    last_id, updated = 0, 0
+    while True:
+        # Fetch the ciphertext and decrypt row by row, so one unreadable row doesn't abort the batch
+        rows = conn.execute(
+            select(table.c.id, type_coerce(table.c.email, LargeBinary))
+            .where(table.c.id > last_id, table.c.email_hash.is_(None))
+            .order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        params = []
+        for row_id, ciphertext in rows:
+            try:
+                email = email_type.process_result_value(ciphertext, conn.dialect)
+            except (ValueError, UnicodeDecodeError):
+                print(f"[BLIND INDEX] ⚠️ {table.name} row {row_id}: email could not be decrypted; left without a hash.")
+                continue
+            hashed = email_hash(email)
+            if unique and hashed:
+                taken = conn.execute(select(table.c.id).where(table.c.email_hash == hashed)).first()
+                if taken or hashed in {p["hashed"] for p in params}:
+                    print(f"[BLIND INDEX] {table.name} row {row_id} repeats an email of an older row; left without a hash.")
+                    continue
+            params.append({"row_id": row_id, "hashed": hashed})
+        if params:
+            # One executemany per batch
+            conn.execute(update(table).where(table.c.id == bindparam("row_id")).values(email_hash=bindparam("hashed")), params)
+        updated += len(params)
+        last_id = rows[-1][0]
+
+
+if __name__ == "__main__":
+    from database.db import engine
+    from database.models import User, Lead
+    rehash = "--rehash" in sys.argv[1:]
+    with engine.begin() as conn:
+        for model, unique in ((User, True), (Lead, False)):
+            count = backfill_email_hashes(conn, model.__table__, unique=unique, rehash=rehash)
+            print(f"✅ {model.__tablename__}: {count} email hash(es) {'recomputed' if rehash else 'filled in'}.")
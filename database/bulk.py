@@ -0,0 +1,93 @@
+"""
+Bulk row ingestion for the pipeline (scraped leads, generated emails).
+
+On PostgreSQL the rows are streamed with COPY ... FROM STDIN, which skips
+the per-row statement round trip entirely. Other backends (SQLite for local
+runs) get a single executemany INSERT, which SQLAlchemy sends as multi-row
+VALUES batches.
+
+Rows are dicts keyed by column name. Column types still apply (encrypted
+columns are encrypted) and Python-side column defaults are filled in, so a
+bulk row matches one added through the ORM. ORM hooks such as @validates do
+not run: callers pass derived columns like email_hash themselves.
+"""
+import io
+import datetime
+from sqlalchemy import insert
+from sqlalchemy.types import TypeDecorator
+
+COPY_DRIVERS = ("psycopg2", "psycopg")
+
+
+def _column_default(column):
+    default = column.default
+    if default is None or not (default.is_scalar or default.is_callable):
+        return None
+    # Callable defaults are wrapped by SQLAlchemy to take an execution context
+    return default.arg if default.is_scalar else default.arg(None)
+
+
+def _complete_rows(table, rows):
+    """Same columns for every row: the given ones plus those with a Python default."""
+    given = set().union(*(row.keys() for row in rows))
+    columns = [c for c in table.columns if c.name in given or _column_default(c) is not None]
+    completed = []
+    for row in rows:
+        completed.append({
+            c.name: row[c.name] if c.name in row else _column_default(c) for c in columns
+        })
+    return columns, completed
+
+
+def _copy_text(column, value, dialect):
+    """One field in COPY's text format, after the column type's own conversion."""
+    if isinstance(column.type, TypeDecorator):
+        value = column.type.process_bind_param(value, dialect)
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # bytea hex input; the backslash itself is escaped for COPY
+        return "\\\\x" + bytes(value).hex()
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat(sep=" ")
+    return (
+        str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    )
+
+
+def copy_rows(conn, table, columns, rows):
+    """Streams `rows` into `table` with COPY FROM STDIN inside the connection's transaction."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_text(c, row[c.name], conn.dialect) for c in columns))
+        buffer.write("\n")
+    quote = conn.dialect.identifier_preparer.quote
+    sql = f"COPY {quote(table.name)} ({', '.join(quote(c.name) for c in columns)}) FROM STDIN"
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if conn.dialect.driver == "psycopg2":
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+def bulk_insert(conn, table, rows):
+    """
+    Inserts `rows` (dicts) into `table` through the Core connection `conn`
+    (`session.connection()` inside an ORM transaction). Returns the row count.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    columns, rows = _complete_rows(table, rows)
+    if conn.dialect.name == "postgresql" and conn.dialect.driver in COPY_DRIVERS:
+        copy_rows(conn, table, columns, rows)
+    else:
+        conn.execute(insert(table), rows)
+    return len(rows)
@@ -0,0 +1,206 @@
+"""
+Incrementally maintained campaign statistics.
+
+The dashboards used to count leads, sends, opens and replies by loading every
+row of a campaign. Instead each stage adds what it changed to the campaign's
+`campaign_stats` row, in the same transaction as the change itself, so the
+totals are read in O(1) whatever the campaign's size:
+
+- the scraper: leads inserted, per saved batch;
+- email generation: resets the email counters when it replaces a campaign's
+  emails, then adds each saved batch;
+- sending: moves every email between sent / failed / neither;
+- open and click tracking (backend/tracking.py): emails opened or clicked
+  for the first time, and every click, per flushed batch of events;
+- reply analysis: new replies, and the sentiment they moved to.
+
+The counters follow the same definitions as `raw_counts`, which recomputes
+them from the leads, email_contents and email_click_events tables.
+
+Usage: python database/campaign_stats.py [--rebuild] [--campaign ID ...]
+  Without --rebuild, checks the stored counters against the raw tables and
+  exits with status 1 on any mismatch. --rebuild recomputes them.
+"""
+import os
+import sys
+import argparse
+import datetime
+from sqlalchemy import select, update, insert, delete, func, case, text, literal, inspect
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from database.models import Campaign, Lead, EmailContent, EmailClickEvent, CampaignStats
+
+STAT_FIELDS = (
+    "leads", "emails_generated", "emails_sent", "emails_failed", "emails_opened", "emails_clicked",
+    "replies", "replies_positive", "replies_neutral", "replies_negative", "clicks",
+)
+EMAIL_FIELDS = STAT_FIELDS[1:]
+SENTIMENT_FIELDS = {"Positive": "replies_positive", "Neutral": "replies_neutral", "Negative": "replies_negative"}
+
+
+def delivery_field(status):
+    """The counter an email with `delivery_status` `status` is counted in, if any."""
+    if status == "Sent":
+        return "emails_sent"
+    if status and (status.startswith("Failed") or status == "Invalid Email"):
+        return "emails_failed"
+    return None
+
+
+def sentiment_field(sentiment):
+    return SENTIMENT_FIELDS.get(sentiment)
+
+
+def _dialect_name(executor):
+    bind = executor if hasattr(executor, "dialect") else executor.get_bind()
+    return bind.dialect.name
+
+
+def bump(executor, campaign_id, **deltas):
+    """
+    Adds `deltas` (counter name -> change) to the campaign's counters,
+    creating its row if needed. `executor` is a Session or Connection; the
+    caller commits, together with the change being counted.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas or campaign_id is None:
+        return
+    table = CampaignStats.__table__
+    now = datetime.datetime.utcnow()
+    increments = {field: table.c[field] + delta for field, delta in deltas.items()}
+    dialect = _dialect_name(executor)
+    if dialect in ("sqlite", "postgresql"):
+        # One atomic upsert: concurrent stages never lose each other's increments
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        statement = upsert(table).values(
+            campaign_id=campaign_id, updated_at=now, **{field: deltas.get(field, 0) for field in STAT_FIELDS}
+        ).on_conflict_do_update(index_elements=[table.c.campaign_id], set_={**increments, "updated_at": now})
+        executor.execute(statement)
+        return
+    updated = executor.execute(update(table).where(table.c.campaign_id == campaign_id).values(**increments, updated_at=now))
+    if not updated.rowcount:
+        executor.execute(insert(table).values(
+            campaign_id=campaign_id, updated_at=now, **{field: deltas.get(field, 0) for field in STAT_FIELDS}
+        ))
+
+
+def reset_email_counters(executor, campaign_id):
+    """Zeroes the email counters, for when every email of the campaign has just been deleted."""
+    table = CampaignStats.__table__
+    executor.execute(
+        update(table).where(table.c.campaign_id == campaign_id)
+        .values(updated_at=datetime.datetime.utcnow(), **dict.fromkeys(EMAIL_FIELDS, 0))
+    )
+
+
+def load(executor, campaign_id):
+    """The campaign's counters as a dict (all zero for a campaign nothing was counted for yet)."""
+    table = CampaignStats.__table__
+    row = executor.execute(
+        select(*(table.c[field] for field in STAT_FIELDS)).where(table.c.campaign_id == campaign_id)
+    ).first()
+    return dict(row._mapping) if row else dict.fromkeys(STAT_FIELDS, 0)
+
+
+def raw_counts(conn, campaign_ids=None):
+    """Counters recomputed from the leads, email_contents and email_click_events tables, keyed by campaign id."""
+    campaigns, leads, emails = Campaign.__table__, Lead.__table__, EmailContent.__table__
+    click_events = EmailClickEvent.__table__
+    wanted = select(campaigns.c.id)
+    # Databases migrating from before version 7 have no clicked column yet: nothing was clicked
+    has_clicked = "clicked" in {column["name"] for column in inspect(conn).get_columns(emails.name)}
+    lead_counts = select(leads.c.campaign_id, func.count()).group_by(leads.c.campaign_id)
+    email_counts = select(
+        emails.c.campaign_id,
+        func.count(),
+        func.count(case((emails.c.delivery_status == "Sent", 1))),
+        func.count(case((emails.c.delivery_status.like("Failed%") | (emails.c.delivery_status == "Invalid Email"), 1))),
+        func.count(case((emails.c.opened.is_(True), 1))),
+        func.count(case((emails.c.clicked.is_(True), 1))) if has_clicked else literal(0),
+        # IS NOT NULL on the stored bytes: no reply is decrypted
+        func.count(case((emails.c.reply_text.isnot(None), 1))),
+        *(func.count(case((emails.c.reply_sentiment == sentiment, 1))) for sentiment in SENTIMENT_FIELDS),
+    ).group_by(emails.c.campaign_id)
+    click_counts = select(click_events.c.campaign_id, func.count()).group_by(click_events.c.campaign_id)
+    if campaign_ids is not None:
+        wanted = wanted.where(campaigns.c.id.in_(campaign_ids))
+        lead_counts = lead_counts.where(leads.c.campaign_id.in_(campaign_ids))
+        email_counts = email_counts.where(emails.c.campaign_id.in_(campaign_ids))
+        click_counts = click_counts.where(click_events.c.campaign_id.in_(campaign_ids))
+
+    counts = {campaign_id: dict.fromkeys(STAT_FIELDS, 0) for campaign_id in conn.execute(wanted).scalars()}
+    for campaign_id, lead_count in conn.execute(lead_counts):
+        if campaign_id in counts:
+            counts[campaign_id]["leads"] = lead_count
+    for campaign_id, *values in conn.execute(email_counts):
+        if campaign_id in counts:
+            # Every email counter but clicks, in order
+            counts[campaign_id].update(zip(EMAIL_FIELDS[:-1], values))
+    for campaign_id, click_count in conn.execute(click_counts):
+        if campaign_id in counts:
+            counts[campaign_id]["clicks"] = click_count
+    return counts
+
+
+def rebuild(conn, campaign_ids=None):
+    """Recomputes the counters of `campaign_ids` (default: every campaign). Returns the number of campaigns."""
+    table = CampaignStats.__table__
+    if conn.dialect.name == "postgresql":
+        # Stages bumping meanwhile wait, and then add to the recomputed totals
+        conn.execute(text(f"LOCK TABLE {table.name} IN EXCLUSIVE MODE"))
+    # On SQLite the delete takes the write lock first, so the counts below are exact
+    clear = delete(table)
+    if campaign_ids is not None:
+        clear = clear.where(table.c.campaign_id.in_(campaign_ids))
+    conn.execute(clear)
+    counts = raw_counts(conn, campaign_ids)
+    now = datetime.datetime.utcnow()
+    if counts:
+        conn.execute(insert(table), [
+            {"campaign_id": campaign_id, "updated_at": now, **values} for campaign_id, values in counts.items()
+        ])
+    return len(counts)
+
+
+def check(conn, campaign_ids=None):
+    """Compares the stored counters with the raw tables. Returns (campaign id, counter, stored, actual) per mismatch."""
+    table = CampaignStats.__table__
+    stored_query = select(table.c.campaign_id, *(table.c[field] for field in STAT_FIELDS))
+    if campaign_ids is not None:
+        stored_query = stored_query.where(table.c.campaign_id.in_(campaign_ids))
+    stored = {row[0]: dict(zip(STAT_FIELDS, row[1:])) for row in conn.execute(stored_query)}
+    mismatches = []
+    for campaign_id, actual in raw_counts(conn, campaign_ids).items():
+        counters = stored.get(campaign_id, dict.fromkeys(STAT_FIELDS, 0))
+        for field in STAT_FIELDS:
+            if counters[field] != actual[field]:
+                mismatches.append((campaign_id, field, counters[field], actual[field]))
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check or rebuild the campaign_stats counters.")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the counters from the raw tables")
+    parser.add_argument("--campaign", type=int, nargs="+", help="only these campaign ids (default: every campaign)")
+    args = parser.parse_args()
+
+    from database.db import engine
+    from database.migrations import upgrade
+    upgrade(engine)
+    if args.rebuild:
+        with engine.begin() as conn:
+            rebuilt = rebuild(conn, args.campaign)
+        print(f"✅ Rebuilt statistics for {rebuilt} campaign(s).")
+        sys.exit(0)
+
+    with engine.connect() as conn:
+        mismatches = check(conn, args.campaign)
+    for campaign_id, field, stored, actual in mismatches:
+        print(f"❌ Campaign {campaign_id}: {field} is {stored}, the raw tables say {actual}.")
+    if mismatches:
+        print("Run with --rebuild to recompute them.")
+        sys.exit(1)
+    print("✅ Campaign statistics match the raw tables.")
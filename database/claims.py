@@ -0,0 +1,31 @@
+"""
+Row claims for work shared between processes and hosts.
+
+`claim_rows` picks rows matching some criteria and marks them in one
+transaction, so two workers never take the same row. On PostgreSQL the
+candidates are read with SELECT ... FOR UPDATE SKIP LOCKED: rows another
+worker is claiming are skipped instead of waited for. SQLite has no row
+locks (the clause is simply not emitted) and relies on its single writer:
+the UPDATE re-checks the criteria, and only the rows it actually changed
+count as claimed.
+"""
+from sqlalchemy import select, update, inspect
+
+
+def claim_rows(session, model, *criteria, values, limit=None, order_by=None):
+    """
+    Sets `values` on up to `limit` rows of `model` matching `criteria` and
+    returns the primary keys of the rows claimed. The caller commits.
+    """
+    pk = inspect(model).primary_key[0]
+    candidates = select(pk).where(*criteria).order_by(*(order_by if order_by is not None else (pk,)))
+    if limit:
+        candidates = candidates.limit(limit)
+    ids = session.execute(candidates.with_for_update(skip_locked=True)).scalars().all()
+    if not ids:
+        return []
+    claimed = session.execute(
+        update(model).where(pk.in_(ids), *criteria).values(**values).returning(pk),
+        execution_options={"synchronize_session": "fetch"},
+    )
+    return claimed.scalars().all()
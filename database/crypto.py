@@ -0,0 +1,153 @@
+"""
+Column encryption for the models.
+
+`EncryptedString` seals values with AES-256-GCM (authenticated encryption,
+a random nonce per value) under a key derived once per process from
+DB_ENCRYPTION_KEY with HKDF. Every ciphertext starts with a format marker and
+the id of the key that sealed it, so several keys can be readable at once:
+
+    0x01 | key id (4 bytes) | nonce (12 bytes) | ciphertext + tag
+
+Values written by the previous column type (sqlalchemy_utils EncryptedType
+with its default AesEngine: AES-CBC, base64 text, key re-hashed for every
+cell) are still read, so existing databases keep working;
+`python database/reencrypt.py` rewrites them in the current format, and
+re-encrypts values sealed with a previous key after a key rotation.
+"""
+import os
+import hmac
+import hashlib
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from sqlalchemy import LargeBinary, type_coerce
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy_utils.types.encrypted.encrypted_type import AesEngine
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FORMAT_MARKER = b"\x01"
+KEY_ID_SIZE = 4
+NONCE_SIZE = 12
+HEADER_SIZE = len(FORMAT_MARKER) + KEY_ID_SIZE
+
+
+def derive_key(passphrase):
+    """256-bit AES key for `passphrase`. Runs once per key and process, never per value."""
+    return HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=b"column-encryption"
+    ).derive(passphrase.encode("utf-8"))
+
+
+def derive_subkey(label, db_key=None):
+    """
+    A separate key for `label` (e.g. b"email-blind-index") derived from
+    `db_key`, by default DB_ENCRYPTION_KEY, so other uses never reuse the
+    encryption key directly. None if there is no such key.
+    """
+    db_key = db_key or os.getenv("DB_ENCRYPTION_KEY")
+    if not db_key:
+        return None
+    return hmac.new(db_key.encode("utf-8"), label, hashlib.sha256).digest()
+
+
+def key_id(key):
+    return hmac.new(key, b"key-id", hashlib.sha256).digest()[:KEY_ID_SIZE]
+
+
+class Keyring:
+    """
+    The keys values can be decrypted with. The first passphrase is the current
+    key: it seals every new value.
+    """
+
+    def __init__(self, passphrases):
+        if not passphrases:
+            raise ValueError("At least one encryption key is required.")
+        self.ciphers = {}
+        self.legacy_engines = []
+        for passphrase in passphrases:
+            key = derive_key(passphrase)
+            self.ciphers.setdefault(key_id(key), AESGCM(key))
+            # Reads values of the old column type; its key is likewise set up once
+            legacy = AesEngine()
+            legacy._set_padding_mechanism(None)
+            legacy._update_key(passphrase)
+            self.legacy_engines.append(legacy)
+        self.current_id = key_id(derive_key(passphrases[0]))
+        self.current = self.ciphers[self.current_id]
+        self.header = FORMAT_MARKER + self.current_id
+
+    def encrypt(self, plaintext):
+        nonce = os.urandom(NONCE_SIZE)
+        # The header is authenticated too, so a value can't be relabelled with another key id
+        return self.header + nonce + self.current.encrypt(nonce, plaintext.encode("utf-8"), self.header)
+
+    def decrypt(self, blob):
+        blob = bytes(blob)
+        if blob[:1] != FORMAT_MARKER:
+            return self._decrypt_legacy(blob)
+        cipher = self.ciphers.get(blob[1:HEADER_SIZE])
+        if cipher is None:
+            raise ValueError(f"Value was encrypted with an unknown key (id {blob[1:HEADER_SIZE].hex()}).")
+        try:
+            return cipher.decrypt(
+                blob[HEADER_SIZE:HEADER_SIZE + NONCE_SIZE], blob[HEADER_SIZE + NONCE_SIZE:], blob[:HEADER_SIZE]
+            ).decode("utf-8")
+        except InvalidTag:
+            raise ValueError("Invalid decryption key or corrupted value")
+
+    def _decrypt_legacy(self, blob):
+        # The old format has no key id: the first key that yields valid text wins
+        for engine in self.legacy_engines:
+            try:
+                return engine.decrypt(blob)
+            except ValueError:
+                continue
+        raise ValueError("Invalid decryption key")
+
+    def is_current(self, blob):
+        """Whether `blob` is already sealed with the current key in the current format."""
+        return bytes(blob[:HEADER_SIZE]) == self.header
+
+
+def previous_encryption_keys():
+    return [k.strip() for k in os.getenv("DB_PREVIOUS_ENCRYPTION_KEYS", "").split(",") if k.strip()]
+
+
+def load_keyring():
+    """
+    DB_ENCRYPTION_KEY seals new values; the comma-separated
+    DB_PREVIOUS_ENCRYPTION_KEYS stay readable while a rotation is under way.
+    """
+    key = os.getenv("DB_ENCRYPTION_KEY")
+    if not key:
+        raise ValueError("DB_ENCRYPTION_KEY not set in .env file for model encryption.")
+    return Keyring([key, *previous_encryption_keys()])
+
+
+keyring = load_keyring()
+
+
+class EncryptedString(TypeDecorator):
+    """Text column stored encrypted with the process keyring."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return keyring.encrypt(value if isinstance(value, str) else str(value))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return keyring.decrypt(value)
+
+
+def raw(column):
+    """Selects an encrypted column's stored bytes, for re-encryption."""
+    return type_coerce(column, LargeBinary)
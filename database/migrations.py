@@ -0,0 +1,203 @@
+"""
+Versioned schema migrations.
+
+`Base.metadata.create_all` only creates missing tables; it never adds an
+index, constraint or column to a table that already exists, so an app.db
+created by an older release keeps its old schema forever. `upgrade(engine)`
+runs create_all for new tables and then every migration step newer than the
+version recorded in the `schema_version` table, each in its own transaction.
+
+Steps use SQLAlchemy DDL and the inspector rather than SQLite PRAGMAs, and
+must be idempotent: on a fresh database create_all has already built the
+current schema and the steps only get recorded.
+
+Usage: python database/migrations.py   (upgrades the configured database and prints the version)
+"""
+import os
+import sys
+import datetime
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, inspect, select, func, insert, text
+from sqlalchemy.schema import AddConstraint
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from database.models import Base, Campaign, User, Lead, EmailContent, CampaignStats, Job
+from database.blind_index import backfill_email_hashes
+from database.campaign_stats import rebuild as rebuild_campaign_stats
+
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime, default=datetime.datetime.utcnow),
+)
+
+
+def model_index(name):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f"No index named {name} in the models")
+
+
+def create_indexes(conn, *names):
+    """Creates the named model indexes that the database does not have yet."""
+    inspector = inspect(conn)
+    for name in names:
+        index = model_index(name)
+        if name not in {existing["name"] for existing in inspector.get_indexes(index.table.name)}:
+            index.create(conn)
+
+
+def add_column(conn, model, name):
+    """Adds the model's column `name` to its existing table, unless it is already there."""
+    table = model.__table__
+    if name in {column["name"] for column in inspect(conn).get_columns(table.name)}:
+        return
+    column = table.c[name]
+    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"))
+
+
+def dedupe_campaign_names(conn):
+    """Renames duplicate (user_id, name) campaigns to "<name>_<id>" so the unique index can be built."""
+    campaigns = Campaign.__table__
+    duplicates = (
+        select(campaigns.c.user_id, campaigns.c.name, func.min(campaigns.c.id).label("keep_id"))
+        .group_by(campaigns.c.user_id, campaigns.c.name)
+        .having(func.count() > 1)
+    )
+    for user_id, name, keep_id in conn.execute(duplicates).all():
+        rows = conn.execute(
+            select(campaigns.c.id).where(
+                campaigns.c.user_id == user_id, campaigns.c.name == name, campaigns.c.id != keep_id
+            )
+        ).scalars().all()
+        for campaign_id in rows:
+            new_name = f"{name}_{campaign_id}"
+            conn.execute(campaigns.update().where(campaigns.c.id == campaign_id).values(name=new_name))
+            print(f"[MIGRATE] Renamed duplicate campaign '{name}' (id {campaign_id}) to '{new_name}'.")
+
+
+def add_indexes_and_unique_campaign_names(conn):
+    dedupe_campaign_names(conn)
+    create_indexes(
+        conn,
+        "uq_campaigns_user_id_name",
+        "ix_leads_campaign_id",
+        "ix_sender_configs_user_id",
+        "ix_email_contents_lead_id",
+        "ix_email_contents_campaign_id_delivery_status",
+    )
+
+
+def add_email_blind_indexes(conn):
+    add_column(conn, User, "email_hash")
+    add_column(conn, Lead, "email_hash")
+    backfill_email_hashes(conn, User.__table__, unique=True)
+    backfill_email_hashes(conn, Lead.__table__)
+    create_indexes(conn, "ix_users_email_hash", "ix_leads_email_hash_campaign_id")
+
+
+def drop_stored_html(conn):
+    # The HTML part is rendered from body at send time; stored copies only double the table
+    emails = EmailContent.__table__
+    conn.execute(emails.update().where(emails.c.html.isnot(None)).values(html=None))
+
+
+def cascade_foreign_keys(conn):
+    """Re-creates foreign keys the models declare ON DELETE CASCADE but the database has without it."""
+    if conn.dialect.name == "sqlite":
+        # SQLite can't alter a constraint in place (only by copying the table). Tables created
+        # from now on have the cascade; on older files backend/delete_data.py deletes children first.
+        return
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        for constraint in table.foreign_key_constraints:
+            if (constraint.ondelete or "").upper() != "CASCADE":
+                continue
+            columns = [column.name for column in constraint.columns]
+            for existing in inspector.get_foreign_keys(table.name):
+                if existing["constrained_columns"] != columns or existing["referred_table"] != constraint.referred_table.name:
+                    continue
+                if (existing.get("options") or {}).get("ondelete", "").upper() == "CASCADE":
+                    continue
+                conn.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT "{existing["name"]}"'))
+                conn.execute(AddConstraint(constraint))
+                print(f"[MIGRATE] {table.name}.{', '.join(columns)} now cascades deletes.")
+
+
+def add_open_times(conn):
+    # create_all has made email_open_events; existing opens keep NULL times
+    add_column(conn, EmailContent, "first_opened_at")
+    add_column(conn, EmailContent, "last_opened_at")
+
+
+def add_click_tracking(conn):
+    # create_all has made email_click_events
+    add_column(conn, EmailContent, "clicked")
+    add_column(conn, CampaignStats, "emails_clicked")
+    add_column(conn, CampaignStats, "clicks")
+    # The new counters were added as NULL on existing rows
+    rebuild_campaign_stats(conn)
+
+
+def unique_unfinished_jobs(conn):
+    """Fails all but the oldest of duplicate unfinished jobs so the partial unique index can be built."""
+    jobs = Job.__table__
+    unfinished = jobs.c.status.in_(("Queued", "Running"))
+    duplicates = (
+        select(jobs.c.kind, jobs.c.args, func.min(jobs.c.id).label("keep_id"))
+        .where(unfinished)
+        .group_by(jobs.c.kind, jobs.c.args)
+        .having(func.count() > 1)
+    )
+    for kind, args, keep_id in conn.execute(duplicates).all():
+        failed = conn.execute(jobs.update().where(
+            jobs.c.kind == kind, jobs.c.args == args, jobs.c.id != keep_id, unfinished
+        ).values(status="Failed", error=f"Duplicate of job {keep_id}", finished_at=datetime.datetime.utcnow())).rowcount
+        print(f"[MIGRATE] Failed {failed} duplicate(s) of job {keep_id} ({kind}).")
+    create_indexes(conn, "uq_jobs_unfinished_kind_args")
+
+
+# (version, description, step). Append new steps; never edit or reorder applied ones.
+MIGRATIONS = [
+    (1, "Foreign-key indexes and unique campaign names per user", add_indexes_and_unique_campaign_names),
+    (2, "Blind-index email_hash columns on users and leads", add_email_blind_indexes),
+    (3, "Drop stored HTML copies of email bodies", drop_stored_html),
+    # create_all has made the table; fill it from the rows already there
+    (4, "Campaign statistics counters", rebuild_campaign_stats),
+    (5, "ON DELETE CASCADE on every foreign key", cascade_foreign_keys),
+    (6, "Open events and first/last open times", add_open_times),
+    (7, "Click tracking events and counters", add_click_tracking),
+    (8, "One unfinished job per task and args", unique_unfinished_jobs),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def upgrade(engine):
+    """Brings the database behind `engine` up to LATEST_VERSION. Returns the resulting version."""
+    Base.metadata.create_all(bind=engine)
+    version_metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        version = current_version(conn)
+    for step_version, description, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        print(f"[MIGRATE] Applying schema version {step_version}: {description}")
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(insert(schema_version).values(version=step_version, description=description))
+        version = step_version
+    return version
+
+
+if __name__ == "__main__":
+    from database.db import engine
+    print(f"✅ Database schema is at version {upgrade(engine)}.")
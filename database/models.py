@@ -1,22 +1,11 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
-from sqlalchemy.orm import relationship, declarative_base
-from sqlalchemy_utils import EncryptedType
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, UniqueConstraint, Index, text
+from sqlalchemy.orm import relationship, declarative_base, validates, deferred
 import datetime
-import os
+from database.blind_index import email_hash
+# Sensitive columns are encrypted with the key from the environment (see database/crypto.py)
+from database.crypto import EncryptedString
 
-# Create a custom EncryptedType that is cache-safe to avoid SAWarning
-class CachingEncryptedType(EncryptedType):
-    @property
-    def cache_ok(self):
-        return True
-
-
-# Load the encryption key from the environment.
-# This key is used by EncryptedType to encrypt/decrypt data.
-DB_ENCRYPTION_KEY = os.getenv("DB_ENCRYPTION_KEY")
-if not DB_ENCRYPTION_KEY:
-    raise ValueError("DB_ENCRYPTION_KEY not set in .env file for model encryption.")
 Base = declarative_base()
 
 class User(Base):
@@ -24,78 +13,231 @@ class User(Base):
 
     id = Column(Integer, primary_key=True)
     username = Column(String, unique=True)
-    name = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
-    email = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
+    name = Column(EncryptedString)
+    email = Column(EncryptedString)
+    email_hash = Column(String(32), unique=True, index=True) # Blind index of email, kept in sync below.
     password_hash = Column(String) # Passwords are hashed, not encrypted.
     is_admin = Column(Boolean, default=False)
 
-    campaigns = relationship("Campaign", back_populates="user", cascade="all, delete-orphan")
-    sender_config = relationship("SenderConfig", uselist=False, back_populates="user", cascade="all, delete-orphan")
+    # passive_deletes: the database cascades (ON DELETE CASCADE), so deleting a row never loads
+    # its children; large deletes go through backend/delete_data.py in chunks
+    campaigns = relationship("Campaign", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    sender_config = relationship("SenderConfig", uselist=False, back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+
+    @validates("email")
+    def _set_email_hash(self, key, value):
+        self.email_hash = email_hash(value)
+        return value
 
 class Campaign(Base):
     __tablename__ = "campaigns"
+    # A unique index rather than a table constraint so migrations can add it to an
+    # existing table; it also serves plain user_id lookups
+    __table_args__ = (Index("uq_campaigns_user_id_name", "user_id", "name", unique=True),)
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
     service = Column(String)
     date_created = Column(DateTime, default=datetime.datetime.utcnow)
     status = Column(String, default="Idle") # e.g., Idle, Scraping, Generating, Sending, Completed, Failed
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     industries = Column(String)
     locations = Column(String) 
     platforms = Column(String) 
 
     user = relationship("User", back_populates="campaigns")
-    leads = relationship("Lead", back_populates="campaign", cascade="all, delete-orphan")
-    emails = relationship("EmailContent", back_populates="campaign", cascade="all, delete-orphan")
+    leads = relationship("Lead", back_populates="campaign", cascade="all, delete-orphan", passive_deletes=True)
+    emails = relationship("EmailContent", back_populates="campaign", cascade="all, delete-orphan", passive_deletes=True)
+    scrape_progress = relationship("ScrapeProgress", back_populates="campaign", cascade="all, delete-orphan", passive_deletes=True)
+    stats = relationship("CampaignStats", uselist=False, back_populates="campaign", cascade="all, delete-orphan", passive_deletes=True)
 
 class Lead(Base):
     __tablename__ = "leads"
+    # Not unique: older scrapes may hold the same address twice in a campaign.
+    # Leading with the hash serves both global and per-campaign lookups.
+    __table_args__ = (Index("ix_leads_email_hash_campaign_id", "email_hash", "campaign_id"),)
 
     id = Column(Integer, primary_key=True)
-    name = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
-    email = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
+    name = Column(EncryptedString)
+    email = Column(EncryptedString)
+    email_hash = Column(String(32)) # Blind index of email, kept in sync below.
     platform_source = Column(String)
-    profile_link = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
+    profile_link = Column(EncryptedString)
     website = Column(String)
     state = Column(String)
     industry = Column(String)
-    profile_description = Column(CachingEncryptedType(Text, DB_ENCRYPTION_KEY))
-    campaign_id = Column(Integer, ForeignKey("campaigns.id"))
+    # Deferred: decrypted only when accessed or undeferred, not on every lead load
+    profile_description = deferred(Column(EncryptedString))
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), index=True)
 
     campaign = relationship("Campaign", back_populates="leads")
-    emails = relationship("EmailContent", back_populates="lead", cascade="all, delete-orphan")
+    emails = relationship("EmailContent", back_populates="lead", cascade="all, delete-orphan", passive_deletes=True)
+
+    @validates("email")
+    def _set_email_hash(self, key, value):
+        self.email_hash = email_hash(value)
+        return value
 
 class SenderConfig(Base):
     __tablename__ = "sender_configs"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    sender_name = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
-    sender_email = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
-    company_name = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
-    website = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
-    phone = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    sender_name = Column(EncryptedString)
+    sender_email = Column(EncryptedString)
+    company_name = Column(EncryptedString)
+    website = Column(EncryptedString)
+    phone = Column(EncryptedString)
     imap_server = Column(String)
-    imap_email = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
-    imap_password = Column(CachingEncryptedType(String, DB_ENCRYPTION_KEY))
+    imap_email = Column(EncryptedString)
+    imap_password = Column(EncryptedString)
 
     user = relationship("User", back_populates="sender_config")
 
 class EmailContent(Base):
     __tablename__ = "email_contents"
+    # Sending and the dashboards filter a campaign's emails by delivery status;
+    # the same index serves plain campaign_id lookups
+    __table_args__ = (Index("ix_email_contents_campaign_id_delivery_status", "campaign_id", "delivery_status"),)
 
     id = Column(Integer, primary_key=True)
-    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"))
+    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), index=True)
     campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"))
-    subject = Column(CachingEncryptedType(Text, DB_ENCRYPTION_KEY))
-    body = Column(CachingEncryptedType(Text, DB_ENCRYPTION_KEY))
-    html = Column(CachingEncryptedType(Text, DB_ENCRYPTION_KEY))
+    # The encrypted texts are deferred so status updates and counts never decrypt them.
+    # Touching one of subject/body/html loads the three together.
+    subject = deferred(Column(EncryptedString), group="content")
+    body = deferred(Column(EncryptedString), group="content")
+    # Optional HTML override; normally NULL and rendered from body at send time (backend/email_render.py)
+    html = deferred(Column(EncryptedString), group="content")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     delivery_status = Column(String)
     opened = Column(Boolean, default=False)
-    reply_text = Column(CachingEncryptedType(Text, DB_ENCRYPTION_KEY))
+    # Set by the tracking pixel (backend/tracking.py); every open is also in email_open_events
+    first_opened_at = Column(DateTime)
+    last_opened_at = Column(DateTime)
+    clicked = Column(Boolean, default=False) # A tracked link was followed; every click is in email_click_events
+    reply_text = deferred(Column(EncryptedString))
     reply_sentiment = Column(String)
 
     lead = relationship("Lead", back_populates="emails")
     campaign = relationship("Campaign", back_populates="emails")
+
+class EmailOpenEvent(Base):
+    """One hit of an email's tracking pixel, written in batches by backend/tracking.py."""
+    __tablename__ = "email_open_events"
+
+    id = Column(Integer, primary_key=True)
+    email_id = Column(Integer, ForeignKey("email_contents.id", ondelete="CASCADE"), index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), index=True)
+    opened_at = Column(DateTime)
+    user_agent = Column(String)
+    ip_class = Column(String) # The client's /24 (IPv4) or /48 (IPv6) network, never the full address
+
+class EmailClickEvent(Base):
+    """One followed link of an email, written in batches by backend/tracking.py."""
+    __tablename__ = "email_click_events"
+
+    id = Column(Integer, primary_key=True)
+    email_id = Column(Integer, ForeignKey("email_contents.id", ondelete="CASCADE"), index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), index=True)
+    url = Column(String)
+    clicked_at = Column(DateTime)
+    user_agent = Column(String)
+    ip_class = Column(String)
+
+class ScrapeProgress(Base):
+    """One row per (platform, industry, location, dork) query already saved for a campaign."""
+    __tablename__ = "scrape_progress"
+    __table_args__ = (UniqueConstraint("campaign_id", "platform", "industry", "location", "dork"),)
+
+    id = Column(Integer, primary_key=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"))
+    platform = Column(String)
+    industry = Column(String)
+    location = Column(String)
+    dork = Column(String)
+    completed_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    campaign = relationship("Campaign", back_populates="scrape_progress")
+
+class CampaignStats(Base):
+    """Running totals for one campaign, updated by each stage in the same transaction (see database/campaign_stats.py)."""
+    __tablename__ = "campaign_stats"
+
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), primary_key=True)
+    leads = Column(Integer, default=0, nullable=False)
+    emails_generated = Column(Integer, default=0, nullable=False)
+    emails_sent = Column(Integer, default=0, nullable=False)
+    emails_failed = Column(Integer, default=0, nullable=False) # "Failed: ..." and "Invalid Email"
+    emails_opened = Column(Integer, default=0, nullable=False)
+    emails_clicked = Column(Integer, default=0, nullable=False) # Emails with at least one tracked click
+    replies = Column(Integer, default=0, nullable=False)
+    replies_positive = Column(Integer, default=0, nullable=False)
+    replies_neutral = Column(Integer, default=0, nullable=False)
+    replies_negative = Column(Integer, default=0, nullable=False)
+    clicks = Column(Integer, default=0, nullable=False) # Every tracked click, repeats included
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    campaign = relationship("Campaign", back_populates="stats")
+
+class CampaignProgress(Base):
+    """Latest progress of one pipeline stage of a campaign, written by the worker running it (see backend/progress.py)."""
+    __tablename__ = "campaign_progress"
+
+    campaign_id = Column(Integer, ForeignKey("campaigns.id", ondelete="CASCADE"), primary_key=True)
+    stage = Column(String, primary_key=True) # e.g. scrape_leads, generate_emails, send_emails
+    status = Column(String) # Running, Completed, Failed
+    processed = Column(Integer, default=0, nullable=False)
+    total = Column(Integer) # NULL while unknown
+    errors = Column(Integer, default=0, nullable=False)
+    last_error = Column(String)
+    message = Column(String)
+    started_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class DeletionJob(Base):
+    """A background delete of a campaign or a user and all their rows (see backend/delete_data.py)."""
+    __tablename__ = "deletion_jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String) # "campaign" or "user"
+    # No foreign keys: the job outlives the rows it deletes
+    target_id = Column(Integer)
+    target_name = Column(String)
+    user_id = Column(Integer, index=True) # Owner of the deleted data, for showing progress
+    status = Column(String, default="Queued") # Queued, Running, Completed, Failed: ...
+    rows_total = Column(Integer)
+    rows_deleted = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class Job(Base):
+    """A pipeline task queued for the worker pool (see backend/job_queue.py)."""
+    __tablename__ = "jobs"
+    # Workers claim the highest-priority queued job; the same index serves status lookups
+    __table_args__ = (
+        Index("ix_jobs_status_priority_id", "status", "priority", "id"),
+        # At most one unfinished job per task and args, even when two API calls queue it at once
+        Index(
+            "uq_jobs_unfinished_kind_args", "kind", "args", unique=True,
+            sqlite_where=text("status IN ('Queued', 'Running')"),
+            postgresql_where=text("status IN ('Queued', 'Running')"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String) # e.g. scrape_leads, generate_emails, send_emails
+    args = Column(String) # JSON keyword arguments of the task
+    user_id = Column(Integer, index=True) # For the per-user concurrency limit; no foreign key, the job outlives deletes
+    priority = Column(Integer, default=0, nullable=False) # Higher runs first
+    status = Column(String, default="Queued") # Queued, Running, Completed, Failed
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=1, nullable=False)
+    run_after = Column(DateTime, default=datetime.datetime.utcnow) # Retries wait until then
+    worker_id = Column(String)
+    heartbeat_at = Column(DateTime)
+    error = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
@@ -0,0 +1,238 @@
+"""
+Re-encrypts stored values that are not sealed with the current key, online.
+
+Usage: python database/reencrypt.py [--batch-size N] [--pause SECONDS] [--tables users,leads] [--restart] [--verify]
+       python database/reencrypt.py --new-key
+
+Walks every table with encrypted columns in primary-key order, a batch of
+rows at a time, each batch in its own short transaction so the app keeps
+writing meanwhile. Values of the old column type, or sealed with a previous
+key, are decrypted and sealed again with the current key; current values are
+left alone. Progress is checkpointed per table with each batch, so an
+interrupted run resumes where it stopped (--restart starts over).
+
+Rotating DB_ENCRYPTION_KEY:
+  0. Unless TRACKING_LINK_KEY is set, set it (to another --new-key) first:
+     tracked links are otherwise signed with a key derived from
+     DB_ENCRYPTION_KEY (backend/link_tokens.py).
+  1. Generate a key with --new-key. Set it as DB_ENCRYPTION_KEY and move the
+     old one to DB_PREVIOUS_ENCRYPTION_KEYS, then restart the app: it reads
+     both keys and seals new values with the new one.
+  2. Run this command, then once more with --verify: every table should report
+     0 values left on an old key.
+  3. Remove the old key from DB_PREVIOUS_ENCRYPTION_KEYS and restart again.
+     Links in emails sent before TRACKING_LINK_KEY was set were signed under
+     the old key and answer 404 from then on; keep it listed for as long as
+     those links must keep working.
+
+Unless BLIND_INDEX_KEY is set, the email blind index is derived from
+DB_ENCRYPTION_KEY, so the email_hash of every re-encrypted row is
+recomputed in the same update. Until a row is reached its old hash doesn't
+match new lookups; set BLIND_INDEX_KEY before rotating to avoid that window.
+An account registered again in that window already holds the new hash of
+its address: the older row it repeats is reported and left without a hash,
+like the duplicates of the blind index backfill.
+
+A value no readable key can decrypt (corrupt, or sealed with a key missing
+from DB_PREVIOUS_ENCRYPTION_KEYS) is reported and its row left unchanged.
+
+A row the app rewrites between the read and the update of its batch is
+skipped (the update only applies while the stored bytes are unchanged); the
+app already wrote it with the current key.
+"""
+import os
+import sys
+import time
+import secrets
+import argparse
+import datetime
+from sqlalchemy import (
+    Table, Column, Integer, String, DateTime, MetaData, select, update, insert, delete, func, bindparam, LargeBinary,
+)
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from database.models import Base
+from database.crypto import EncryptedString, keyring, raw
+from database.blind_index import email_hash
+
+REENCRYPT_BATCH_SIZE = 1000
+PROGRESS_EVERY_SECONDS = 5
+
+checkpoint_metadata = MetaData()
+reencrypt_progress = Table(
+    "reencrypt_progress", checkpoint_metadata,
+    Column("table_name", String, primary_key=True),
+    Column("key_id", String),
+    Column("last_id", Integer),
+    Column("rows_read", Integer),
+    Column("rows_rewritten", Integer),
+    Column("updated_at", DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow),
+)
+
+
+def encrypted_columns(table):
+    return [column for column in table.columns if isinstance(column.type, EncryptedString)]
+
+
+def rehashes_email(table):
+    return "email_hash" in table.c and "email" in table.c
+
+
+def drop_taken_hashes(conn, table, params):
+    """Clears the new email hash of rows whose address another row already holds under the current key."""
+    hashed = {param["row_id"]: param["new_email_hash"] for param in params if param.get("new_email_hash")}
+    if not hashed:
+        return
+    owners = dict(conn.execute(
+        select(table.c.email_hash, table.c.id).where(table.c.email_hash.in_(set(hashed.values())))
+    ).all())
+    for param in params:
+        row_id, new_hash = param["row_id"], param.get("new_email_hash")
+        owner = owners.setdefault(new_hash, row_id) if new_hash else row_id
+        if owner != row_id:
+            print(f"[REENCRYPT] ⚠️ {table.name} row {row_id} shares its email with row {owner}; left without a hash.")
+            param["new_email_hash"] = None
+
+
+def reencrypt_batch(conn, table, columns, last_id, batch_size):
+    """Re-encrypts one batch of rows after `last_id`. Returns (rows read, rows rewritten, last id)."""
+    rehash = rehashes_email(table)
+    selected = [table.c.id, *(raw(column) for column in columns)]
+    if rehash:
+        selected.append(table.c.email_hash)
+    rows = conn.execute(
+        select(*selected).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+    ).all()
+    if not rows:
+        return 0, 0, last_id
+    params = []
+    for row in rows:
+        values = row[1:len(columns) + 1]
+        if all(value is None or keyring.is_current(value) for value in values):
+            continue
+        param = {"row_id": row[0]}
+        for column, value in zip(columns, values):
+            stored = None if value is None else bytes(value)
+            try:
+                plaintext = None if stored is None else keyring.decrypt(stored)
+            except (ValueError, UnicodeDecodeError):
+                # Corrupt, or sealed with a key no longer listed: --verify keeps counting it
+                print(f"[REENCRYPT] ⚠️ {table.name} row {row[0]}: {column.name} could not be decrypted; row left unchanged.")
+                param = None
+                break
+            param[f"old_{column.name}"] = stored
+            param[f"new_{column.name}"] = (
+                stored if stored is None or keyring.is_current(stored) else keyring.encrypt(plaintext)
+            )
+            if rehash and column.name == "email":
+                # Rows left without a hash (legacy duplicates) keep none, or the unique index would break
+                param["new_email_hash"] = email_hash(plaintext) if row[-1] is not None else None
+        if param is not None:
+            params.append(param)
+    if params:
+        if rehash and table.c.email_hash.unique:
+            drop_taken_hashes(conn, table, params)
+        new_values = {column.name: bindparam(f"new_{column.name}", type_=LargeBinary) for column in columns}
+        if rehash:
+            new_values["email_hash"] = bindparam("new_email_hash")
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .where(*(raw(column).is_not_distinct_from(bindparam(f"old_{column.name}", type_=LargeBinary)) for column in columns))
+            .values(new_values)
+        )
+        conn.execute(statement, params)
+    return len(rows), len(params), rows[-1][0]
+
+
+def load_checkpoint(conn, table, restart):
+    current_key = keyring.current_id.hex()
+    row = conn.execute(select(reencrypt_progress).where(reencrypt_progress.c.table_name == table.name)).first()
+    if row and (restart or row.key_id != current_key):
+        conn.execute(delete(reencrypt_progress).where(reencrypt_progress.c.table_name == table.name))
+        row = None
+    if row is None:
+        conn.execute(insert(reencrypt_progress).values(
+            table_name=table.name, key_id=current_key, last_id=0, rows_read=0, rows_rewritten=0
+        ))
+        return 0, 0, 0
+    return row.last_id, row.rows_read, row.rows_rewritten
+
+
+def reencrypt_table(engine, table, batch_size=REENCRYPT_BATCH_SIZE, pause=0.0, restart=False):
+    """Re-encrypts `table` from its checkpoint on. Returns (rows read, rows rewritten) over the whole pass."""
+    columns = encrypted_columns(table)
+    with engine.begin() as conn:
+        last_id, read, rewritten = load_checkpoint(conn, table, restart)
+        remaining = conn.execute(select(func.count()).select_from(table).where(table.c.id > last_id)).scalar()
+    total = read + remaining
+    if last_id:
+        print(f"[REENCRYPT] {table.name}: resuming after id {last_id} ({read}/{total} rows done).")
+    started, reported, done_this_run = time.monotonic(), time.monotonic(), 0
+    while True:
+        with engine.begin() as conn:
+            batch_read, batch_rewritten, last_id = reencrypt_batch(conn, table, columns, last_id, batch_size)
+            if batch_read:
+                # Checkpoint in the batch's own transaction: a crash never skips or repeats work
+                conn.execute(update(reencrypt_progress).where(reencrypt_progress.c.table_name == table.name).values(
+                    last_id=last_id, rows_read=read + batch_read, rows_rewritten=rewritten + batch_rewritten
+                ))
+        if not batch_read:
+            return read, rewritten
+        read += batch_read
+        rewritten += batch_rewritten
+        done_this_run += batch_read
+        now = time.monotonic()
+        if now - reported >= PROGRESS_EVERY_SECONDS:
+            rate = done_this_run / (now - started)
+            eta = max(total - read, 0) / rate if rate else 0
+            print(f"[REENCRYPT] {table.name}: {read}/{total} rows ({read / max(total, 1):.0%}), "
+                  f"{rewritten} re-encrypted, {rate:.0f} rows/s, ~{eta:.0f}s left.")
+            reported = now
+        if pause:
+            time.sleep(pause)
+
+
+def count_stale(engine, table):
+    """Values of `table` not yet sealed with the current key."""
+    columns = encrypted_columns(table)
+    stale, last_id = 0, 0
+    with engine.connect() as conn:
+        while True:
+            rows = conn.execute(
+                select(table.c.id, *(raw(column) for column in columns))
+                .where(table.c.id > last_id).order_by(table.c.id).limit(10_000)
+            ).all()
+            if not rows:
+                return stale
+            stale += sum(1 for row in rows for value in row[1:] if value is not None and not keyring.is_current(value))
+            last_id = rows[-1][0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-encrypt stored values with the current DB_ENCRYPTION_KEY.")
+    parser.add_argument("--batch-size", type=int, default=REENCRYPT_BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--tables", help="comma-separated table names (default: every table with encrypted columns)")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints and start from the first row")
+    parser.add_argument("--verify", action="store_true", help="afterwards, count values still on an old key (full scan)")
+    parser.add_argument("--new-key", action="store_true", help="print a new random key for DB_ENCRYPTION_KEY and exit")
+    args = parser.parse_args()
+
+    if args.new_key:
+        print(secrets.token_urlsafe(32))
+        sys.exit(0)
+
+    from database.db import engine
+    checkpoint_metadata.create_all(bind=engine)
+    wanted = set(args.tables.split(",")) if args.tables else None
+    print(f"🔑 Current key id {keyring.current_id.hex()}, {len(keyring.ciphers)} key(s) readable.")
+    for table in Base.metadata.sorted_tables:
+        if not encrypted_columns(table) or (wanted and table.name not in wanted):
+            continue
+        started = time.monotonic()
+        read, rewritten = reencrypt_table(engine, table, args.batch_size, args.pause, args.restart)
+        elapsed = time.monotonic() - started
+        print(f"✅ {table.name}: {rewritten}/{read} rows re-encrypted ({elapsed:.1f}s).")
+        if args.verify:
+            print(f"   {count_stale(engine, table)} value(s) left on an old key.")
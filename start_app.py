@@ -1,11 +1,12 @@
 import subprocess
 import time
 import os
+import sys
 from database.db import engine
-from database.models import Base
+from database.migrations import upgrade
 
-# Ensure database tables exist
-Base.metadata.create_all(bind=engine)
+# Create missing tables and bring an existing database up to the current schema
+upgrade(engine)
 ROOT = os.path.dirname(os.path.abspath(__file__))
 print(f"🌍 Project root directory: {ROOT}")
 
@@ -17,6 +18,12 @@ if __name__ == "__main__":
         ["uvicorn", "backend.api:app", "--host", "0.0.0.0", "--port", "8000", "--reload"]
     )
 
+    # Pipeline jobs queued by the API run here, so an API reload never kills them
+    print("👷 Starting job workers...")
+    worker_process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'backend', 'worker.py')]
+    )
+
     print("📊 Launching Streamlit dashboard...")
     streamlit_process = subprocess.Popen(
         ["streamlit", "run", os.path.join(ROOT, 'dashboard', 'Home.py'), "--server.port", "8501"]
@@ -30,5 +37,7 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("🛑 Shutting down...")
         fastapi_process.terminate()
+        worker_process.terminate()
         streamlit_process.terminate()
+        worker_process.wait()  # Running jobs are put back in the queue first
         print("✅ Shutdown complete.")
\ No newline at end of file
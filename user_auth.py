@@ -1,6 +1,7 @@
 import streamlit_authenticator as stauth
 from database.db import SessionLocal
 from database.models import User
+from database.blind_index import email_hash
 import bcrypt
 from dotenv import load_dotenv
 import os
@@ -56,8 +57,8 @@ def add_user(name, username, password, email, is_admin=False):
             print(f"Registration failed: Username '{username}' already exists.")
             return False
 
-        # Check if email already exists
-        if session.query(User).filter(User.email == email).first():
+        # Check if email already exists (an indexed lookup on the blind index, no decryption)
+        if session.query(User.id).filter(User.email_hash == email_hash(email)).first():
             print(f"Registration failed: Email '{email}' is already in use.")
             return False
 